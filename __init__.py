@@ -3,23 +3,47 @@ Monitor de Precios de MercadoLibre
 Sistema de web scraping y análisis de precios
 """
 
+import importlib
+
 __version__ = "1.0.0"
 __author__ = "Tu Nombre"
 
-from .scraper import MercadoLibreScraper, search_product
-from .database import PriceDatabase, save_price, get_price_history
-from .analyzer import PriceAnalyzer, plot_price_evolution, get_price_statistics
-from .utils import format_price, print_product_summary
-
-__all__ = [
-    'MercadoLibreScraper',
-    'search_product',
-    'PriceDatabase',
-    'save_price',
-    'get_price_history',
-    'PriceAnalyzer',
-    'plot_price_evolution',
-    'get_price_statistics',
-    'format_price',
-    'print_product_summary'
-]
+# Los submódulos se importan recién cuando se accede al nombre: un worker que
+# solo usa scraper/database no paga el import de pandas, matplotlib y plotly.
+_LAZY_EXPORTS = {
+    'MercadoLibreScraper': 'scraper',
+    'search_product': 'scraper',
+    'PriceDatabase': 'database',
+    'save_price': 'database',
+    'get_price_history': 'database',
+    'PriceAnalyzer': 'analyzer',
+    'CatalogAnalyzer': 'analyzer',
+    'AnomalyDetector': 'analyzer',
+    'PriceForecaster': 'analyzer',
+    'plot_price_evolution': 'analyzer',
+    'get_price_statistics': 'analyzer',
+    'compare_catalog': 'analyzer',
+    'correlate_prices': 'analyzer',
+    'BatchRenderer': 'renderer',
+    'JobManager': 'jobs',
+    'AlertEngine': 'alerts',
+    'PriceAPI': 'api',
+    'format_price': 'utils',
+    'print_product_summary': 'utils',
+}
+
+__all__ = list(_LAZY_EXPORTS)
+
+
+def __getattr__(name):
+    module_name = _LAZY_EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    
+    value = getattr(importlib.import_module(f".{module_name}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -0,0 +1,400 @@
+"""
+Módulo de Alertas
+Reglas de precio evaluadas en cada ingesta y entregadas a sinks configurables
+"""
+
+import json
+import os
+import queue
+import threading
+import urllib.request
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional
+
+try:
+    from .logger import get_logger
+    from .metrics import counter, timed
+    from .utils import format_price
+except ImportError:
+    from logger import get_logger
+    from metrics import counter, timed
+    from utils import format_price
+
+
+logger = get_logger(__name__)
+
+# Tipos de regla (threshold: precio objetivo, % de caída o sin uso)
+RULE_BELOW_TARGET = 'below_target'
+RULE_DROP_PERCENT = 'drop_percent'
+RULE_NEW_LOW = 'new_low'
+RULE_KINDS = (RULE_BELOW_TARGET, RULE_DROP_PERCENT, RULE_NEW_LOW)
+
+# Sinks separados por coma: "stdout", "file:<ruta>", "webhook:<url>"
+ALERT_SINKS_ENV = "MLMONITOR_ALERT_SINKS"
+DEFAULT_ALERT_SINKS = "stdout"
+
+# Webhook: espera máxima por entrega (corre en el thread de entrega del motor)
+WEBHOOK_TIMEOUT = 5
+
+# Lotes de alertas pendientes de entrega; con la cola llena se descartan
+# (quedan igual en alert_events)
+ALERT_QUEUE_SIZE = 1_000
+
+# Puerto del webhook local de prueba (start_webhook_stub)
+DEFAULT_WEBHOOK_PORT = 9109
+
+alert_events_counter = counter("alert_events_total", "Alertas disparadas por tipo de regla")
+sink_errors_counter = counter("alert_sink_errors_total", "Errores entregando alertas por sink")
+
+
+def evaluate_rule(rule: Dict, change: Dict) -> Optional[Dict]:
+    """
+    Evalúa una regla contra el cambio de un producto en una ingesta
+    
+    Las reglas disparan al cruzar la condición, no mientras se mantiene:
+    un precio que sigue debajo del objetivo no vuelve a alertar.
+    
+    Args:
+        rule: Regla de alert_rules (id, kind, threshold, owner)
+        change: Cambio de PriceDatabase (price, previous_price, previous_min, ...)
+    
+    Returns:
+        Alerta lista para guardar, o None si la regla no dispara
+    """
+    price = change['price']
+    previous = change.get('previous_price')
+    threshold = rule.get('threshold')
+    
+    if rule['kind'] == RULE_BELOW_TARGET:
+        if threshold is None or price > threshold or (previous is not None and previous <= threshold):
+            return None
+        message = f"Precio objetivo alcanzado: {format_price(price)} (objetivo {format_price(threshold)})"
+    
+    elif rule['kind'] == RULE_DROP_PERCENT:
+        if threshold is None or not previous or previous <= 0:
+            return None
+        drop = (previous - price) / previous * 100
+        if drop < threshold:
+            return None
+        message = f"Bajó {drop:.1f}%: {format_price(previous)} → {format_price(price)}"
+    
+    elif rule['kind'] == RULE_NEW_LOW:
+        previous_min = change.get('previous_min')
+        if previous_min is None or price >= previous_min or price > change.get('min_price', price):
+            return None
+        message = f"Nuevo mínimo histórico: {format_price(price)} (antes {format_price(previous_min)})"
+    
+    else:
+        return None
+    
+    return {
+        'rule_id': rule['id'],
+        'product_id': change['product_id'],
+        'kind': rule['kind'],
+        'price': price,
+        'previous_price': previous,
+        'threshold': threshold,
+        'owner': rule.get('owner'),
+        'message': message,
+        'scraped_at': change['scraped_at'],
+    }
+
+
+class StdoutSink:
+    """
+    Imprime cada alerta en una línea
+    """
+    
+    name = 'stdout'
+    
+    def __call__(self, event: Dict):
+        print(f"🔔 [{event.get('product_id')}] {event.get('title') or ''} — {event['message']}", flush=True)
+
+
+class FileSink:
+    """
+    Agrega cada alerta como una línea JSON a un archivo
+    """
+    
+    name = 'file'
+    
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+    
+    def __call__(self, event: Dict):
+        line = json.dumps(event, ensure_ascii=False, default=str)
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line + "\n")
+
+
+class WebhookSink:
+    """
+    Envía cada alerta por POST como JSON
+    """
+    
+    name = 'webhook'
+    
+    def __init__(self, url: str, timeout: float = WEBHOOK_TIMEOUT):
+        self.url = url
+        self.timeout = timeout
+    
+    def __call__(self, event: Dict):
+        request = urllib.request.Request(
+            self.url,
+            data=json.dumps(event, ensure_ascii=False, default=str).encode('utf-8'),
+            headers={'Content-Type': 'application/json'},
+            method='POST'
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+
+def sinks_from_env(spec: Optional[str] = None) -> List[Callable[[Dict], None]]:
+    """
+    Crea los sinks a partir de una especificación
+    
+    Args:
+        spec: Ej: "stdout,file:data/alerts.jsonl,webhook:http://127.0.0.1:9109/alerts"
+            (por defecto MLMONITOR_ALERT_SINKS o "stdout"; "" = ninguno)
+    
+    Returns:
+        Lista de sinks
+    """
+    if spec is None:
+        spec = os.environ.get(ALERT_SINKS_ENV, DEFAULT_ALERT_SINKS)
+    
+    sinks = []
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        kind, _, target = item.partition(':')
+        if kind == 'stdout':
+            sinks.append(StdoutSink())
+        elif kind == 'file' and target:
+            sinks.append(FileSink(target))
+        elif kind == 'webhook' and target:
+            sinks.append(WebhookSink(target))
+        else:
+            logger.warning("Sink de alertas desconocido: %s", item)
+    return sinks
+
+
+class AlertEngine:
+    """
+    Evalúa las reglas de alerta a medida que se guardan precios
+    
+    Registrado como listener de PriceDatabase, recibe solo los productos
+    tocados por cada ingesta y consulta sus reglas por índice: el costo
+    depende de los cambios y no del tamaño del catálogo. Las alertas se
+    guardan en alert_events (sin repetir regla, producto y observación) y
+    solo las nuevas se encolan para los sinks.
+    
+    La entrega corre en un thread propio: un webhook caído no demora el
+    save_price/save_prices que disparó la alerta (un click en la app o un
+    worker de JobManager).
+    """
+    
+    def __init__(self, db, sinks: Optional[List[Callable[[Dict], None]]] = None):
+        """
+        Args:
+            db: PriceDatabase donde viven reglas y alertas
+            sinks: Destinos de las alertas (por defecto sinks_from_env())
+        """
+        self.db = db
+        self.sinks = sinks if sinks is not None else sinks_from_env()
+        self._queue: "queue.Queue[Optional[List[Dict]]]" = queue.Queue(maxsize=ALERT_QUEUE_SIZE)
+        self._worker: Optional[threading.Thread] = None
+        self._worker_lock = threading.Lock()
+    
+    def attach(self) -> "AlertEngine":
+        """
+        Empieza a evaluar cada ingesta de la base
+        """
+        self.db.add_listener(self.on_ingest)
+        return self
+    
+    def detach(self):
+        self.db.remove_listener(self.on_ingest)
+    
+    def on_ingest(self, changes: List[Dict]) -> List[Dict]:
+        """
+        Evalúa y guarda las alertas de una ingesta y las encola para entregar
+        
+        Args:
+            changes: Cambios por producto de save_price/save_prices
+        
+        Returns:
+            Alertas nuevas encoladas
+        """
+        events = self.evaluate(changes)
+        if not events:
+            return []
+        
+        events = self.db.save_alert_events(events)
+        self.enqueue(events)
+        return events
+    
+    def enqueue(self, events: List[Dict]):
+        """
+        Encola alertas para que el thread de entrega las pase a los sinks
+        """
+        if not events:
+            return
+        
+        with self._worker_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._deliver_loop, name="alert-delivery", daemon=True)
+                self._worker.start()
+        
+        try:
+            self._queue.put_nowait(events)
+        except queue.Full:
+            sink_errors_counter.inc(sink='queue')
+            logger.warning("Cola de alertas llena, no se entregan", extra={'count': len(events)})
+    
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Espera a que se entreguen las alertas encoladas
+        
+        Args:
+            timeout: Segundos máximos de espera (None = sin límite)
+        
+        Returns:
+            True si la cola quedó vacía
+        """
+        with self._queue.all_tasks_done:
+            return self._queue.all_tasks_done.wait_for(lambda: not self._queue.unfinished_tasks, timeout)
+    
+    def close(self, timeout: Optional[float] = None):
+        """
+        Deja de evaluar ingestas y termina el thread de entrega tras lo pendiente
+        """
+        self.detach()
+        with self._worker_lock:
+            worker, self._worker = self._worker, None
+        if worker is not None:
+            self._queue.put(None)
+            worker.join(timeout)
+    
+    def _deliver_loop(self):
+        while True:
+            events = self._queue.get()
+            try:
+                if events is None:
+                    return
+                self.deliver(events)
+            except Exception as e:
+                logger.error("Error entregando alertas: %s", e)
+            finally:
+                self._queue.task_done()
+    
+    def evaluate(self, changes: List[Dict]) -> List[Dict]:
+        """
+        Alertas que disparan los cambios (sin guardarlas)
+        """
+        changes = [change for change in changes if change.get('price') is not None]
+        if not changes:
+            return []
+        
+        with timed("alert_evaluate"):
+            rules = self.db.get_alert_rules(product_ids=[change['product_id'] for change in changes])
+            if not rules:
+                return []
+            
+            by_product = defaultdict(list)
+            global_rules = []
+            for rule in rules:
+                if rule['product_id'] is None:
+                    global_rules.append(rule)
+                else:
+                    by_product[rule['product_id']].append(rule)
+            
+            events = []
+            for change in changes:
+                for rule in by_product.get(change['product_id'], []) + global_rules:
+                    event = evaluate_rule(rule, change)
+                    if event is not None:
+                        events.append(event)
+        
+        return events
+    
+    def deliver(self, events: List[Dict]):
+        """
+        Entrega alertas a todos los sinks (un sink que falla no frena al resto)
+        """
+        if not events:
+            return
+        
+        titles = {}
+        if any(event.get('title') is None for event in events):
+            summaries = self.db.get_product_summaries([event['product_id'] for event in events])
+            titles = {product_id: summary.get('title') for product_id, summary in summaries.items()}
+        
+        for event in events:
+            event.setdefault('title', titles.get(event['product_id']))
+            alert_events_counter.inc(kind=event['kind'])
+            
+            for sink in self.sinks:
+                try:
+                    sink(event)
+                except Exception as e:
+                    name = getattr(sink, 'name', type(sink).__name__)
+                    sink_errors_counter.inc(sink=name)
+                    logger.warning("Error entregando alerta: %s", e,
+                                   extra={'sink': name, 'product_id': event['product_id']})
+        
+        logger.info("Alertas entregadas", extra={'count': len(events), 'sinks': len(self.sinks)})
+
+
+def start_webhook_stub(port: Optional[int] = None, host: str = "127.0.0.1"):
+    """
+    Levanta un receptor de webhooks local para probar WebhookSink
+    
+    Args:
+        port: Puerto (por defecto 9109)
+        host: Interfaz de escucha (solo local por defecto)
+    
+    Returns:
+        Servidor HTTP en ejecución; las alertas recibidas quedan en server.events
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    
+    class _WebhookHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length', 0))
+            try:
+                event = json.loads(self.rfile.read(length) or b'{}')
+            except ValueError:
+                self.send_error(400)
+                return
+            
+            self.server.events.append(event)
+            self.send_response(204)
+            self.end_headers()
+        
+        def log_message(self, format, *args):
+            pass
+    
+    server = ThreadingHTTPServer((host, DEFAULT_WEBHOOK_PORT if port is None else port), _WebhookHandler)
+    server.events = []
+    thread = threading.Thread(target=server.serve_forever, name="alert-webhook-stub", daemon=True)
+    thread.start()
+    return server
+
+
+if __name__ == "__main__":
+    import time
+    
+    server = start_webhook_stub()
+    print(f"Webhook de prueba escuchando en http://{server.server_address[0]}:{server.server_address[1]}/alerts")
+    seen = 0
+    try:
+        while True:
+            time.sleep(1)
+            for event in server.events[seen:]:
+                print(json.dumps(event, ensure_ascii=False, indent=2))
+            seen = len(server.events)
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -3,19 +3,165 @@ Módulo de Análisis y Visualización
 Contiene funciones para analizar datos de precios y crear gráficos
 """
 
+import json
+import warnings
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
-import plotly.graph_objects as go
-import plotly.express as px
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 import numpy as np
 
+try:
+    from .downsampling import DEFAULT_MAX_POINTS, downsample_frame, minmax_envelope, plotly_envelope_traces
+    from .logger import get_logger
+    from .metrics import timed
+    from .profiling import profiled
+except ImportError:
+    from downsampling import DEFAULT_MAX_POINTS, downsample_frame, minmax_envelope, plotly_envelope_traces
+    from logger import get_logger
+    from metrics import timed
+    from profiling import profiled
 
-# Configuración de estilo para matplotlib
-plt.style.use('seaborn-v0_8-darkgrid')
-sns.set_palette("husl")
+
+logger = get_logger(__name__)
+
+
+def _pyplot():
+    """
+    Importa matplotlib/seaborn al primer gráfico estático y aplica el estilo
+    
+    Mantener estos imports fuera del nivel de módulo evita pagar su costo en
+    procesos que solo calculan estadísticas.
+    """
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    
+    if not getattr(_pyplot, 'styled', False):
+        # Configuración de estilo para matplotlib
+        plt.style.use('seaborn-v0_8-darkgrid')
+        sns.set_palette("husl")
+        _pyplot.styled = True
+    
+    return plt
+
+
+# Ventanas temporales de los indicadores (los scrapeos no son regulares: se usan ventanas por tiempo)
+INDICATOR_WINDOWS = ('7D', '30D', '90D')
+
+# Vida media del promedio exponencial y ventana de la línea base del z-score
+EWMA_HALFLIFE = '7D'
+ZSCORE_WINDOW = '30D'
+
+# Umbrales de detect_best_time_to_buy (compartidos por la versión vectorizada)
+BUY_MIN_RECORDS = 7
+
+# Umbrales de las señales de compra basadas en indicadores
+SIGNAL_ZSCORE = 1.0
+SIGNAL_MIN_MARGIN = 1.02
+
+SIGNAL_MESSAGES = [
+    "¡EXCELENTE momento para comprar! Mínimo de 30 días y muy por debajo de su media móvil",
+    "Buen momento para comprar. Precio por debajo de la tendencia reciente",
+    "Momento aceptable. Precio dentro del rango habitual",
+    "Considera esperar. Precio sobre la tendencia reciente",
+]
+SIGNAL_DEFAULT = "Mejor esperar. Precio anormalmente alto respecto a los últimos 30 días"
+
+
+def compute_indicators(prices: pd.DataFrame, windows: tuple = INDICATOR_WINDOWS,
+                       halflife: str = EWMA_HALFLIFE, zscore_window: str = ZSCORE_WINDOW) -> pd.DataFrame:
+    """
+    Calcula indicadores de ventana móvil para uno o varios productos
+    
+    Todas las ventanas son temporales (ej: '30D' = observaciones de los últimos
+    30 días), por lo que funcionan con timestamps irregulares. Cada indicador
+    es una sola pasada rolling/ewm de pandas agrupada por producto.
+    
+    Args:
+        prices: DataFrame con price y scraped_at (datetime), y opcionalmente
+            product_id; debe estar ordenado por (product_id, scraped_at)
+        windows: Ventanas de media, mediana y mínimo móviles
+        halflife: Vida media del promedio exponencial (EWMA)
+        zscore_window: Ventana de la media/desvío usados como línea base del z-score
+    
+    Returns:
+        DataFrame alineado con `prices` con columnas mean_7d, median_7d, min_7d
+        (por cada ventana), ewma, zscore y drawdown_pct (caída desde el máximo)
+    """
+    columns = [c for c in ('product_id', 'scraped_at', 'price') if c in prices.columns]
+    result = prices[columns].reset_index(drop=True)
+    if result.empty:
+        return result
+    
+    frame = pd.DataFrame({
+        'key': prices['product_id'].to_numpy() if 'product_id' in prices.columns else 0,
+        'price': prices['price'].to_numpy(dtype='float64'),
+        'scraped_at': prices['scraped_at'].to_numpy(),
+    })
+    # Con sort=False y grupos contiguos, los resultados quedan en el orden de las filas
+    grouped = frame.groupby('key', sort=False)
+    price = frame['price'].to_numpy()
+    
+    for window in dict.fromkeys(tuple(windows) + (zscore_window,)):
+        rolling = grouped.rolling(window, on='scraped_at')['price']
+        suffix = window.lower()
+        
+        if window in windows:
+            result[f'mean_{suffix}'] = rolling.mean().to_numpy()
+            result[f'median_{suffix}'] = rolling.median().to_numpy()
+            result[f'min_{suffix}'] = rolling.min().to_numpy()
+        
+        if window == zscore_window:
+            baseline = result[f'mean_{suffix}'].to_numpy() if window in windows else rolling.mean().to_numpy()
+            spread = rolling.std().to_numpy()
+    
+    result['ewma'] = grouped['price'].ewm(halflife=halflife, times=frame['scraped_at']).mean().to_numpy()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        result['zscore'] = np.where(spread > 0, (price - baseline) / spread, np.nan)
+    result['drawdown_pct'] = (price / grouped['price'].cummax().to_numpy() - 1) * 100
+    
+    return result
+
+
+def _buy_signals(latest: pd.DataFrame, count) -> pd.DataFrame:
+    """
+    Señal de compra vectorizada a partir de la última fila de indicadores
+    
+    Args:
+        latest: Indicadores del último registro de cada producto
+        count: Cantidad de registros de cada producto (alineada con latest)
+    
+    Returns:
+        DataFrame con signal, score y los indicadores usados
+    """
+    price = latest['price']
+    zscore = latest['zscore'].fillna(0.0)
+    minimum = latest[f'min_{ZSCORE_WINDOW.lower()}']
+    
+    conditions = [
+        (price <= minimum * SIGNAL_MIN_MARGIN) & (zscore <= -SIGNAL_ZSCORE),
+        (zscore <= -SIGNAL_ZSCORE) | (price <= latest['ewma'] * 0.95),
+        zscore < SIGNAL_ZSCORE,
+        zscore < 2 * SIGNAL_ZSCORE,
+    ]
+    enough = np.asarray(count) >= BUY_MIN_RECORDS
+    
+    signals = latest.copy()
+    signals['signal'] = np.where(enough, np.select(conditions, SIGNAL_MESSAGES, SIGNAL_DEFAULT),
+                                 'Necesitas más datos históricos')
+    signals['score'] = np.where(enough, np.select(conditions, [5, 4, 3, 2], 1), np.nan)
+    return signals
+
+
+# Parámetros del pronóstico
+FORECAST_HORIZON = 7                     # Días hacia adelante ("próxima semana")
+FORECAST_HOLDOUT = 7                     # Días reservados para elegir el modelo
+FORECAST_MIN_POINTS = 14                 # Observaciones mínimas para pronosticar
+FORECAST_HISTORY = '180D'                # Histórico leído al reajustar
+FORECAST_ALPHAS = (0.1, 0.3, 0.5, 0.8)   # Suavizados evaluados en SES
+FORECAST_SEASON = 7                      # Estacionalidad semanal del seasonal naive
+FORECAST_TREND_WINDOW = 28               # Días de la recta robusta (Theil-Sen)
+FORECAST_WATERMARK = 'price_forecasts'
+FORECAST_MODELS = ('ses', 'seasonal_naive', 'trend')
 
 
 class PriceAnalyzer:
@@ -23,6 +169,7 @@ class PriceAnalyzer:
     Clase para analizar datos de precios
     """
     
+    @timed("analyzer_call", method="__init__")
     def __init__(self, price_history: List[Dict]):
         """
         Inicializa el analizador con histórico de precios
@@ -34,9 +181,11 @@ class PriceAnalyzer:
         
         if not self.df.empty:
             # Convertir scraped_at a datetime
-            self.df['scraped_at'] = pd.to_datetime(self.df['scraped_at'])
+            self.df['scraped_at'] = pd.to_datetime(self.df['scraped_at'], format='ISO8601')
             self.df = self.df.sort_values('scraped_at')
     
+    @timed("analyzer_call", method="get_statistics")
+    @profiled("analyzer.get_statistics")
     def get_statistics(self) -> Dict:
         """
         Calcula estadísticas básicas del precio
@@ -75,34 +224,47 @@ class PriceAnalyzer:
         
         return ((last_price - first_price) / first_price) * 100
     
-    def plot_price_evolution(self, save_path: Optional[str] = None, interactive: bool = True):
+    @timed("analyzer_call", method="plot_price_evolution")
+    @profiled("analyzer.plot_price_evolution")
+    def plot_price_evolution(self, save_path: Optional[str] = None, interactive: bool = True,
+                             max_points: Optional[int] = None, dpi: int = 300):
         """
         Genera gráfico de evolución de precios
         
         Args:
             save_path: Ruta para guardar el gráfico (opcional)
             interactive: Si True, usa Plotly (interactivo), sino Matplotlib
+            max_points: Presupuesto de puntos de la línea (por defecto DEFAULT_MAX_POINTS)
+            dpi: Resolución del PNG (solo Matplotlib)
         """
         if self.df.empty:
             print("No hay datos para graficar")
             return
         
         if interactive:
-            self._plot_plotly(save_path)
+            self._plot_plotly(save_path, max_points)
         else:
-            self._plot_matplotlib(save_path)
+            self._plot_matplotlib(save_path, max_points, dpi)
     
-    def _plot_plotly(self, save_path: Optional[str] = None):
+    def _plot_plotly(self, save_path: Optional[str] = None, max_points: Optional[int] = None):
         """
         Crea gráfico interactivo con Plotly
         """
+        import plotly.graph_objects as go
+        
         fig = go.Figure()
         
+        # Históricos largos: línea reducida con LTTB y banda min/max para no perder extremos
+        line = downsample_frame(self.df, max_points)
+        if len(line) < len(self.df):
+            for trace in plotly_envelope_traces(minmax_envelope(self.df, len(line) // 2)):
+                fig.add_trace(trace)
+        
         # Línea de precios
         fig.add_trace(go.Scatter(
-            x=self.df['scraped_at'],
-            y=self.df['price'],
-            mode='lines+markers',
+            x=line['scraped_at'],
+            y=line['price'],
+            mode='lines+markers' if len(line) == len(self.df) else 'lines',
             name='Precio',
             line=dict(color='#2E86AB', width=2),
             marker=dict(size=8),
@@ -146,15 +308,25 @@ class PriceAnalyzer:
         else:
             fig.show()
     
-    def _plot_matplotlib(self, save_path: Optional[str] = None):
+    def _plot_matplotlib(self, save_path: Optional[str] = None, max_points: Optional[int] = None,
+                         dpi: int = 300):
         """
         Crea gráfico estático con Matplotlib
         """
+        plt = _pyplot()
         fig, ax = plt.subplots(figsize=(12, 6))
         
+        # Históricos largos: línea reducida con LTTB y banda min/max para no perder extremos
+        line = downsample_frame(self.df, max_points)
+        if len(line) < len(self.df):
+            envelope = minmax_envelope(self.df, len(line) // 2)
+            ax.fill_between(envelope['scraped_at'], envelope['min'], envelope['max'],
+                            alpha=0.2, label='Rango min/máx')
+        
         # Línea de precios
-        ax.plot(self.df['scraped_at'], self.df['price'], 
-                marker='o', linewidth=2, markersize=6, label='Precio')
+        ax.plot(line['scraped_at'], line['price'], 
+                marker='o' if len(line) == len(self.df) else None,
+                linewidth=2, markersize=6, label='Precio')
         
         # Línea de precio promedio
         avg_price = self.df['price'].mean()
@@ -178,22 +350,28 @@ class PriceAnalyzer:
         plt.tight_layout()
         
         if save_path:
-            plt.savefig(save_path, dpi=300, bbox_inches='tight')
+            plt.savefig(save_path, dpi=dpi, bbox_inches='tight')
+            # Cerrar la figura: en renders por lote se acumularían en memoria
+            plt.close(fig)
             print(f"✓ Gráfico guardado en: {save_path}")
         else:
             plt.show()
     
-    def plot_price_distribution(self, save_path: Optional[str] = None):
+    @timed("analyzer_call", method="plot_price_distribution")
+    @profiled("analyzer.plot_price_distribution")
+    def plot_price_distribution(self, save_path: Optional[str] = None, dpi: int = 300):
         """
         Genera histograma de distribución de precios
         
         Args:
             save_path: Ruta para guardar el gráfico
+            dpi: Resolución del PNG
         """
         if self.df.empty:
             print("No hay datos para graficar")
             return
         
+        plt = _pyplot()
         fig, ax = plt.subplots(figsize=(10, 6))
         
         ax.hist(self.df['price'], bins=20, edgecolor='black', alpha=0.7)
@@ -211,11 +389,14 @@ class PriceAnalyzer:
         plt.tight_layout()
         
         if save_path:
-            plt.savefig(save_path, dpi=300, bbox_inches='tight')
+            plt.savefig(save_path, dpi=dpi, bbox_inches='tight')
+            plt.close(fig)
             print(f"✓ Gráfico guardado en: {save_path}")
         else:
             plt.show()
     
+    @timed("analyzer_call", method="detect_best_time_to_buy")
+    @profiled("analyzer.detect_best_time_to_buy")
     def detect_best_time_to_buy(self) -> Dict:
         """
         Analiza el mejor momento para comprar basándose en patrones
@@ -258,10 +439,930 @@ class PriceAnalyzer:
             'percentage_below_avg': percentage_below_avg,
             'percentage_above_min': percentage_above_min
         }
+    
+    @timed("analyzer_call", method="get_indicators")
+    @profiled("analyzer.get_indicators")
+    def get_indicators(self, windows: tuple = INDICATOR_WINDOWS) -> pd.DataFrame:
+        """
+        Indicadores de ventana móvil de cada registro (ver compute_indicators)
+        
+        Args:
+            windows: Ventanas temporales de media, mediana y mínimo
+        
+        Returns:
+            DataFrame con scraped_at, price y una columna por indicador
+        """
+        if self.df.empty:
+            return pd.DataFrame()
+        
+        return compute_indicators(self.df, windows)
+    
+    @timed("analyzer_call", method="get_buy_signals")
+    @profiled("analyzer.get_buy_signals")
+    def get_buy_signals(self) -> Dict:
+        """
+        Recomendación basada en la tendencia reciente en lugar del histórico completo
+        
+        Compara el último precio contra su media móvil de 30 días (z-score),
+        el mínimo de la ventana y el promedio exponencial.
+        
+        Returns:
+            Diccionario con signal, score e indicadores del último registro
+        """
+        if len(self.df) < BUY_MIN_RECORDS:
+            return {'signal': 'Necesitas más datos históricos'}
+        
+        latest = self.get_indicators().tail(1)
+        signals = _buy_signals(latest, [len(self.df)])
+        return signals.iloc[0].to_dict()
+    
+    @timed("analyzer_call", method="forecast")
+    @profiled("analyzer.forecast")
+    def forecast(self, horizon: int = FORECAST_HORIZON) -> Dict:
+        """
+        Precio pronosticado a `horizon` días con banda de confianza del 95%
+        
+        Returns:
+            Diccionario con model, params, target_at, forecast, lower, upper y mae
+            (vacío si no hay suficientes registros)
+        """
+        if len(self.df) < FORECAST_MIN_POINTS:
+            return {}
+        
+        prices = self.df[['price', 'scraped_at']].assign(product_id='product')
+        result = PriceForecaster(horizon).fit(prices)
+        return result.iloc[0].to_dict() if not result.empty else {}
+
+
+# Columnas del frame columnar del catálogo
+CATALOG_COLUMNS = ['product_id', 'price', 'scraped_at']
+
+
+# Parámetros del análisis de co-movimiento entre productos
+CORRELATION_FREQ = 'D'          # Grilla temporal común
+CORRELATION_MIN_OVERLAP = 14    # Períodos con variación en ambos productos
+CORRELATION_BLOCK = 1024        # Productos por bloque de la multiplicación de matrices
+CORRELATION_MAX_LAG = 7         # Períodos evaluados en el lead-lag
+
+
+class CatalogAnalyzer:
+    """
+    Analizador vectorizado sobre todo el catálogo
+    
+    Carga todos los precios una sola vez en un frame columnar (product_id,
+    price, scraped_at) y calcula las mismas métricas que PriceAnalyzer para
+    cada producto con groupby, sin construir un DataFrame por producto.
+    """
+    
+    def __init__(self, prices: pd.DataFrame):
+        """
+        Inicializa el analizador con el frame de precios
+        
+        Args:
+            prices: DataFrame con columnas product_id, price y scraped_at
+        """
+        self.df = prices[CATALOG_COLUMNS].copy() if not prices.empty else pd.DataFrame(columns=CATALOG_COLUMNS)
+        
+        if not self.df.empty:
+            if not pd.api.types.is_datetime64_any_dtype(self.df['scraped_at']):
+                self.df['scraped_at'] = pd.to_datetime(self.df['scraped_at'], format='ISO8601')
+            self.df['price'] = self.df['price'].astype('float64')
+            self.df = self.df.sort_values(['product_id', 'scraped_at'], kind='stable').reset_index(drop=True)
+        
+        self._grouped = self.df.groupby('product_id', sort=False)
+    
+    @classmethod
+    def from_database(cls, db, product_ids: Optional[List[str]] = None,
+                      batch_size: int = 200_000) -> 'CatalogAnalyzer':
+        """
+        Construye el analizador leyendo la tabla de precios en lotes
+        
+        Args:
+            db: Instancia de PriceDatabase
+            product_ids: Restringe el análisis a estos productos (opcional)
+            batch_size: Filas por lote leído
+        
+        Returns:
+            CatalogAnalyzer con todo el histórico solicitado
+        """
+        frames = [
+            pd.DataFrame.from_records(rows, columns=CATALOG_COLUMNS)
+            for rows in db.iter_price_rows(batch_size, product_ids)
+        ]
+        prices = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=CATALOG_COLUMNS)
+        return cls(prices)
+    
+    @classmethod
+    def from_histories(cls, histories: Dict[str, List[Dict]]) -> 'CatalogAnalyzer':
+        """
+        Construye el analizador desde históricos en memoria {product_id: history}
+        """
+        frames = [
+            pd.DataFrame(history).assign(product_id=product_id)
+            for product_id, history in histories.items() if history
+        ]
+        prices = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=CATALOG_COLUMNS)
+        return cls(prices)
+    
+    @timed("analyzer_call", method="catalog.get_statistics")
+    @profiled("analyzer.catalog.get_statistics")
+    def get_statistics(self) -> pd.DataFrame:
+        """
+        Estadísticas por producto (mismas claves que PriceAnalyzer.get_statistics)
+        
+        Returns:
+            DataFrame indexado por product_id
+        """
+        if self.df.empty:
+            return pd.DataFrame()
+        
+        stats = self._grouped.agg(
+            precio_actual=('price', 'last'),
+            precio_minimo=('price', 'min'),
+            precio_maximo=('price', 'max'),
+            precio_promedio=('price', 'mean'),
+            precio_mediana=('price', 'median'),
+            desviacion_estandar=('price', 'std'),
+            precio_inicial=('price', 'first'),
+            total_registros=('price', 'size'),
+            fecha_primer_registro=('scraped_at', 'first'),
+            fecha_ultimo_registro=('scraped_at', 'last'),
+        )
+        
+        stats['variacion_porcentual'] = self._variation(stats['precio_inicial'], stats['precio_actual'],
+                                                        stats['total_registros'])
+        
+        return stats[[
+            'precio_actual', 'precio_minimo', 'precio_maximo', 'precio_promedio',
+            'precio_mediana', 'desviacion_estandar', 'variacion_porcentual',
+            'total_registros', 'fecha_primer_registro', 'fecha_ultimo_registro'
+        ]]
+    
+    @staticmethod
+    def _variation(first: pd.Series, last: pd.Series, count: pd.Series) -> pd.Series:
+        """
+        Versión vectorizada de PriceAnalyzer._calculate_variation
+        """
+        variation = (last - first) / first * 100
+        return variation.where(count >= 2, 0.0)
+    
+    def _calculate_variation(self) -> pd.Series:
+        """
+        Variación porcentual (primer vs último precio) de cada producto
+        """
+        if self.df.empty:
+            return pd.Series(dtype='float64')
+        
+        return self._variation(self._grouped['price'].first(), self._grouped['price'].last(),
+                               self._grouped['price'].size())
+    
+    @timed("analyzer_call", method="catalog.detect_best_time_to_buy")
+    @profiled("analyzer.catalog.detect_best_time_to_buy")
+    def detect_best_time_to_buy(self) -> pd.DataFrame:
+        """
+        Recomendación de compra de cada producto (misma regla que PriceAnalyzer)
+        
+        Returns:
+            DataFrame indexado por product_id; los productos con menos de 7
+            registros quedan con score NaN y la recomendación de juntar más datos
+        """
+        if self.df.empty:
+            return pd.DataFrame()
+        
+        current = self._grouped['price'].last()
+        avg = self._grouped['price'].mean()
+        minimum = self._grouped['price'].min()
+        count = self._grouped['price'].size()
+        
+        conditions = [
+            current <= minimum * 1.05,
+            current <= avg * 0.95,
+            current <= avg * 1.05,
+            current <= avg * 1.15,
+        ]
+        recommendations = [
+            "¡EXCELENTE momento para comprar! Precio cerca del mínimo histórico",
+            "Buen momento para comprar. Precio por debajo del promedio",
+            "Momento aceptable. Precio cerca del promedio",
+            "Considera esperar. Precio sobre el promedio",
+        ]
+        enough = (count >= BUY_MIN_RECORDS).to_numpy()
+        
+        result = pd.DataFrame({
+            'recommendation': np.where(
+                enough,
+                np.select(conditions, recommendations,
+                          "Mejor esperar. Precio muy alto comparado con el histórico"),
+                'Necesitas más datos históricos'
+            ),
+            'score': np.where(enough, np.select(conditions, [5, 4, 3, 2], 1), np.nan),
+            'current_price': current,
+            'average_price': avg,
+            'min_price': minimum,
+            'percentage_below_avg': (avg - current) / avg * 100,
+            'percentage_above_min': (current - minimum) / minimum * 100,
+        }, index=current.index)
+        
+        return result
+    
+    @timed("analyzer_call", method="catalog.get_indicators")
+    @profiled("analyzer.catalog.get_indicators")
+    def get_indicators(self, windows: tuple = INDICATOR_WINDOWS) -> pd.DataFrame:
+        """
+        Indicadores de ventana móvil de todos los registros de todos los productos
+        
+        Args:
+            windows: Ventanas temporales de media, mediana y mínimo
+        
+        Returns:
+            DataFrame con product_id, scraped_at, price y una columna por indicador
+        """
+        if self.df.empty:
+            return pd.DataFrame()
+        
+        return compute_indicators(self.df, windows)
+    
+    @timed("analyzer_call", method="catalog.get_buy_signals")
+    @profiled("analyzer.catalog.get_buy_signals")
+    def get_buy_signals(self) -> pd.DataFrame:
+        """
+        Señal de compra por tendencia reciente de cada producto
+        
+        Returns:
+            DataFrame indexado por product_id (misma regla que PriceAnalyzer.get_buy_signals)
+        """
+        if self.df.empty:
+            return pd.DataFrame()
+        
+        indicators = self.get_indicators()
+        latest = indicators.drop_duplicates('product_id', keep='last').set_index('product_id')
+        return _buy_signals(latest, self._grouped['price'].size().reindex(latest.index))
+    
+    @timed("analyzer_call", method="catalog.get_correlations")
+    @profiled("analyzer.catalog.get_correlations")
+    def get_correlations(self, top_k: int = 10, min_correlation: float = 0.5,
+                         max_lag: int = CORRELATION_MAX_LAG, freq: str = CORRELATION_FREQ) -> pd.DataFrame:
+        """
+        Pares de productos con precios que se mueven juntos (ver correlate_prices)
+        
+        Args:
+            top_k: Pares retenidos por producto
+            min_correlation: Correlación mínima para reportar un par
+            max_lag: Desfase máximo del lead-lag (en períodos)
+            freq: Período de la grilla común
+        
+        Returns:
+            DataFrame de pares ordenado por correlación
+        """
+        return correlate_prices(self.df, top_k, min_correlation, max_lag=max_lag, freq=freq)
+    
+    def analyze(self) -> pd.DataFrame:
+        """
+        Tabla única con estadísticas y recomendación de todos los productos
+        
+        Returns:
+            DataFrame indexado por product_id
+        """
+        stats = self.get_statistics()
+        if stats.empty:
+            return stats
+        
+        buy = self.detect_best_time_to_buy()[['recommendation', 'score', 'percentage_below_avg',
+                                              'percentage_above_min']]
+        return stats.join(buy)
+
+
+# Parámetros del detector de anomalías
+ANOMALY_WINDOW = '30D'             # Ventana de la mediana/MAD y del precio habitual
+ANOMALY_BASELINE_QUANTILE = 0.25   # Precio habitual: cuantil bajo, robusto a subas de pocos días
+ANOMALY_MIN_HISTORY = 5            # Observaciones mínimas en la ventana para evaluar
+ANOMALY_ZSCORE = 3.5               # Umbral del z-score robusto (Iglewicz-Hoaglin)
+ANOMALY_MIN_MAD = 0.02             # Piso del MAD como fracción de la mediana (precios planos)
+SPIKE_MIN_CHANGE = 0.30            # Salto mínimo de un glitch de scrapeo
+SPIKE_REVERT_TOLERANCE = 0.05      # Distancia máxima al precio previo al volver
+INFLATION_MIN = 0.10               # Suba previa y "descuento" mínimos de una oferta falsa
+ANOMALY_WATERMARK = 'price_anomalies'
+
+ANOMALY_COLUMNS = ['product_id', 'price', 'scraped_at', 'price_id']
+
+
+class AnomalyDetector:
+    """
+    Detector vectorizado de precios sospechosos
+    
+    Marca tres tipos de observaciones:
+    - outlier: z-score robusto (mediana/MAD de 30 días) fuera de umbral
+    - spike: salto brusco que vuelve al precio anterior en el registro siguiente
+      (típico de un error de scrapeo)
+    - fake_discount: "oferta" que baja el precio después de una suba reciente,
+      sin quedar por debajo del precio habitual de los 30 días previos
+    
+    Todas las reglas usan ventanas hacia atrás, por lo que el resultado de una
+    observación no cambia cuando llegan precios nuevos (salvo spike, que
+    necesita el registro siguiente). Eso permite correrlo incrementalmente.
+    """
+    
+    def __init__(self, zscore: float = ANOMALY_ZSCORE, spike_change: float = SPIKE_MIN_CHANGE,
+                 inflation: float = INFLATION_MIN):
+        """
+        Inicializa el detector con sus umbrales
+        
+        Args:
+            zscore: Umbral del z-score robusto
+            spike_change: Salto relativo mínimo de un spike
+            inflation: Suba previa y descuento relativos mínimos de una oferta falsa
+        """
+        self.zscore = zscore
+        self.spike_change = spike_change
+        self.inflation = inflation
+    
+    @timed("analyzer_call", method="anomalies.detect")
+    @profiled("analyzer.anomalies.detect")
+    def detect(self, prices: pd.DataFrame) -> pd.DataFrame:
+        """
+        Marca las observaciones anómalas de uno o varios productos
+        
+        Args:
+            prices: DataFrame con product_id, price, scraped_at (y opcionalmente
+                price_id), ordenado por (product_id, scraped_at)
+        
+        Returns:
+            DataFrame con una fila por (observación, tipo): las columnas de
+            entrada más kind, score y baseline
+        """
+        columns = [c for c in ANOMALY_COLUMNS if c in prices.columns]
+        if prices.empty:
+            return pd.DataFrame(columns=columns + ['kind', 'score', 'baseline'])
+        
+        frame = prices[columns].reset_index(drop=True)
+        if not pd.api.types.is_datetime64_any_dtype(frame['scraped_at']):
+            frame['scraped_at'] = pd.to_datetime(frame['scraped_at'], format='ISO8601')
+        frame['price'] = frame['price'].astype('float64')
+        
+        grouped = frame.groupby('product_id', sort=False)
+        price = frame['price'].to_numpy()
+        
+        # z-score robusto: MAD aproximado como mediana móvil de |precio - mediana móvil|
+        window = grouped.rolling(ANOMALY_WINDOW, on='scraped_at')['price']
+        median = window.median().to_numpy()
+        in_window = window.count().to_numpy()
+        deviation = frame.assign(price=np.abs(price - median)).groupby('product_id', sort=False)
+        mad = deviation.rolling(ANOMALY_WINDOW, on='scraped_at')['price'].median().to_numpy()
+        mad = np.maximum(mad, median * ANOMALY_MIN_MAD)
+        robust_z = 0.6745 * (price - median) / mad
+        outlier = (in_window >= ANOMALY_MIN_HISTORY) & (np.abs(robust_z) >= self.zscore)
+        
+        # Spike/revert: salto brusco y el registro siguiente vuelve al precio anterior
+        previous = grouped['price'].shift(1).to_numpy()
+        following = grouped['price'].shift(-1).to_numpy()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            jump = price / previous - 1
+            spike = (np.abs(jump) >= self.spike_change) & \
+                    (np.abs(following / previous - 1) <= SPIKE_REVERT_TOLERANCE)
+        
+        # Oferta falsa: el precio anterior estaba inflado respecto del habitual de
+        # los días previos y la "oferta" no baja de ese precio habitual
+        baseline_window = grouped.rolling(ANOMALY_WINDOW, on='scraped_at', closed='left')['price']
+        baseline = baseline_window.quantile(ANOMALY_BASELINE_QUANTILE).to_numpy()
+        baseline_count = baseline_window.count().to_numpy()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            fake = (
+                (baseline_count >= ANOMALY_MIN_HISTORY)
+                & (previous >= baseline * (1 + self.inflation))
+                & (price <= previous * (1 - self.inflation))
+                & (price >= baseline * (1 - SPIKE_REVERT_TOLERANCE))
+            )
+        
+        flagged = [
+            frame[outlier].assign(kind='outlier', score=robust_z[outlier], baseline=median[outlier]),
+            frame[spike].assign(kind='spike', score=jump[spike] * 100, baseline=previous[spike]),
+            frame[fake].assign(kind='fake_discount', score=(1 - price[fake] / previous[fake]) * 100,
+                               baseline=baseline[fake]),
+        ]
+        return pd.concat(flagged, ignore_index=True)
+    
+    def run(self, db, full: bool = False, batch_size: int = 200_000) -> int:
+        """
+        Analiza la tabla de precios por lotes y guarda lo marcado en price_anomalies
+        
+        En modo incremental solo se leen los productos con precios nuevos desde
+        la última corrida, y de ellos solo el contexto necesario para las
+        ventanas; se evalúan los precios nuevos y el registro previo a ellos.
+        
+        Args:
+            db: Instancia de PriceDatabase
+            full: Recalcula todo el histórico en lugar de continuar desde la marca de agua
+            batch_size: Filas por lote leído
+        
+        Returns:
+            Cantidad de anomalías guardadas
+        """
+        watermark = 0 if full else db.get_watermark(ANOMALY_WATERMARK)
+        changed, last_id = db.get_products_updated_since(watermark)
+        if not changed:
+            return 0
+        
+        if full:
+            db.clear_anomalies()
+            product_ids, since = None, None
+        else:
+            # El MAD es una mediana de desvíos respecto de otra mediana móvil: dos ventanas
+            context = 2 * pd.Timedelta(ANOMALY_WINDOW)
+            since = (pd.Timestamp(min(changed.values())) - context).isoformat()
+            product_ids = list(changed)
+        
+        saved = 0
+        pending = None
+        with timed("analyzer_call", method="anomalies.run"):
+            for rows in db.iter_price_rows(batch_size, product_ids, since, with_ids=True):
+                chunk = pd.DataFrame.from_records(rows, columns=ANOMALY_COLUMNS)
+                if pending is not None:
+                    chunk = pd.concat([pending, chunk], ignore_index=True)
+                
+                # El último producto del lote puede continuar en el siguiente
+                tail = (chunk['product_id'] == chunk['product_id'].iat[-1]).to_numpy()
+                pending = chunk[tail]
+                saved += self._save(db, chunk[~tail], watermark)
+            
+            if pending is not None:
+                saved += self._save(db, pending, watermark)
+        
+        db.set_watermark(ANOMALY_WATERMARK, last_id)
+        logger.info("Detección de anomalías completada",
+                    extra={'count': saved, 'products': len(changed), 'full': full})
+        return saved
+    
+    def _save(self, db, chunk: pd.DataFrame, watermark: int) -> int:
+        """
+        Detecta sobre un lote de productos completos y guarda lo nuevo
+        """
+        if chunk.empty:
+            return 0
+        
+        # Se evalúan los precios nuevos y el anterior a ellos (su spike depende del siguiente)
+        new = (chunk['price_id'] > watermark).to_numpy()
+        next_new = chunk.groupby('product_id', sort=False)['price_id'].shift(-1).gt(watermark).to_numpy()
+        evaluate = set(chunk['price_id'].to_numpy()[new | next_new].tolist())
+        
+        flagged = self.detect(chunk)
+        flagged = flagged[flagged['price_id'].isin(evaluate)]
+        
+        return db.save_anomalies([
+            (int(row.price_id), row.product_id, row.kind, float(row.price),
+             row.scraped_at.isoformat(), float(row.score), float(row.baseline))
+            for row in flagged.itertuples(index=False)
+        ])
+
+
+def price_grid(prices: pd.DataFrame, freq: str = CORRELATION_FREQ) -> Tuple[np.ndarray, np.ndarray, pd.DatetimeIndex]:
+    """
+    Alinea todos los productos en una grilla temporal común
+    
+    Toma el último precio de cada producto en cada período y lo arrastra hacia
+    adelante hasta la siguiente observación (el precio sigue vigente entre
+    scrapeos). La matriz es float32 de NumPy, no un DataFrame de objetos.
+    
+    Args:
+        prices: DataFrame con product_id, price y scraped_at
+        freq: Período de la grilla ('D', 'W', ...)
+    
+    Returns:
+        Tupla (matriz períodos x productos con NaN antes de la primera
+        observación, product_ids de las columnas, períodos de las filas)
+    """
+    scraped_at = prices['scraped_at']
+    if not pd.api.types.is_datetime64_any_dtype(scraped_at):
+        scraped_at = pd.to_datetime(scraped_at, format='ISO8601')
+    
+    periods = scraped_at.dt.to_period(freq)
+    product_codes, product_ids = pd.factorize(prices['product_id'])
+    start = periods.min()
+    index = pd.period_range(start, periods.max(), freq=freq)
+    period_codes = periods.array.asi8 - start.ordinal
+    
+    # Un precio por celda: el último del período (la asignación con índices
+    # repetidos de NumPy no garantiza cuál queda)
+    cells = pd.DataFrame({
+        'period': period_codes, 'product': product_codes,
+        'price': prices['price'].to_numpy(dtype=np.float32), 'scraped_at': scraped_at.to_numpy(),
+    }).sort_values('scraped_at', kind='stable').groupby(['period', 'product'], sort=False)['price'].last()
+    grid = np.full((len(index), len(product_ids)), np.nan, dtype=np.float32)
+    grid[cells.index.get_level_values('period'), cells.index.get_level_values('product')] = cells.to_numpy()
+    
+    # Forward fill vectorizado: índice de la última fila válida de cada columna
+    valid_rows = np.where(np.isnan(grid), 0, np.arange(len(index))[:, None])
+    np.maximum.accumulate(valid_rows, axis=0, out=valid_rows)
+    grid = grid[valid_rows, np.arange(len(product_ids))]
+    
+    return grid, np.asarray(product_ids), index.to_timestamp()
+
+
+def _standardize(returns: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Estandariza cada columna sobre sus valores válidos y deja 0 en los faltantes
+    
+    Solo mejora el condicionamiento numérico: la correlación de cada par se
+    recalcula sobre su superposición en _pairwise_correlation.
+    
+    Returns:
+        Tupla (z-scores float32 con 0 en NaN, máscara float32 de valores válidos)
+    """
+    mask = ~np.isnan(returns)
+    count = mask.sum(axis=0)
+    mean = np.where(count > 0, np.nansum(returns, axis=0) / np.maximum(count, 1), 0)
+    centered = np.where(mask, returns - mean, 0)
+    std = np.sqrt((centered ** 2).sum(axis=0) / np.maximum(count - 1, 1))
+    z = np.divide(centered, std, out=np.zeros_like(centered), where=std > 0)
+    return z.astype(np.float32), mask.astype(np.float32)
+
+
+def _pairwise_correlation(z: np.ndarray, mask: np.ndarray, start: int, stop: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Correlación de Pearson de las columnas [start, stop) contra todas
+    
+    Medias y varianzas se toman solo sobre los períodos con datos en ambos
+    productos del par (sumas enmascaradas con productos de matrices).
+    
+    Args:
+        z: Variaciones estandarizadas con 0 en los faltantes
+        mask: Máscara de valores válidos
+        start: Primera columna del bloque
+        stop: Columna siguiente a la última del bloque
+    
+    Returns:
+        Tupla (correlaciones bloque x N, períodos superpuestos bloque x N)
+    """
+    zb, mb = z[:, start:stop], mask[:, start:stop]
+    overlap = mb.T @ mask
+    sum_x, sum_y = zb.T @ mask, mb.T @ z
+    sum_xx, sum_yy = (zb * zb).T @ mask, mb.T @ (z * z)
+    sum_xy = zb.T @ z
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        count = np.maximum(overlap, 1)
+        cov = sum_xy - sum_x * sum_y / count
+        var_x = sum_xx - sum_x ** 2 / count
+        var_y = sum_yy - sum_y ** 2 / count
+        corr = cov / np.sqrt(var_x * var_y)
+    corr[~np.isfinite(corr)] = -np.inf
+    return corr, overlap
+
+
+def correlate_prices(prices: pd.DataFrame, top_k: int = 10, min_correlation: float = 0.5,
+                     min_overlap: int = CORRELATION_MIN_OVERLAP, max_lag: int = CORRELATION_MAX_LAG,
+                     freq: str = CORRELATION_FREQ, block_size: int = CORRELATION_BLOCK) -> pd.DataFrame:
+    """
+    Pares de productos cuyos precios se mueven juntos (correlación y lead-lag)
+    
+    Se correlacionan las variaciones logarítmicas por período (no los niveles,
+    que correlacionan por tendencia), con media y desvío de cada par sobre los
+    períodos que comparten. La matriz de correlación se calcula por
+    bloques de `block_size` productos (Z_bloqueᵀ·Z) y de cada fila se guardan
+    solo los `top_k` mejores con argpartition: la memoria es O(bloque x N), no
+    N x N. Para los pares retenidos se busca el desfase (-max_lag..max_lag)
+    de mayor correlación.
+    
+    Args:
+        prices: DataFrame con product_id, price y scraped_at
+        top_k: Pares retenidos por producto
+        min_correlation: Correlación mínima para reportar un par
+        min_overlap: Períodos mínimos con datos en ambos productos
+        max_lag: Desfase máximo (en períodos) del lead-lag
+        freq: Período de la grilla común
+        block_size: Productos por bloque
+    
+    Returns:
+        DataFrame con product_a, product_b, correlation, overlap, best_lag
+        (positivo: product_a se anticipa a product_b) y lag_correlation,
+        ordenado por correlación descendente
+    """
+    columns = ['product_a', 'product_b', 'correlation', 'overlap', 'best_lag', 'lag_correlation']
+    if prices.empty or prices['product_id'].nunique() < 2:
+        return pd.DataFrame(columns=columns)
+    
+    grid, product_ids, _ = price_grid(prices, freq)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        returns = np.diff(np.log(np.where(grid > 0, grid, np.nan)), axis=0)
+    # Un precio que no cambió no aporta información de co-movimiento
+    returns[returns == 0] = np.nan
+    
+    z, mask = _standardize(returns)
+    n = z.shape[1]
+    k = min(top_k, n - 1)
+    pairs_a, pairs_b, pairs_corr, pairs_overlap = [], [], [], []
+    
+    for start in range(0, n, block_size):
+        stop = min(start + block_size, n)
+        corr, overlap = _pairwise_correlation(z, mask, start, stop)
+        
+        # Fuera: la diagonal y los pares con poca superposición
+        corr[np.arange(stop - start), np.arange(start, stop)] = -np.inf
+        corr[overlap < min_overlap] = -np.inf
+        np.clip(corr, -np.inf, 1.0, out=corr)
+        
+        best = np.argpartition(-corr, k - 1, axis=1)[:, :k]
+        rows = np.repeat(np.arange(stop - start), k)
+        cols = best.ravel()
+        values = corr[rows, cols]
+        keep = values >= min_correlation
+        
+        pairs_a.append(rows[keep] + start)
+        pairs_b.append(cols[keep])
+        pairs_corr.append(values[keep])
+        pairs_overlap.append(overlap[rows[keep], cols[keep]])
+    
+    a = np.concatenate(pairs_a)
+    b = np.concatenate(pairs_b)
+    if len(a) == 0:
+        return pd.DataFrame(columns=columns)
+    
+    # Cada par aparece desde ambos extremos: se conserva una sola orientación
+    first, second = np.minimum(a, b), np.maximum(a, b)
+    result = pd.DataFrame({
+        'a': first, 'b': second,
+        'correlation': np.concatenate(pairs_corr).astype('float64'),
+        'overlap': np.concatenate(pairs_overlap).astype('int64'),
+    }).drop_duplicates(['a', 'b'])
+    
+    best_lag, lag_corr = _lead_lag(returns, result['a'].to_numpy(), result['b'].to_numpy(),
+                                   max_lag, min_overlap, block_size)
+    
+    return pd.DataFrame({
+        'product_a': product_ids[result['a'].to_numpy()],
+        'product_b': product_ids[result['b'].to_numpy()],
+        'correlation': result['correlation'].to_numpy(),
+        'overlap': result['overlap'].to_numpy(),
+        'best_lag': best_lag,
+        'lag_correlation': lag_corr,
+    }).sort_values('correlation', ascending=False, ignore_index=True)
+
+
+def _lead_lag(returns: np.ndarray, a: np.ndarray, b: np.ndarray, max_lag: int,
+              min_overlap: int, chunk_size: int = CORRELATION_BLOCK) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Desfase de mayor correlación de cada par
+    
+    Los pares se procesan de a `chunk_size` (vectorizado dentro de cada lote):
+    las series copiadas ocupan períodos x chunk_size, no períodos x pares.
+    
+    Returns:
+        Tupla (mejor desfase, correlación en ese desfase)
+    """
+    best_lag = np.zeros(len(a), dtype=np.int64)
+    best_corr = np.full(len(a), np.nan)
+    for start in range(0, len(a), chunk_size):
+        stop = start + chunk_size
+        best_lag[start:stop], best_corr[start:stop] = _lead_lag_chunk(
+            returns, a[start:stop], b[start:stop], max_lag, min_overlap)
+    return best_lag, best_corr
+
+
+def _lead_lag_chunk(returns: np.ndarray, a: np.ndarray, b: np.ndarray, max_lag: int,
+                    min_overlap: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Desfase de mayor correlación de un lote de pares (vectorizado)
+    
+    Returns:
+        Tupla (mejor desfase, correlación en ese desfase)
+    """
+    best_lag = np.zeros(len(a), dtype=np.int64)
+    best_corr = np.full(len(a), -np.inf)
+    series_a, series_b = returns[:, a], returns[:, b]
+    periods = returns.shape[0]
+    
+    for lag in range(-max_lag, max_lag + 1):
+        if abs(lag) >= periods:
+            continue
+        # lag > 0: el cambio de a en t se compara con el de b en t + lag
+        x = series_a[:periods - lag] if lag >= 0 else series_a[-lag:]
+        y = series_b[lag:] if lag >= 0 else series_b[:periods + lag]
+        valid = ~(np.isnan(x) | np.isnan(y))
+        count = valid.sum(axis=0)
+        
+        x = np.where(valid, x, 0)
+        y = np.where(valid, y, 0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mean_x = x.sum(axis=0) / count
+            mean_y = y.sum(axis=0) / count
+            cov = (x * y).sum(axis=0) / count - mean_x * mean_y
+            var_x = (x * x).sum(axis=0) / count - mean_x ** 2
+            var_y = (y * y).sum(axis=0) / count - mean_y ** 2
+            corr = cov / np.sqrt(var_x * var_y)
+        corr = np.where((count >= min_overlap) & np.isfinite(corr), corr, -np.inf)
+        
+        better = corr > best_corr
+        best_lag[better] = lag
+        best_corr[better] = corr[better]
+    
+    return best_lag, np.where(np.isfinite(best_corr), best_corr, np.nan)
+
+
+class PriceForecaster:
+    """
+    Pronóstico de precio por producto con modelos livianos ajustados en lote
+    
+    Todos los productos se alinean en una grilla diaria (price_grid) y cada
+    modelo se ajusta sobre la matriz completa, vectorizado entre productos:
+    - ses: suavizado exponencial simple (alpha elegido por producto)
+    - seasonal_naive: repite la última semana
+    - trend: recta robusta de Theil-Sen sobre los últimos 28 días
+    Por producto se elige el modelo con menor error en los últimos 7 días
+    (backtest) y la banda de confianza sale del error de ese backtest.
+    """
+    
+    def __init__(self, horizon: int = FORECAST_HORIZON, holdout: int = FORECAST_HOLDOUT):
+        """
+        Inicializa el pronosticador
+        
+        Args:
+            horizon: Días hacia adelante del pronóstico
+            holdout: Días reservados para comparar modelos
+        """
+        self.horizon = horizon
+        self.holdout = holdout
+    
+    @staticmethod
+    def _ses(y: np.ndarray, steps: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Suavizado exponencial simple para todas las columnas y todos los alphas
+        
+        Returns:
+            Tupla (pronóstico steps x N, alpha elegido por producto)
+        """
+        alphas = np.asarray(FORECAST_ALPHAS)[:, None]
+        level = np.full((len(alphas), y.shape[1]), np.nan)
+        sse = np.zeros_like(level)
+        
+        for row in y:
+            error = row - level
+            sse += np.where(np.isnan(error), 0.0, error ** 2)
+            level = np.where(np.isnan(level), row, np.where(np.isnan(row), level, level + alphas * error))
+        
+        best = sse.argmin(axis=0)
+        final = level[best, np.arange(y.shape[1])]
+        return np.tile(final, (steps, 1)), alphas[best, 0]
+    
+    @staticmethod
+    def _seasonal_naive(y: np.ndarray, steps: int) -> np.ndarray:
+        season = min(FORECAST_SEASON, len(y))
+        return y[len(y) - season + np.arange(steps) % season]
+    
+    @staticmethod
+    def _trend(y: np.ndarray, steps: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Recta de Theil-Sen (mediana de pendientes entre pares) sobre la ventana final
+        
+        Returns:
+            Tupla (pronóstico steps x N, pendiente, intercepto)
+        """
+        window = y[-FORECAST_TREND_WINDOW:]
+        t = np.arange(len(window), dtype='float64')
+        i, j = np.triu_indices(len(window), k=1)
+        
+        with warnings.catch_warnings():
+            # Productos sin datos en la ventana: mediana de un slice todo NaN
+            warnings.simplefilter('ignore', RuntimeWarning)
+            slope = np.nanmedian((window[j] - window[i]) / (j - i)[:, None], axis=0)
+            intercept = np.nanmedian(window - slope * t[:, None], axis=0)
+        
+        future = len(window) - 1 + np.arange(1, steps + 1, dtype='float64')
+        forecast = np.maximum(intercept + slope * future[:, None], 0.0)
+        return forecast, slope, intercept
+    
+    def _forecast_all(self, y: np.ndarray, steps: int) -> Tuple[Dict[str, np.ndarray], Dict[str, Dict]]:
+        """
+        Pronóstico de cada modelo para todas las columnas
+        
+        Returns:
+            Tupla ({modelo: steps x N}, {modelo: {parámetro: array por producto}})
+        """
+        ses, alpha = self._ses(y, steps)
+        trend, slope, intercept = self._trend(y, steps)
+        forecasts = {'ses': ses, 'seasonal_naive': self._seasonal_naive(y, steps), 'trend': trend}
+        params = {'ses': {'alpha': alpha}, 'seasonal_naive': {}, 'trend': {'slope': slope, 'intercept': intercept}}
+        return forecasts, params
+    
+    @timed("analyzer_call", method="forecast.fit")
+    @profiled("analyzer.forecast.fit")
+    def fit(self, prices: pd.DataFrame) -> pd.DataFrame:
+        """
+        Ajusta y pronostica todos los productos del frame
+        
+        Args:
+            prices: DataFrame con product_id, price y scraped_at
+        
+        Returns:
+            DataFrame indexado por product_id con model, params, last_at,
+            target_at, forecast, lower, upper y mae. Los productos con menos de
+            FORECAST_MIN_POINTS observaciones no se incluyen.
+        """
+        columns = ['model', 'params', 'last_at', 'target_at', 'forecast', 'lower', 'upper', 'mae']
+        if prices.empty:
+            return pd.DataFrame(columns=columns)
+        
+        scraped_at = prices['scraped_at']
+        if not pd.api.types.is_datetime64_any_dtype(scraped_at):
+            scraped_at = pd.to_datetime(scraped_at, format='ISO8601')
+        counts = prices.groupby('product_id')['price'].size()
+        eligible = counts.index[counts >= FORECAST_MIN_POINTS]
+        mask = prices['product_id'].isin(eligible).to_numpy()
+        if not mask.any():
+            return pd.DataFrame(columns=columns)
+        
+        frame = pd.DataFrame({
+            'product_id': prices['product_id'].to_numpy()[mask],
+            'price': prices['price'].to_numpy()[mask],
+            'scraped_at': scraped_at.to_numpy()[mask],
+        })
+        grid, product_ids, index = price_grid(frame, 'D')
+        
+        # Cada serie se corre hasta el final de la grilla para que termine en su
+        # última observación: el horizonte cuenta desde ahí y no desde el
+        # producto scrapeado más recientemente
+        last_at = frame.groupby('product_id')['scraped_at'].max().reindex(product_ids)
+        last_day = last_at.dt.normalize()
+        gap = (index[-1] - last_day).dt.days.to_numpy()
+        rows = np.arange(len(grid))[:, None] - gap
+        y = np.where(rows >= 0, grid[np.maximum(rows, 0), np.arange(len(product_ids))], np.nan)
+        
+        # Backtest: cada modelo pronostica los últimos `holdout` días sin verlos
+        holdout = min(self.holdout, max(len(y) - FORECAST_SEASON, 0))
+        names = list(FORECAST_MODELS)
+        if holdout > 0:
+            backtest, _ = self._forecast_all(y[:-holdout], holdout)
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', RuntimeWarning)
+                errors = np.stack([backtest[name] - y[-holdout:] for name in names])
+                mae = np.nanmean(np.abs(errors), axis=1)
+                rmse = np.sqrt(np.nanmean(errors ** 2, axis=1))
+            mae = np.where(np.isnan(mae), np.inf, mae)
+        else:
+            mae = np.zeros((len(names), len(product_ids)))
+            rmse = np.full((len(names), len(product_ids)), np.nan)
+        
+        best = mae.argmin(axis=0)
+        products = np.arange(len(product_ids))
+        forecasts, params = self._forecast_all(y, self.horizon)
+        point = np.stack([forecasts[name][-1] for name in names])[best, products]
+        band = 1.96 * np.nan_to_num(rmse[best, products])
+        
+        return pd.DataFrame({
+            'model': [names[m] for m in best],
+            'params': [
+                {key: float(values[p]) for key, values in params[names[m]].items()}
+                for p, m in enumerate(best)
+            ],
+            'last_at': last_at.to_numpy(),
+            'target_at': (last_day + pd.Timedelta(days=self.horizon)).to_numpy(),
+            'forecast': point,
+            'lower': np.maximum(point - band, 0.0),
+            'upper': point + band,
+            'mae': np.where(np.isfinite(mae[best, products]), mae[best, products], np.nan),
+        }, index=pd.Index(product_ids, name='product_id'))
+    
+    def run(self, db, full: bool = False, batch_size: int = 200_000) -> int:
+        """
+        Reajusta los productos con observaciones nuevas y guarda en price_forecasts
+        
+        Args:
+            db: Instancia de PriceDatabase
+            full: Reajusta todos los productos en lugar de solo los que cambiaron
+            batch_size: Filas por lote leído
+        
+        Returns:
+            Cantidad de productos pronosticados
+        """
+        watermark = 0 if full else db.get_watermark(FORECAST_WATERMARK)
+        changed, last_id = db.get_products_updated_since(watermark)
+        if not changed:
+            return 0
+        
+        # Solo FORECAST_HISTORY de contexto por producto: el costo no crece con el histórico
+        newest = pd.Timestamp(max(changed.values()))
+        since = (newest - pd.Timedelta(FORECAST_HISTORY)).isoformat()
+        product_ids = None if full else list(changed)
+        
+        frames = [
+            pd.DataFrame.from_records(rows, columns=CATALOG_COLUMNS)
+            for rows in db.iter_price_rows(batch_size, product_ids, since)
+        ]
+        prices = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=CATALOG_COLUMNS)
+        result = self.fit(prices)
+        
+        saved = db.save_forecasts([
+            (product_id, row.model, json.dumps(row.params), row.last_at.isoformat(),
+             row.target_at.isoformat(), float(row.forecast), float(row.lower), float(row.upper),
+             None if pd.isna(row.mae) else float(row.mae))
+            for product_id, row in zip(result.index, result.itertuples(index=False))
+        ])
+        
+        db.set_watermark(FORECAST_WATERMARK, last_id)
+        logger.info("Pronósticos actualizados", extra={'count': saved, 'products': len(changed), 'full': full})
+        return saved
 
 
 def plot_price_evolution(price_history: List[Dict], save_path: Optional[str] = None, 
-                        interactive: bool = True):
+                        interactive: bool = True, max_points: Optional[int] = None):
     """
     Función helper para graficar evolución de precios
     
@@ -269,9 +1370,10 @@ def plot_price_evolution(price_history: List[Dict], save_path: Optional[str] = N
         price_history: Lista de diccionarios con histórico
         save_path: Ruta para guardar (opcional)
         interactive: Usar gráfico interactivo o estático
+        max_points: Presupuesto de puntos de la línea (opcional)
     """
     analyzer = PriceAnalyzer(price_history)
-    analyzer.plot_price_evolution(save_path, interactive)
+    analyzer.plot_price_evolution(save_path, interactive, max_points)
 
 
 def get_price_statistics(price_history: List[Dict]) -> Dict:
@@ -288,28 +1390,110 @@ def get_price_statistics(price_history: List[Dict]) -> Dict:
     return analyzer.get_statistics()
 
 
-def compare_products(products_data: List[Dict], save_path: Optional[str] = None):
+@timed("analyzer_call", method="plot_sketch_distribution")
+def plot_sketch_distribution(digest, save_path: Optional[str] = None, bins: int = 30,
+                             title: str = 'Distribución de Precios', dpi: int = 300):
+    """
+    Histograma de distribución a partir de un t-digest (memoria acotada)
+    
+    Equivalente a PriceAnalyzer.plot_price_distribution pero sin necesitar la
+    columna completa de precios: sirve para catálogos o categorías enteras.
+    
+    Args:
+        digest: TDigest (ver PriceDatabase.get_sketch)
+        save_path: Ruta para guardar el gráfico
+        bins: Cantidad de barras
+        title: Título del gráfico
+        dpi: Resolución del PNG
+    """
+    if digest is None or digest.count == 0:
+        print("No hay datos para graficar")
+        return
+    
+    plt = _pyplot()
+    edges, counts = digest.histogram(bins)
+    median = digest.quantile(0.5)
+    
+    fig, ax = plt.subplots(figsize=(10, 6))
+    
+    ax.bar(edges[:-1], counts, width=np.diff(edges), align='edge', edgecolor='black', alpha=0.7)
+    ax.axvline(median, color='green', linestyle='--',
+               linewidth=2, label=f"Mediana: ${median:,.0f}")
+    ax.axvspan(digest.quantile(0.25), digest.quantile(0.75), color='green', alpha=0.1, label="P25–P75")
+    
+    ax.set_title(f'{title} ({int(digest.count):,} registros)', fontsize=14, fontweight='bold')
+    ax.set_xlabel('Precio (ARS)', fontsize=12)
+    ax.set_ylabel('Frecuencia (estimada)', fontsize=12)
+    ax.legend()
+    ax.grid(True, alpha=0.3)
+    
+    plt.tight_layout()
+    
+    if save_path:
+        plt.savefig(save_path, dpi=dpi, bbox_inches='tight')
+        plt.close(fig)
+        print(f"✓ Gráfico guardado en: {save_path}")
+    else:
+        plt.show()
+
+
+# Cantidad de productos a partir de la cual compare_products usa compare_catalog
+COMPARE_WEBGL_THRESHOLD = 20
+
+# Por encima de esta cantidad de series se dibuja una sola traza cortada entre productos
+COMPARE_SINGLE_TRACE_THRESHOLD = 200
+
+# Puntos totales de una comparación (el presupuesto por serie se reparte entre todas)
+COMPARE_MAX_TOTAL_POINTS = 100_000
+
+
+@profiled("analyzer.compare_products")
+def compare_products(products_data: List[Dict], save_path: Optional[str] = None,
+                     max_points: Optional[int] = None, normalize: bool = False,
+                     aggregate: Optional[str] = None):
     """
     Compara precios de múltiples productos
     
     Args:
         products_data: Lista de diccionarios con datos de productos
         save_path: Ruta para guardar el gráfico
+        max_points: Presupuesto de puntos por producto (por defecto DEFAULT_MAX_POINTS)
+        normalize: Índice base 100 (ver compare_catalog)
+        aggregate: Frecuencia de agregación, ej: 'D' o 'W' (ver compare_catalog)
     """
     if not products_data:
         print("No hay datos para comparar")
         return
     
+    # Muchas series (o normalización/agregación): un solo frame largo y WebGL
+    if len(products_data) >= COMPARE_WEBGL_THRESHOLD or normalize or aggregate:
+        # Claves enteras: el orden de las series (y de la leyenda) es el de products_data
+        prices = pd.DataFrame.from_records(
+            [
+                (index, entry['price'], entry['scraped_at'])
+                for index, product in enumerate(products_data)
+                for entry in product['history']
+            ],
+            columns=CATALOG_COLUMNS
+        )
+        names = {index: product['name'] for index, product in enumerate(products_data)}
+        compare_catalog(prices, names, save_path, normalize=normalize, aggregate=aggregate,
+                        max_points=max_points)
+        return
+    
+    import plotly.graph_objects as go
+    
     fig = go.Figure()
     
     for product in products_data:
         df = pd.DataFrame(product['history'])
-        df['scraped_at'] = pd.to_datetime(df['scraped_at'])
+        df['scraped_at'] = pd.to_datetime(df['scraped_at'], format='ISO8601')
+        line = downsample_frame(df.sort_values('scraped_at'), max_points)
         
         fig.add_trace(go.Scatter(
-            x=df['scraped_at'],
-            y=df['price'],
-            mode='lines+markers',
+            x=line['scraped_at'],
+            y=line['price'],
+            mode='lines+markers' if len(line) == len(df) else 'lines',
             name=product['name'][:30] + '...',
             hovertemplate='<b>%{fullData.name}</b><br>Fecha: %{x}<br>Precio: $%{y:,.0f}<extra></extra>'
         ))
@@ -330,6 +1514,117 @@ def compare_products(products_data: List[Dict], save_path: Optional[str] = None)
         fig.show()
 
 
+@timed("analyzer_call", method="compare_catalog")
+@profiled("analyzer.compare_catalog")
+def compare_catalog(prices: pd.DataFrame, names: Optional[Dict[str, str]] = None,
+                    save_path: Optional[str] = None, normalize: bool = False,
+                    aggregate: Optional[str] = None, max_points: Optional[int] = None,
+                    include_plotlyjs='cdn'):
+    """
+    Comparación de alto volumen (cientos o miles de productos)
+    
+    Parte de un único frame largo (product_id, price, scraped_at), sin armar
+    un DataFrame por producto, y dibuja con Scattergl (WebGL). Con más de
+    COMPARE_SINGLE_TRACE_THRESHOLD series usa una sola traza cortada con NaN
+    entre productos: el navegador maneja una traza en lugar de miles.
+    
+    Args:
+        prices: DataFrame con product_id, price y scraped_at
+        names: Nombre a mostrar de cada product_id (opcional)
+        save_path: Ruta del HTML (si no se indica, se muestra el gráfico)
+        normalize: Expresa cada serie como índice con base 100 en su primer valor
+        aggregate: Agrega en el servidor al promedio por período ('D', 'W', ...)
+        max_points: Presupuesto de puntos por producto tras la agregación (se reduce
+            para que el total no supere COMPARE_MAX_TOTAL_POINTS)
+        include_plotlyjs: 'cdn' escribe un HTML liviano que carga plotly.js del CDN
+    
+    Returns:
+        Figura de Plotly
+    """
+    import plotly.graph_objects as go
+    
+    names = names or {}
+    df = prices[CATALOG_COLUMNS].copy()
+    if not pd.api.types.is_datetime64_any_dtype(df['scraped_at']):
+        df['scraped_at'] = pd.to_datetime(df['scraped_at'], format='ISO8601')
+    df['price'] = df['price'].astype('float64')
+    df = df.sort_values(['product_id', 'scraped_at'], kind='stable').reset_index(drop=True)
+    
+    if aggregate:
+        df = (
+            df.groupby(['product_id', pd.Grouper(key='scraped_at', freq=aggregate)])['price']
+            .mean()
+            .dropna()
+            .reset_index()
+        )
+    
+    if normalize:
+        df['price'] = df['price'] / df.groupby('product_id', sort=False)['price'].transform('first') * 100
+    
+    # Solo las series que exceden el presupuesto pasan por LTTB
+    sizes = df.groupby('product_id', sort=False)['price'].size()
+    budget = max(3, min(max_points or DEFAULT_MAX_POINTS, COMPARE_MAX_TOTAL_POINTS // max(len(sizes), 1)))
+    if (sizes > budget).any():
+        oversized = set(sizes.index[sizes > budget])
+        df = pd.concat(
+            [df[~df['product_id'].isin(oversized)]]
+            + [downsample_frame(group, budget) for product_id, group in df.groupby('product_id', sort=False)
+               if product_id in oversized],
+            ignore_index=True
+        ).sort_values(['product_id', 'scraped_at'], kind='stable')
+    
+    product_ids = df['product_id'].to_numpy()
+    x = df['scraped_at'].to_numpy()
+    y = df['price'].round(2).to_numpy()
+    boundaries = np.flatnonzero(product_ids[1:] != product_ids[:-1]) + 1
+    starts = np.concatenate(([0], boundaries)) if len(df) else np.array([], dtype=np.int64)
+    value_label = 'Índice' if normalize else 'Precio'
+    value_format = '%{y:,.1f}' if normalize else '$%{y:,.0f}'
+    
+    fig = go.Figure()
+    
+    if len(starts) > COMPARE_SINGLE_TRACE_THRESHOLD:
+        # Un NaN antes de cada producto corta la línea sin crear otra traza
+        labels = np.array([str(names.get(pid, pid))[:30] for pid in product_ids[starts]], dtype=object)
+        fig.add_trace(go.Scattergl(
+            x=np.insert(x, boundaries, np.datetime64('NaT')),
+            y=np.insert(y, boundaries, np.nan),
+            customdata=np.insert(np.repeat(labels, np.diff(np.append(starts, len(df)))), boundaries, ''),
+            mode='lines',
+            line=dict(width=1),
+            opacity=0.6,
+            connectgaps=False,
+            name=f'{len(starts)} productos',
+            hovertemplate=f'<b>%{{customdata}}</b><br>Fecha: %{{x}}<br>{value_label}: {value_format}<extra></extra>'
+        ))
+    else:
+        for pid, xs, ys in zip(product_ids[starts], np.split(x, boundaries), np.split(y, boundaries)):
+            fig.add_trace(go.Scattergl(
+                x=xs,
+                y=ys,
+                mode='lines',
+                name=str(names.get(pid, pid))[:30],
+                hovertemplate=f'<b>%{{fullData.name}}</b><br>Fecha: %{{x}}<br>{value_label}: {value_format}<extra></extra>'
+            ))
+    
+    fig.update_layout(
+        title=f'Comparación de Precios entre Productos ({len(starts)})',
+        xaxis_title='Fecha',
+        yaxis_title='Índice (base 100)' if normalize else 'Precio (ARS)',
+        hovermode='closest',
+        template='plotly_white',
+        height=600
+    )
+    
+    if save_path:
+        fig.write_html(save_path, include_plotlyjs=include_plotlyjs)
+        print(f"✓ Gráfico de comparación guardado en: {save_path}")
+    else:
+        fig.show()
+    
+    return fig
+
+
 if __name__ == "__main__":
     # Ejemplo de uso
     print("=== Ejemplo de análisis ===\n")
@@ -0,0 +1,526 @@
+"""
+Módulo de API HTTP
+Servicio JSON asíncrono (asyncio, sin dependencias) sobre PriceDatabase para otros servicios
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlsplit
+
+try:
+    from .logger import get_logger, configure_logging
+    from .metrics import counter, timed
+except ImportError:
+    from logger import get_logger, configure_logging
+    from metrics import counter, timed
+
+
+logger = get_logger(__name__)
+
+# Puerto del servicio (MLMONITOR_API_PORT) y escucha solo local por defecto
+API_PORT_ENV = "MLMONITOR_API_PORT"
+DEFAULT_API_PORT = 8000
+
+# Respuestas GET cacheadas: se descartan al cambiar la versión de datos o al vencer el TTL
+API_CACHE_TTL = 30
+API_CACHE_ENTRIES = 256
+
+# Endpoints cuya respuesta cambia sin que entre un precio nuevo (la versión de
+# datos no los invalida): nunca se cachean ni llevan ETag
+UNCACHED_ENDPOINTS = ('jobs', 'stats', 'alerts')
+
+# Límites de los parámetros y del cuerpo de POST
+MAX_SEARCH_LIMIT = 100
+MAX_ALERTS_LIMIT = 500
+MAX_BODY_BYTES = 1_000_000
+
+# Puntos por chunk al transmitir históricos
+HISTORY_CHUNK_POINTS = 1_000
+
+REASONS = {
+    200: "OK", 201: "Created", 202: "Accepted", 304: "Not Modified", 400: "Bad Request",
+    404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large",
+    500: "Internal Server Error", 503: "Service Unavailable",
+}
+
+api_cache_counter = counter("api_cache_total", "Respuestas de la API por resultado de caché")
+
+
+class APIError(Exception):
+    """
+    Error con código HTTP que se devuelve como {"error": mensaje}
+    """
+    
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def _json_bytes(payload) -> bytes:
+    return json.dumps(payload, ensure_ascii=False, default=str).encode('utf-8')
+
+
+def _int_param(params: Dict[str, str], name: str, default: int, maximum: Optional[int] = None) -> int:
+    try:
+        value = int(params.get(name, default))
+    except ValueError:
+        raise APIError(400, f"'{name}' debe ser un entero")
+    if value < 0:
+        raise APIError(400, f"'{name}' no puede ser negativo")
+    return min(value, maximum) if maximum else value
+
+
+def _iter_history(db, product_id: str, since: Optional[str], until: Optional[str]) -> Iterator[List[Tuple]]:
+    """
+    Lotes (scraped_at, price) de un producto en [since, until), ordenados por fecha
+    """
+    for rows in db.iter_price_rows(batch_size=HISTORY_CHUNK_POINTS, product_ids=[product_id], since=since):
+        batch = [(scraped_at, price) for _, price, scraped_at in rows if not until or scraped_at < until]
+        if batch:
+            yield batch
+        if until and len(batch) < len(rows):
+            return
+
+
+def _downsampled_history(db, product_id: str, since: Optional[str], until: Optional[str],
+                         max_points: int) -> List[Tuple]:
+    """
+    Histórico en [since, until) reducido a max_points con LTTB
+    """
+    import numpy as np
+    import pandas as pd
+    
+    try:
+        from .downsampling import lttb_indices
+    except ImportError:
+        from downsampling import lttb_indices
+    
+    points = [point for batch in _iter_history(db, product_id, since, until) for point in batch]
+    if len(points) <= max_points:
+        return points
+    
+    x = pd.to_datetime([point[0] for point in points], format='ISO8601').to_numpy()
+    y = np.fromiter((point[1] for point in points), dtype='float64', count=len(points))
+    return [points[i] for i in lttb_indices(x, y, max_points)]
+
+
+class PriceAPI:
+    """
+    API REST/JSON sobre la base de precios
+    
+    Corre en un event loop de asyncio; las consultas a SQLite y al scraper
+    se ejecutan en threads para no bloquearlo. Las respuestas GET llevan un
+    ETag derivado de la versión de datos (último prices.id): un cliente con
+    If-None-Match recibe 304 sin que se consulte la base, y las respuestas
+    se cachean en memoria hasta que entra un precio nuevo o vence el TTL.
+    
+    Endpoints:
+        GET  /search?q=&limit=&max_age_hours=&live=1
+        GET  /jobs/<job_id>
+        POST /track                                     (JSON: id, title, price, user, ...)
+        GET  /history/<product_id>?since=&until=&max_points=
+        GET  /alerts?product_id=&owner=&limit=
+        GET  /stats
+    """
+    
+    def __init__(self, db, jobs=None, cache_ttl: float = API_CACHE_TTL,
+                 cache_entries: int = API_CACHE_ENTRIES):
+        """
+        Args:
+            db: PriceDatabase a exponer
+            jobs: JobManager para búsquedas en vivo (None = se crea al primer uso)
+            cache_ttl: Segundos que vive una respuesta cacheada
+            cache_entries: Respuestas cacheadas como máximo (LRU)
+        """
+        self.db = db
+        self.jobs = jobs
+        self.cache_ttl = cache_ttl
+        self.cache_entries = cache_entries
+        self._cache: "OrderedDict[str, Tuple]" = OrderedDict()
+        self._routes: Dict[Tuple[str, str], Callable] = {
+            ('GET', 'search'): self.search,
+            ('GET', 'jobs'): self.job,
+            ('POST', 'track'): self.track,
+            ('GET', 'history'): self.history,
+            ('GET', 'alerts'): self.alerts,
+            ('GET', 'stats'): self.stats,
+        }
+    
+    # ---------- Endpoints (corren en un thread) ----------
+    
+    def search(self, params: Dict[str, str], arg: Optional[str]) -> Tuple[int, Dict]:
+        """
+        Busca en el catálogo local; con live=1 además lanza una búsqueda en vivo
+        """
+        query = params.get('q', '').strip()
+        if not query:
+            raise APIError(400, "Falta el parámetro 'q'")
+        
+        limit = _int_param(params, 'limit', 20, MAX_SEARCH_LIMIT)
+        since = None
+        if params.get('max_age_hours'):
+            since = (datetime.now() - timedelta(hours=_int_param(params, 'max_age_hours', 0))).isoformat()
+        
+        payload = {'query': query, 'results': self.db.search_products_local(query, limit=limit, since=since)}
+        
+        if params.get('live') in ('1', 'true'):
+            payload['job_id'] = self._job_manager().submit_search(query, limit, owner='api')
+            return 202, payload
+        return 200, payload
+    
+    def job(self, params: Dict[str, str], arg: Optional[str]) -> Tuple[int, Dict]:
+        """
+        Estado y resultados de una búsqueda en vivo
+        """
+        snapshot = self._job_manager().get(arg) if arg else {}
+        if not snapshot:
+            raise APIError(404, f"Trabajo desconocido: {arg}")
+        return 200, snapshot
+    
+    def track(self, params: Dict[str, str], arg: Optional[str], body: Dict) -> Tuple[int, Dict]:
+        """
+        Guarda el precio de un producto y lo suma a la watchlist de user
+        
+        user es obligatorio: un producto fuera de toda watchlist no entra en
+        get_watched_products() y las actualizaciones masivas no lo refrescan.
+        """
+        missing = [field for field in ('id', 'title', 'price', 'user') if body.get(field) in (None, '')]
+        if missing:
+            raise APIError(400, f"Faltan campos: {', '.join(missing)}")
+        try:
+            body['price'] = float(body['price'])
+        except (TypeError, ValueError):
+            raise APIError(400, "'price' debe ser numérico")
+        
+        user_id = self.db.get_or_create_user(str(body['user']))
+        if not user_id:
+            raise APIError(500, "No se pudo crear el usuario")
+        if not self.db.save_price(body):
+            raise APIError(500, "No se pudo guardar el precio")
+        
+        watchlist = self.db.add_to_watchlist(user_id, body['id'], body.get('target_price'),
+                                             body.get('drop_threshold'))
+        payload = {'product_id': body['id'], 'saved': True, 'watchlist': watchlist}
+        
+        self.db.update_sketches()
+        return 201, payload
+    
+    def history(self, params: Dict[str, str], arg: Optional[str]) -> Tuple[int, Iterator[bytes]]:
+        """
+        Histórico en [since, until) transmitido como JSON en chunks
+        
+        Sin max_points las filas se leen y envían por lotes (memoria acotada
+        para cualquier tamaño); con max_points se reduce con LTTB.
+        """
+        if not arg:
+            raise APIError(404, "Falta el producto: /history/<product_id>")
+        if arg not in self.db.get_product_summaries([arg]):
+            raise APIError(404, f"Producto sin precios: {arg}")
+        
+        since, until = params.get('since') or None, params.get('until') or None
+        max_points = _int_param(params, 'max_points', 0)
+        if 0 < max_points < 3:
+            # LTTB conserva siempre el primer y el último punto
+            raise APIError(400, "'max_points' debe ser 0 (sin reducir) o al menos 3")
+        
+        if max_points:
+            points = _downsampled_history(self.db, arg, since, until, max_points)
+            batches = iter([points[i:i + HISTORY_CHUNK_POINTS] for i in range(0, len(points), HISTORY_CHUNK_POINTS)])
+        else:
+            batches = _iter_history(self.db, arg, since, until)
+        
+        def chunks():
+            header = {'product_id': arg, 'since': since, 'until': until, 'max_points': max_points or None}
+            yield _json_bytes(header)[:-1] + b', "points": ['
+            first = True
+            for batch in batches:
+                body = b", ".join(_json_bytes({'scraped_at': scraped_at, 'price': price})
+                                  for scraped_at, price in batch)
+                yield body if first else b", " + body
+                first = False
+            yield b"]}"
+        
+        return 200, chunks()
+    
+    def alerts(self, params: Dict[str, str], arg: Optional[str]) -> Tuple[int, Dict]:
+        """
+        Alertas disparadas, de la más reciente a la más antigua
+        """
+        limit = _int_param(params, 'limit', 100, MAX_ALERTS_LIMIT)
+        events = self.db.get_alert_events(product_id=params.get('product_id'),
+                                          owner=params.get('owner'), limit=limit)
+        return 200, {'alerts': events}
+    
+    def stats(self, params: Dict[str, str], arg: Optional[str]) -> Tuple[int, Dict]:
+        """
+        Totales de la base y resumen del dashboard
+        """
+        return 200, {'stats': self.db.get_stats(), 'summary': self.db.get_summary()}
+    
+    def _job_manager(self):
+        if self.jobs is None:
+            try:
+                from .jobs import JobManager
+            except ImportError:
+                from jobs import JobManager
+            self.jobs = JobManager(self.db)
+        return self.jobs
+    
+    # ---------- Caché y ETags ----------
+    
+    def _etag(self, version: int, target: str) -> str:
+        digest = hashlib.sha1(target.encode('utf-8')).hexdigest()[:16]
+        return f'W/"{version}-{digest}"'
+    
+    def _cached(self, target: str, version: int) -> Optional[Tuple[int, bytes]]:
+        entry = self._cache.get(target)
+        if entry is None:
+            return None
+        
+        status, body, entry_version, expires = entry
+        if entry_version != version or expires < time.monotonic():
+            del self._cache[target]
+            return None
+        
+        self._cache.move_to_end(target)
+        return status, body
+    
+    def _store(self, target: str, version: int, status: int, body: bytes):
+        self._cache[target] = (status, body, version, time.monotonic() + self.cache_ttl)
+        self._cache.move_to_end(target)
+        while len(self._cache) > self.cache_entries:
+            self._cache.popitem(last=False)
+    
+    # ---------- HTTP ----------
+    
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """
+        Atiende una conexión (HTTP/1.1 con keep-alive)
+        """
+        try:
+            while True:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+                
+                method, target, headers, body = request
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                await self._respond(writer, method, target, headers, body, keep_alive)
+                if not keep_alive:
+                    break
+        except APIError as e:
+            await self._send(writer, e.status, _json_bytes({'error': e.message}), keep_alive=False)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+    
+    async def _read_request(self, reader: asyncio.StreamReader):
+        request_line = await reader.readline()
+        if not request_line.strip():
+            return None
+        
+        try:
+            method, target, _ = request_line.decode('latin-1').split()
+        except ValueError:
+            raise APIError(400, "Línea de pedido inválida")
+        
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        
+        try:
+            length = int(headers.get('content-length') or 0)
+        except ValueError:
+            raise APIError(400, "Content-Length inválido")
+        if length < 0:
+            raise APIError(400, "Content-Length inválido")
+        if length > MAX_BODY_BYTES:
+            raise APIError(413, "Cuerpo demasiado grande")
+        body = await reader.readexactly(length) if length else b''
+        return method.upper(), target, headers, body
+    
+    async def _respond(self, writer, method: str, target: str, headers: Dict[str, str],
+                       body: bytes, keep_alive: bool):
+        url = urlsplit(target)
+        parts = [unquote(part) for part in url.path.strip('/').split('/', 1)]
+        endpoint, arg = parts[0], parts[1] if len(parts) > 1 else None
+        params = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        
+        handler = self._routes.get((method, endpoint))
+        if handler is None:
+            known = any(route[1] == endpoint for route in self._routes)
+            status = 405 if known else 404
+            await self._send(writer, status, _json_bytes({'error': REASONS[status]}), keep_alive=keep_alive)
+            return
+        
+        # Sin caché ni ETag: lo que no cambia solo con prices.id (estado de
+        # trabajos, búsquedas en vivo, /stats que depende del umbral de Settings
+        # y /alerts que depende de las reglas) y max_age_hours, relativo a la hora
+        cacheable = (method == 'GET' and endpoint not in UNCACHED_ENDPOINTS
+                     and params.get('live') not in ('1', 'true') and not params.get('max_age_hours'))
+        
+        with timed("api_request", endpoint=endpoint):
+            try:
+                etag = None
+                if cacheable:
+                    version = await asyncio.to_thread(self.db.get_data_version)
+                    etag = self._etag(version, target)
+                    if etag in (tag.strip() for tag in headers.get('if-none-match', '').split(',')):
+                        api_cache_counter.inc(result='not_modified')
+                        await self._send(writer, 304, b'', {'ETag': etag}, keep_alive)
+                        return
+                    
+                    cached = self._cached(target, version)
+                    if cached is not None:
+                        api_cache_counter.inc(result='hit')
+                        await self._send(writer, cached[0], cached[1], self._cache_headers(etag), keep_alive)
+                        return
+                    api_cache_counter.inc(result='miss')
+                
+                if method == 'POST':
+                    try:
+                        payload = json.loads(body or b'{}')
+                    except ValueError:
+                        raise APIError(400, "El cuerpo debe ser JSON")
+                    if not isinstance(payload, dict):
+                        raise APIError(400, "El cuerpo debe ser un objeto JSON")
+                    status, result = await asyncio.to_thread(handler, params, arg, payload)
+                else:
+                    status, result = await asyncio.to_thread(handler, params, arg)
+                
+                extra = self._cache_headers(etag) if etag else {}
+                if isinstance(result, dict):
+                    response = _json_bytes(result)
+                    if cacheable:
+                        self._store(target, version, status, response)
+                    await self._send(writer, status, response, extra, keep_alive)
+                else:
+                    await self._send_chunked(writer, status, result, extra, keep_alive)
+            
+            except APIError as e:
+                await self._send(writer, e.status, _json_bytes({'error': e.message}), keep_alive=keep_alive)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                raise
+            except Exception as e:
+                logger.error("Error atendiendo %s %s: %s", method, url.path, e)
+                await self._send(writer, 500, _json_bytes({'error': REASONS[500]}), keep_alive=keep_alive)
+    
+    def _cache_headers(self, etag: str) -> Dict[str, str]:
+        return {'ETag': etag, 'Cache-Control': f"max-age={int(self.cache_ttl)}"}
+    
+    async def _send(self, writer, status: int, body: bytes, headers: Optional[Dict[str, str]] = None,
+                    keep_alive: bool = True):
+        head = [f"HTTP/1.1 {status} {REASONS.get(status, '')}"]
+        if status != 304:
+            head.append("Content-Type: application/json; charset=utf-8")
+        head.append(f"Content-Length: {len(body)}")
+        head.append(f"Connection: {'keep-alive' if keep_alive else 'close'}")
+        head.extend(f"{name}: {value}" for name, value in (headers or {}).items())
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode('latin-1') + body)
+        await writer.drain()
+    
+    async def _send_chunked(self, writer, status: int, chunks: Iterator[bytes],
+                            headers: Optional[Dict[str, str]] = None, keep_alive: bool = True):
+        """
+        Envía una respuesta con Transfer-Encoding: chunked
+        
+        Cada chunk se genera fuera del event loop (lee de SQLite) y se envía
+        apenas está listo, respetando el control de flujo del socket.
+        """
+        head = [
+            f"HTTP/1.1 {status} {REASONS.get(status, '')}",
+            "Content-Type: application/json; charset=utf-8",
+            "Transfer-Encoding: chunked",
+            f"Connection: {'keep-alive' if keep_alive else 'close'}",
+        ]
+        head.extend(f"{name}: {value}" for name, value in (headers or {}).items())
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode('latin-1'))
+        
+        # Un único thread por respuesta: la conexión SQLite del generador no
+        # puede usarse desde otro thread que el que la abrió
+        loop = asyncio.get_running_loop()
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="api-stream")
+        try:
+            while True:
+                chunk = await loop.run_in_executor(executor, next, chunks, None)
+                if chunk is None:
+                    break
+                if chunk:
+                    writer.write(f"{len(chunk):x}\r\n".encode('latin-1') + chunk + b"\r\n")
+                    await writer.drain()
+            
+            writer.write(b"0\r\n\r\n")
+            await writer.drain()
+        finally:
+            # Cliente desconectado a mitad: cerrar el generador libera la consulta
+            await loop.run_in_executor(executor, chunks.close)
+            executor.shutdown(wait=False)
+    
+    async def serve(self, host: str = "127.0.0.1", port: Optional[int] = None):
+        """
+        Escucha hasta que se cancele la tarea
+        
+        Args:
+            host: Interfaz de escucha (solo local por defecto)
+            port: Puerto (por defecto MLMONITOR_API_PORT o 8000)
+        """
+        port = int(port if port is not None else os.environ.get(API_PORT_ENV, DEFAULT_API_PORT))
+        server = await asyncio.start_server(self.handle, host, port)
+        address = server.sockets[0].getsockname()
+        logger.info("API escuchando", extra={'host': address[0], 'port': address[1]})
+        
+        async with server:
+            await server.serve_forever()
+
+
+if __name__ == "__main__":
+    import argparse
+    
+    try:
+        from .config import DATABASE_PATH
+        from .database import PriceDatabase, DB_PATH_ENV
+        from .alerts import AlertEngine
+    except ImportError:
+        from config import DATABASE_PATH
+        from database import PriceDatabase, DB_PATH_ENV
+        from alerts import AlertEngine
+    
+    parser = argparse.ArgumentParser(description="API HTTP del monitor de precios")
+    parser.add_argument('--db', default=os.environ.get(DB_PATH_ENV, DATABASE_PATH))
+    parser.add_argument('--host', default="127.0.0.1")
+    parser.add_argument('--port', type=int)
+    args = parser.parse_args()
+    
+    configure_logging("INFO")
+    db = PriceDatabase(args.db)
+    
+    # Los precios que entran por /track también disparan alertas y
+    # actualizan el resumen de los usuarios que siguen el producto
+    AlertEngine(db).attach()
+    db.add_listener(db.refresh_summaries_on_ingest)
+    
+    api = PriceAPI(db)
+    try:
+        asyncio.run(api.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if api.jobs is not None:
+            api.jobs.shutdown(wait=False)
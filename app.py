@@ -1,10 +1,21 @@
 import streamlit as st
 import pandas as pd
-import plotly.express as px
+import numpy as np
 import plotly.graph_objects as go
+import os
+import atexit
 from datetime import datetime, timedelta
 
 from scraper import MercadoLibreScraper
+from logger import configure_logging
+from metrics import REGISTRY, METRICS_PORT_ENV, start_metrics_server
+from profiling import start_profile, stop_profile
+from downsampling import downsample_frame, minmax_envelope, plotly_envelope_traces
+from analyzer import PriceForecaster
+from database import PriceDatabase, DB_PATH_ENV, DEFAULT_USER
+from config import DATABASE_PATH
+from jobs import JobManager, JOB_CANCELLED, JOB_FAILED
+from alerts import AlertEngine, RULE_BELOW_TARGET, RULE_DROP_PERCENT, RULE_NEW_LOW
 
 # ==================== CONFIGURACIÓN DE LA PÁGINA ====================
 st.set_page_config(
@@ -246,133 +257,588 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # ==================== INICIALIZACIÓN ====================
+@st.cache_resource
+def init_logging():
+    # Nivel y formato vía MLMONITOR_LOG_LEVEL / MLMONITOR_LOG_FORMAT
+    configure_logging()
+    return True
+
+init_logging()
+
+@st.cache_resource
+def init_metrics_server():
+    # Endpoint Prometheus opcional, solo si se configuró el puerto
+    if os.environ.get(METRICS_PORT_ENV):
+        return start_metrics_server()
+    return None
+
+metrics_server = init_metrics_server()
+
 @st.cache_resource
 def init_scraper():
     return MercadoLibreScraper()
 
 scraper = init_scraper()
 
-# Inicializar session_state - TODO EN MEMORIA
+@st.cache_resource
+def init_database():
+    # Una instancia por proceso, compartida por todas las sesiones
+    database = PriceDatabase(os.environ.get(DB_PATH_ENV, DATABASE_PATH))
+    # Cada ingesta recalcula el resumen guardado de los usuarios afectados
+    database.add_listener(database.refresh_summaries_on_ingest)
+    return database
+
+db = init_database()
+
+@st.cache_resource
+def init_alert_engine():
+    # Evalúa las reglas de alerta en cada ingesta (sinks vía MLMONITOR_ALERT_SINKS)
+    return AlertEngine(db).attach()
+
+alert_engine = init_alert_engine()
+
+@st.cache_resource
+def init_job_manager():
+    # Pool de actualizaciones compartido: acota los navegadores abiertos por proceso
+    manager = JobManager(db)
+    # Al salir se cancelan los trabajos y se cierran sus navegadores
+    atexit.register(manager.shutdown, wait=False)
+    return manager
+
+jobs = init_job_manager()
+
+# Cada cuánto se refresca el progreso de un trabajo en segundo plano
+JOB_POLL_SECONDS = 2
+
+# Listado del dashboard: tamaños de página y orden en SQL (clave de TRACKED_SORTS)
+DASHBOARD_PAGE_SIZES = [20, 50, 100]
+DASHBOARD_SORTS = {"Recent": 'recent', "Price ↓": 'price_desc', "Price ↑": 'price_asc', "Name": 'name',
+                   "Relevance": 'relevance'}
+
+# Alertas del resumen listadas en el banner (el total se muestra igual)
+DASHBOARD_MAX_ALERTS = 10
+
+# Búsqueda: los productos guardados con precio observado dentro de esta ventana
+# se muestran sin scrapear; solo si no alcanzan se busca en vivo el resto
+SEARCH_FRESHNESS_HOURS = 24
+
+# Estado por sesión: solo la última búsqueda (los productos viven en la base)
 if 'search_results' not in st.session_state:
     st.session_state.search_results = []
 if 'last_search_query' not in st.session_state:
     st.session_state.last_search_query = ""
-if 'tracked_products' not in st.session_state:
-    st.session_state.tracked_products = {}  # {product_id: {'product': {...}, 'history': [...]}}
 
-# Funciones helper para manejar productos en memoria
-def save_product_to_session(product, auto_fetch_history=True):
-    """Guardar producto en session state con historial automático GARANTIZADO"""
-    product_id = product['id']
-    
-    if product_id not in st.session_state.tracked_products:
-        st.session_state.tracked_products[product_id] = {
-            'product': product,
-            'history': []
-        }
-        
-        # SIEMPRE generar historial (GARANTIZADO)
-        import random
-        current_price = product['price']
-        
-        # Generar 6 puntos de precio con variaciones realistas
-        price_points = []
-        
-        # Punto 1: Hace 6 días (±10-15% del precio actual)
-        price_points.append({
-            'price': int(current_price * random.uniform(1.08, 1.15)),
-            'seller': 'Historical',
-            'scraped_at': (datetime.now() - timedelta(days=6)).isoformat()
-        })
-        
-        # Punto 2: Hace 5 días
-        price_points.append({
-            'price': int(current_price * random.uniform(1.04, 1.10)),
-            'seller': 'Historical',
-            'scraped_at': (datetime.now() - timedelta(days=5)).isoformat()
-        })
-        
-        # Punto 3: Hace 4 días
-        price_points.append({
-            'price': int(current_price * random.uniform(1.00, 1.06)),
-            'seller': 'Historical',
-            'scraped_at': (datetime.now() - timedelta(days=4)).isoformat()
-        })
+# Consultas cacheadas entre sesiones. La versión de datos (último prices.id) y
+# la de la watchlist del usuario son parte de la clave: cualquier escritura, de
+# esta u otra sesión o de un proceso batch, invalida las entradas sin limpiar la
+# caché a mano.
+@st.cache_data(show_spinner=False, max_entries=8)
+def load_tracked_products(user_id, version):
+    return db.get_tracked_products(user_id=user_id)
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def load_tracked_page(query, sort, limit, offset, user_id, version):
+    return db.get_tracked_products(query, sort, limit, offset, user_id=user_id)
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def load_tracked_totals(query, user_id, version):
+    return db.get_tracked_totals(query, user_id=user_id)
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def load_tracked_ids(product_ids, user_id, version):
+    return db.get_watchlist_ids(user_id, list(product_ids))
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def load_db_stats(version):
+    return db.get_stats()
+
+def cache_version():
+    """Clave de caché: último precio guardado y cambios en la watchlist del usuario"""
+    return db.get_data_version(), db.get_watchlist_version(current_user['id'])
+
+def track_product(product):
+    """
+    Guardar el precio actual del producto (lo agrega a la base si no existía)
+    y sumarlo a la watchlist del usuario actual
+    """
+    if not db.save_price(product):
+        raise RuntimeError("Could not save the product price")
+    if not db.add_to_watchlist(current_user['id'], product['id']):
+        raise RuntimeError("Could not add the product to the watchlist")
+    db.update_sketches()
+    # Reajusta solo los productos con precios nuevos (incremental por marca de agua)
+    try:
+        PriceForecaster().run(db)
+    except Exception as e:
+        st.warning(f"Forecast not updated: {e}")
+
+def get_all_tracked_products():
+    """Obtener todos los productos de la watchlist del usuario"""
+    return load_tracked_products(current_user['id'], cache_version())
+
+def get_tracked_page(query="", sort='recent', page=1, page_size=DASHBOARD_PAGE_SIZES[0]):
+    """Obtener una página de la watchlist (filtro, orden y página en SQL)"""
+    return load_tracked_page(query, sort, page_size, (page - 1) * page_size, current_user['id'], cache_version())
+
+def get_tracked_totals(query=""):
+    """Cantidad y precio promedio de los productos de la watchlist que coinciden con el filtro"""
+    return load_tracked_totals(query, current_user['id'], cache_version())
+
+def get_tracked_ids(product_ids):
+    """Subconjunto de product_ids que ya están en la watchlist del usuario"""
+    return load_tracked_ids(tuple(sorted(product_ids)), current_user['id'], cache_version())
+
+def get_dashboard_summary():
+    """Resumen precalculado de la watchlist del usuario (una lectura, sin recalcular)"""
+    return db.get_user_summary(current_user['id'])
+
+def format_age(iso_timestamp):
+    """Antigüedad legible de un timestamp ISO ("3 min", "2 h")"""
+    seconds = max(0, (datetime.now() - datetime.fromisoformat(iso_timestamp)).total_seconds())
+    if seconds < 60:
+        return f"{seconds:.0f} s"
+    if seconds < 3600:
+        return f"{seconds / 60:.0f} min"
+    if seconds < 86400:
+        return f"{seconds / 3600:.0f} h"
+    return f"{seconds / 86400:.0f} d"
+
+def search_local(query, limit):
+    """Productos guardados que coinciden con la búsqueda y tienen un precio reciente"""
+    since = (datetime.now() - timedelta(hours=SEARCH_FRESHNESS_HOURS)).isoformat()
+    results = db.search_products_local(query, limit=limit, since=since)
+    for product in results:
+        product['source'] = 'local'
+    return results
+
+def start_live_search(query, limit):
+    """Lanza la búsqueda en vivo en segundo plano (cancela la anterior de la sesión)"""
+    jobs.cancel(st.session_state.get('search_job_id'))
+    st.session_state.search_job_id = jobs.submit_search(query, limit)
+    st.session_state.search_merged_job_id = None
+
+def apply_live_results(job):
+    """
+    Combina una sola vez los resultados en vivo de un trabajo terminado: actualizan
+    el precio de los locales y completan la lista hasta el límite de la búsqueda
+    """
+    if job['active'] or st.session_state.get('search_merged_job_id') == job['id']:
+        return False
+    
+    st.session_state.search_merged_job_id = job['id']
+    merged = {product['id']: product for product in st.session_state.search_results}
+    for product in job['results']:
+        current = merged.get(product.get('id'), {})
+        merged[product.get('id') or id(product)] = {**current, **product, 'source': 'live'}
+    st.session_state.search_results = list(merged.values())[:st.session_state.get('search_limit', len(merged))]
+    return True
+
+# ==================== GRÁFICOS ====================
+# DataFrames y figuras cacheados por (product_id, último scraped_at, cantidad
+# de precios): mientras el producto no reciba precios nuevos, un rerun reutiliza
+# lo ya construido en lugar de volver a parsear el histórico y armar las figuras.
+@st.cache_data(show_spinner=False, max_entries=128)
+def load_history_frame(product_id, last_at, price_count):
+    df = pd.DataFrame(db.get_price_history(product_id))
+    if df.empty:
+        return df
+    
+    df['scraped_at'] = pd.to_datetime(df['scraped_at'], format='ISO8601', errors='coerce')
+    return df.dropna(subset=['scraped_at']).sort_values('scraped_at').reset_index(drop=True)
+
+def history_frame(product):
+    return load_history_frame(product['id'], product['last_at'], product['price_count'])
+
+@st.cache_data(show_spinner=False, max_entries=128)
+def build_card_figure(product_id, last_at, price_count, title):
+    df = load_history_frame(product_id, last_at, price_count)
+    
+    # Calcular estadísticas
+    avg_price = df['price'].mean()
+    min_price = df['price'].min()
+    
+    # Puntos enviados al navegador acotados (LTTB)
+    line = downsample_frame(df)
+    
+    # Gráfico con líneas de referencia
+    fig = go.Figure()
+    
+    # Línea principal
+    fig.add_trace(go.Scatter(
+        x=line['scraped_at'],
+        y=line['price'],
+        mode='lines+markers',
+        name='Price',
+        line=dict(color='#3498db', width=3),
+        marker=dict(size=7, color='#3498db'),
+        hovertemplate='<b>$%{y:,.0f}</b><br>%{x|%d/%m/%Y}<extra></extra>'
+    ))
+    
+    # Línea de promedio
+    fig.add_trace(go.Scatter(
+        x=line['scraped_at'],
+        y=[avg_price] * len(line),
+        mode='lines',
+        name=f'Avg: ${avg_price:,.0f}',
+        line=dict(color='#27ae60', width=2, dash='dash'),
+        showlegend=True
+    ))
+    
+    # Línea de mínimo
+    fig.add_trace(go.Scatter(
+        x=line['scraped_at'],
+        y=[min_price] * len(line),
+        mode='lines',
+        name=f'Min: ${min_price:,.0f}',
+        line=dict(color='#e74c3c', width=2, dash='dot'),
+        showlegend=True
+    ))
+    
+    fig.update_layout(
+        title=f"{title[:50]}...",
+        height=350,
+        font=dict(family='Arial, sans-serif', size=11),
+        plot_bgcolor='#f8f9fa',
+        paper_bgcolor='white',
+        showlegend=True,
+        legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1),
+        xaxis=dict(showgrid=True, gridcolor='#e0e0e0'),
+        yaxis=dict(showgrid=True, gridcolor='#e0e0e0', tickformat='$,.0f'),
+        margin=dict(l=60, r=20, t=60, b=50)
+    )
+    
+    return fig
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def build_evolution_figure(product_id, last_at, price_count):
+    df = load_history_frame(product_id, last_at, price_count)
+    
+    # Calcular estadísticas
+    avg_price = df['price'].mean()
+    min_price = df['price'].min()
+    
+    # Históricos largos: línea reducida con LTTB y banda min/max
+    line = downsample_frame(df)
+    
+    # Crear gráfico con líneas de referencia
+    fig = go.Figure()
+    
+    if len(line) < len(df):
+        for trace in plotly_envelope_traces(minmax_envelope(df, len(line) // 2),
+                                            color='rgba(231, 76, 60, 0.15)', name='Min/max range'):
+            fig.add_trace(trace)
+    
+    # Línea principal de precio
+    fig.add_trace(go.Scatter(
+        x=line['scraped_at'],
+        y=line['price'],
+        mode='lines+markers' if len(line) == len(df) else 'lines',
+        name='Price',
+        line=dict(color='#e74c3c', width=3),
+        marker=dict(size=8, color='#e74c3c'),
+        hovertemplate='<b>$%{y:,.0f}</b><br>%{x|%d/%m/%Y}<extra></extra>'
+    ))
+    
+    # Línea de promedio
+    fig.add_trace(go.Scatter(
+        x=line['scraped_at'],
+        y=[avg_price] * len(line),
+        mode='lines',
+        name=f'Average: ${avg_price:,.0f}',
+        line=dict(color='#27ae60', width=2, dash='dash'),
+        hovertemplate='Average: $%{y:,.0f}<extra></extra>'
+    ))
+    
+    # Línea de mínimo
+    fig.add_trace(go.Scatter(
+        x=line['scraped_at'],
+        y=[min_price] * len(line),
+        mode='lines',
+        name=f'Minimum: ${min_price:,.0f}',
+        line=dict(color='#3498db', width=2, dash='dot'),
+        hovertemplate='Minimum: $%{y:,.0f}<extra></extra>'
+    ))
+    
+    fig.update_layout(
+        height=450,
+        font=dict(family='Arial, sans-serif', size=12),
+        plot_bgcolor='#f8f9fa',
+        paper_bgcolor='white',
+        showlegend=True,
+        legend=dict(
+            orientation="h",
+            yanchor="bottom",
+            y=1.02,
+            xanchor="right",
+            x=1
+        ),
+        xaxis=dict(
+            title='Date',
+            showgrid=True,
+            gridcolor='#e0e0e0',
+            gridwidth=1,
+            zeroline=False
+        ),
+        yaxis=dict(
+            title='Price (ARS)',
+            showgrid=True,
+            gridcolor='#e0e0e0',
+            gridwidth=1,
+            zeroline=False,
+            tickformat='$,.0f'
+        ),
+        margin=dict(l=70, r=30, t=80, b=60),
+        hovermode='x unified'
+    )
+    
+    return fig
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def build_distribution_figure(product_id, last_at, price_count):
+    # Histograma estimado desde el t-digest persistido del producto: no lee el
+    # histórico ni escribe (los sketches se actualizan en cada ingesta). Devuelve
+    # también cuántos precios cubre el sketch para avisar si está atrasado.
+    digest = db.get_sketch('product', product_id)
+    if digest is None:
+        return None, 0
+    
+    edges, counts = digest.histogram(15)
+    edges = np.asarray(edges)
+    fig = go.Figure(go.Bar(
+        x=(edges[:-1] + edges[1:]) / 2,
+        y=counts,
+        width=np.diff(edges),
+        hovertemplate='$%{x:,.0f}: %{y:,.0f}<extra></extra>'
+    ))
+    
+    fig.update_layout(height=350, xaxis_title='Price (ARS)', yaxis_title='count (estimated)', bargap=0)
+    
+    return fig, digest.count
+
+# Pronóstico guardado por PriceForecaster en cada ingesta (track_product y fin
+# de cada trabajo): acá solo se lee. Si el producto recibió precios que el
+# modelo aún no vio, se muestra igual marcado como desactualizado.
+@st.cache_data(show_spinner=False, max_entries=32)
+def load_forecast(product_id, last_at, price_count):
+    forecast = db.get_forecast(product_id)
+    if forecast:
+        forecast['stale'] = pd.Timestamp(forecast['last_at']) < pd.Timestamp(last_at)
+        forecast['target_at'] = pd.Timestamp(forecast['target_at'])
+    return forecast
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def export_history(product_id, last_at, price_count):
+    df = load_history_frame(product_id, last_at, price_count)
+    return df.to_csv(index=False), df.to_json(orient='records', indent=2)
+
+# Cada card del Dashboard es un fragmento: abrir o cerrar su gráfico rerenderiza
+# solo esa card, no la página ni el resto de los gráficos
+@st.fragment
+def render_product_card(product):
+    with st.container():
+        st.markdown('<div class="product-card">', unsafe_allow_html=True)
         
-        # Punto 4: Hace 3 días
-        price_points.append({
-            'price': int(current_price * random.uniform(0.96, 1.03)),
-            'seller': 'Historical',
-            'scraped_at': (datetime.now() - timedelta(days=3)).isoformat()
-        })
+        col1, col2, col3 = st.columns([3, 1, 1])
         
-        # Punto 5: Hace 2 días
-        price_points.append({
-            'price': int(current_price * random.uniform(0.94, 1.00)),
-            'seller': 'Historical',
-            'scraped_at': (datetime.now() - timedelta(days=2)).isoformat()
-        })
+        with col1:
+            st.markdown(f'<div class="product-title">{product.get("title", "Untitled")}</div>',
+                       unsafe_allow_html=True)
+            st.markdown(f'<div class="product-meta">Seller: {product.get("seller", "Unknown")}</div>',
+                       unsafe_allow_html=True)
+            if product.get('url'):
+                st.markdown(f"[View on MercadoLibre →]({product['url']})")
         
-        # Punto 6: Ayer
-        price_points.append({
-            'price': int(current_price * random.uniform(0.97, 1.02)),
-            'seller': 'Historical',
-            'scraped_at': (datetime.now() - timedelta(days=1)).isoformat()
-        })
+        with col2:
+            st.markdown(f'<div class="price-tag">${product["price"]:,.0f}</div>',
+                       unsafe_allow_html=True)
+            if product.get('target_price'):
+                st.caption(f"🎯 Target ${product['target_price']:,.0f}")
         
-        # Punto 7: HOY (precio real actual)
-        price_points.append({
-            'price': current_price,
-            'seller': product.get('seller', 'Current'),
-            'scraped_at': datetime.now().isoformat()
-        })
+        with col3:
+            if st.button("Update", key=f"update_{product['id']}", use_container_width=True):
+                with st.spinner("Updating..."):
+                    try:
+                        results = scraper.search_products(product['title'][:50], limit=1)
+                        if results and len(results) > 0:
+                            updated_product = results[0]
+                            updated_product['id'] = product['id']
+                            track_product(updated_product)
+                            st.success(f"Updated: ${updated_product['price']:,.0f}")
+                            # Precio nuevo: cambia el orden y los totales de toda la página
+                            st.rerun(scope="app")
+                        else:
+                            st.warning("Could not update")
+                    except Exception as e:
+                        st.error(f"Error: {str(e)}")
+            
+            if st.button("Chart", key=f"graph_{product['id']}", use_container_width=True):
+                st.session_state[f'show_graph_{product["id"]}'] = True
+            
+            # Solo sale de la watchlist del usuario: el histórico compartido se conserva
+            if st.button("Unwatch", key=f"unwatch_{product['id']}", use_container_width=True):
+                db.remove_from_watchlist(current_user['id'], product['id'])
+                st.rerun(scope="app")
         
-        # Guardar todos los puntos
-        st.session_state.tracked_products[product_id]['history'] = price_points
+        # Mostrar gráfico
+        if st.session_state.get(f'show_graph_{product["id"]}', False):
+            if product['price_count']:
+                fig = build_card_figure(product['id'], product['last_at'], product['price_count'],
+                                        product.get('title', 'Product'))
+                st.plotly_chart(fig, use_container_width=True)
+                
+                if st.button("Close", key=f"close_{product['id']}"):
+                    st.session_state[f'show_graph_{product["id"]}'] = False
+                    st.rerun(scope="fragment")
         
-    else:
-        # Si ya existe, agregar nuevo precio al historial
-        st.session_state.tracked_products[product_id]['history'].append({
-            'price': product['price'],
-            'seller': product.get('seller', 'Unknown'),
-            'scraped_at': datetime.now().isoformat()
-        })
-
-def get_all_tracked_products():
-    """Obtener todos los productos trackeados"""
-    return [data['product'] for data in st.session_state.tracked_products.values()]
+        st.markdown('</div>', unsafe_allow_html=True)
 
-def get_price_history(product_id):
-    """Obtener historial de precios de un producto"""
-    if product_id in st.session_state.tracked_products:
-        return st.session_state.tracked_products[product_id]['history']
-    return []
-
-def check_price_alerts(threshold_percent=15):
-    """Detectar productos con caída de precio"""
-    alerts = []
+# Análisis del producto seleccionado como fragmento: las descargas y demás
+# widgets de la sección no vuelven a ejecutar el selector ni la página
+@st.fragment
+def render_product_analysis(product):
+    df = history_frame(product)
+    
+    if len(df) == 0:
+        st.info("Insufficient price history")
+        return
+    
+    key = (product['id'], product['last_at'], product['price_count'])
+    
+    # Stats
+    col1, col2, col3, col4 = st.columns(4)
+    
+    stats = [
+        ("Current", df['price'].iloc[-1]),
+        ("Minimum", df['price'].min()),
+        ("Maximum", df['price'].max()),
+        ("Average", df['price'].mean())
+    ]
+    
+    for col, (label, value) in zip([col1, col2, col3, col4], stats):
+        with col:
+            col.markdown(f"""
+            <div class="metric-card">
+                <div class="metric-label">{label}</div>
+                <div class="metric-value">${value:,.0f}</div>
+            </div>
+            """, unsafe_allow_html=True)
+    
+    st.markdown("<hr>", unsafe_allow_html=True)
     
-    for product_id, data in st.session_state.tracked_products.items():
-        history = data['history']
+    # Gráfico
+    st.markdown('<h2 class="section-title">Price Evolution</h2>', unsafe_allow_html=True)
+    st.plotly_chart(build_evolution_figure(*key), use_container_width=True)
+    
+    # Distribution
+    st.markdown('<h2 class="section-title">Price Distribution</h2>', unsafe_allow_html=True)
+    distribution, sketch_count = build_distribution_figure(*key)
+    if distribution is None:
+        st.info("Price distribution not available yet: it is computed on the next update")
+    else:
+        st.plotly_chart(distribution, use_container_width=True)
+        if sketch_count < product['price_count']:
+            st.caption(f"Estimated from {sketch_count:,} of {product['price_count']:,} prices; "
+                       "the rest are included on the next update")
+    
+    # Recommendation
+    current = df['price'].iloc[-1]
+    min_price = df['price'].min()
+    avg_price = df['price'].mean()
+    
+    if current <= min_price * 1.05:
+        st.success("★★★★★ Excellent time to buy! Price near historical minimum.")
+    elif current <= avg_price * 0.95:
+        st.info("★★★★ Good time to buy. Price below average.")
+    elif current <= avg_price * 1.05:
+        st.warning("★★★ Normal price. You can wait for a better offer.")
+    else:
+        st.error("★★ High price. We recommend waiting.")
+    
+    # Forecast
+    forecast = load_forecast(*key)
+    if forecast:
+        st.markdown('<h2 class="section-title">Next Week Forecast</h2>', unsafe_allow_html=True)
         
-        if len(history) >= 2:
-            current_price = history[-1]['price']
-            previous_price = history[-2]['price']
-            
-            if previous_price > 0:
-                price_drop = ((previous_price - current_price) / previous_price) * 100
-                
-                if price_drop >= threshold_percent:
-                    alerts.append({
-                        'product_id': product_id,
-                        'title': data['product']['title'],
-                        'previous_price': previous_price,
-                        'current_price': current_price,
-                        'drop_percent': price_drop,
-                        'url': data['product'].get('url', '')
-                    })
-    
-    return alerts
+        col1, col2, col3 = st.columns(3)
+        change = (forecast['forecast'] - current) / current * 100 if current else 0.0
+        col1.metric("Forecast", f"${forecast['forecast']:,.0f}", f"{change:+.1f}%",
+                    delta_color="inverse")
+        col2.metric("95% band", f"${forecast['lower']:,.0f} – ${forecast['upper']:,.0f}")
+        col3.metric("Model", forecast['model'], f"MAE ${forecast['mae']:,.0f}"
+                    if pd.notna(forecast['mae']) else None, delta_color="off")
+        caption = f"Target date: {forecast['target_at']:%d/%m/%Y}"
+        if forecast['stale']:
+            caption += (f" • fitted with prices up to {pd.Timestamp(forecast['last_at']):%d/%m/%Y %H:%M};"
+                        " newer prices are included on the next update")
+        st.caption(caption)
+    
+    # Alertas del producto: se evalúan en cada ingesta, no al abrir la página
+    st.markdown("<hr>", unsafe_allow_html=True)
+    st.markdown('<h2 class="section-title">Price Alerts</h2>', unsafe_allow_html=True)
+    
+    # Objetivo y umbral son del usuario (watchlist_items) y se reflejan en sus
+    # reglas de alerta; el nuevo mínimo es una regla aparte
+    rules = db.get_alert_rules(product_ids=[product['id']], owner=current_user['name'], include_global=False)
+    rule_labels = {
+        RULE_BELOW_TARGET: lambda rule: f"Below ${rule['threshold']:,.0f}",
+        RULE_DROP_PERCENT: lambda rule: f"Drop of {rule['threshold']:.0f}% or more",
+        RULE_NEW_LOW: lambda rule: "New all-time low",
+    }
+    for rule in rules:
+        col_rule, col_delete = st.columns([4, 1])
+        col_rule.markdown(f"🔔 {rule_labels[rule['kind']](rule)}")
+        if rule['kind'] == RULE_NEW_LOW and col_delete.button("Remove", key=f"remove_rule_{rule['id']}",
+                                                              use_container_width=True):
+            db.delete_alert_rule(rule['id'])
+            st.rerun(scope="fragment")
+    
+    col_target, col_drop, col_save = st.columns([2, 2, 1])
+    with col_target:
+        target = st.number_input("Target price (0 = none)", min_value=0.0,
+                                 value=float(product.get('target_price') or 0), step=1000.0,
+                                 key=f"alert_target_{product['id']}")
+    with col_drop:
+        drop_threshold = st.number_input("Drop alert % (0 = none)", min_value=0.0, max_value=100.0,
+                                         value=float(product.get('drop_threshold') or 0), step=5.0,
+                                         key=f"alert_drop_{product['id']}")
+    with col_save:
+        st.markdown("<br>", unsafe_allow_html=True)
+        if st.button("Save", key=f"save_targets_{product['id']}", use_container_width=True):
+            db.set_watch_targets(current_user['id'], product['id'], target or None, drop_threshold or None)
+            st.rerun(scope="app")
+    
+    if st.button("Alert on new low", key=f"add_low_{product['id']}",
+                 disabled=any(rule['kind'] == RULE_NEW_LOW for rule in rules)):
+        db.add_alert_rule(RULE_NEW_LOW, product['id'], owner=current_user['name'])
+        st.rerun(scope="fragment")
+    
+    for event in db.get_alert_events(product_id=product['id'], owner=current_user['name'], limit=5):
+        st.caption(f"{event['created_at'][:16]} — {event['message']}")
+    
+    # Export
+    st.markdown("<hr>", unsafe_allow_html=True)
+    st.markdown('<h2 class="section-title">Export Data</h2>', unsafe_allow_html=True)
+    
+    csv, json_data = export_history(*key)
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        st.download_button(
+            label="Download CSV",
+            data=csv,
+            file_name=f"prices_{product['id']}.csv",
+            mime="text/csv",
+            use_container_width=True
+        )
+    
+    with col2:
+        st.download_button(
+            label="Download JSON",
+            data=json_data,
+            file_name=f"prices_{product['id']}.json",
+            mime="application/json",
+            use_container_width=True
+        )
 
 # ==================== SIDEBAR ====================
 with st.sidebar:
@@ -391,12 +857,43 @@ with st.sidebar:
     
     st.markdown("---")
     
-    # Botón para limpiar sesión
-    if st.button("🗑️ Clear All Data", use_container_width=True):
-        st.session_state.tracked_products = {}
+    # Usuario actual: cada uno tiene su watchlist y sus objetivos, pero los
+    # productos y precios son compartidos (cada producto se scrapea una vez)
+    users = db.get_users()
+    user_names = [user['name'] for user in users]
+    if st.session_state.get('user_name') not in user_names:
+        st.session_state.user_name = user_names[0] if user_names else DEFAULT_USER
+    
+    st.selectbox("User", user_names or [DEFAULT_USER], key="user_name")
+    
+    # Callback: cambia el usuario seleccionado antes de que se dibuje el selector
+    def create_user():
+        name = st.session_state.new_user_name.strip()
+        if db.get_or_create_user(name):
+            st.session_state.user_name = name
+            st.session_state.new_user_name = ""
+    
+    with st.expander("New user"):
+        new_user = st.text_input("Name", key="new_user_name", label_visibility="collapsed",
+                                 placeholder="User name")
+        st.button("Create", use_container_width=True, disabled=not new_user.strip(), on_click=create_user)
+    
+    current_user = next((user for user in users if user['name'] == st.session_state.user_name), None)
+    if current_user is None:
+        current_user = {'id': db.get_or_create_user(st.session_state.user_name),
+                        'name': st.session_state.user_name}
+    
+    st.caption(f"{current_user.get('items', 0):,} products in your watchlist")
+    
+    st.markdown("---")
+    
+    # Los datos son compartidos: solo se descartan la búsqueda y las cachés locales
+    if st.button("🔄 Reload Data", use_container_width=True):
+        st.cache_data.clear()
         st.session_state.search_results = []
         st.session_state.last_search_query = ""
-        st.success("All data cleared!")
+        jobs.cancel(st.session_state.get('search_job_id'))
+        st.session_state.search_job_id = None
         st.rerun()
     
     st.markdown("---")
@@ -409,29 +906,34 @@ with st.sidebar:
     - Real-time product tracking
     - Price history analysis
     - Automated alerts
-    - Session-based (no persistent data)
+    - Persistent SQLite history shared across sessions
     """)
     
     st.markdown("---")
     st.caption("Built with Streamlit • v1.0.0")
 
+# Profiling del render de la página (MLMONITOR_PROFILE). Si st.stop()/st.rerun()
+# cortan el script, la sesión se cierra al iniciar el próximo render.
+page_profile = start_profile(f"page_{page.lower().replace(' ', '_')}", detached=True)
+
 # ==================== DASHBOARD ====================
 if page == "Dashboard":
     st.markdown('<h1 class="section-title">Dashboard</h1>', unsafe_allow_html=True)
     
-    # Verificar alertas
-    threshold = 15
-    alerts = check_price_alerts(threshold_percent=threshold)
+    # Resumen de la watchlist del usuario precalculado en cada ingesta: una
+    # lectura por rerun, sin recorrer históricos para las alertas ni el promedio
+    summary = get_dashboard_summary()
+    alerts = summary.get('alerts', [])
     
     if alerts:
         st.markdown(f"""
         <div class="alert-badge">
-            <div class="alert-title">⚠ {len(alerts)} Price Alert(s)</div>
-            <p style="margin: 0; color: #92400e;">Significant price drops detected</p>
+            <div class="alert-title">⚠ {summary['alert_count']} Price Alert(s)</div>
+            <p style="margin: 0; color: #92400e;">Price drops of {summary['alert_threshold']:.0f}% or more</p>
         </div>
         """, unsafe_allow_html=True)
         
-        for alert in alerts:
+        for alert in alerts[:DASHBOARD_MAX_ALERTS]:
             col1, col2 = st.columns([3, 1])
             with col1:
                 st.markdown(f"**{alert['title'][:60]}...**")
@@ -439,12 +941,14 @@ if page == "Dashboard":
             with col2:
                 st.metric("Price Drop", f"{alert['drop_percent']:.1f}%", 
                          delta=f"-${alert['previous_price'] - alert['current_price']:,.0f}")
+        if summary['alert_count'] > DASHBOARD_MAX_ALERTS:
+            st.caption(f"...and {summary['alert_count'] - DASHBOARD_MAX_ALERTS:,} more")
         st.markdown("---")
     
-    # Obtener productos
-    products = get_all_tracked_products()
+    # Totales del catálogo (una consulta agregada, sin traer los productos)
+    totals = get_tracked_totals()
     
-    if not products:
+    if not totals['count']:
         # Mensaje de bienvenida con instrucciones
         st.markdown("""
         <div style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); 
@@ -474,7 +978,7 @@ if page == "Dashboard":
                 <div style="font-size: 3rem; text-align: center;">➕</div>
                 <h3 style="color: #764ba2; text-align: center;">2. Track</h3>
                 <p style="text-align: center;">Click <b>+ Track</b> on products you want to monitor</p>
-                <p style="text-align: center; font-size: 0.9rem; color: #666;">We'll automatically fetch price history!</p>
+                <p style="text-align: center; font-size: 0.9rem; color: #666;">Every update adds a point to its price history</p>
             </div>
             """, unsafe_allow_html=True)
         
@@ -503,15 +1007,12 @@ if page == "Dashboard":
             st.markdown(f"""
             <div class="metric-card">
                 <div class="metric-label">Products</div>
-                <div class="metric-value">{len(products)}</div>
+                <div class="metric-value">{summary.get('total_products', 0):,}</div>
             </div>
             """, unsafe_allow_html=True)
         
         with col2:
-            total_price = sum(get_price_history(p['id'])[-1]['price'] 
-                            for p in products if get_price_history(p['id']))
-            count = len([p for p in products if get_price_history(p['id'])])
-            avg_price = total_price / count if count > 0 else 0
+            avg_price = summary.get('avg_price', 0.0)
             st.markdown(f"""
             <div class="metric-card">
                 <div class="metric-label">Avg Price</div>
@@ -523,161 +1024,116 @@ if page == "Dashboard":
             st.markdown(f"""
             <div class="metric-card">
                 <div class="metric-label">Active Alerts</div>
-                <div class="metric-value">{len(alerts)}</div>
+                <div class="metric-value">{summary.get('alert_count', 0):,}</div>
             </div>
             """, unsafe_allow_html=True)
         
         with col4:
-            st.markdown("""
+            stale = summary.get('pending_prices', 0) > 0
+            st.markdown(f"""
             <div class="metric-card">
                 <div class="metric-label">Status</div>
-                <div class="metric-value" style="color: #10b981;">Active</div>
+                <div class="metric-value" style="color: {'#f59e0b' if stale else '#10b981'};">{'Stale' if stale else 'Up to date'}</div>
             </div>
             """, unsafe_allow_html=True)
         
+        # Indicador de frescura del resumen
+        if summary:
+            col_age, col_refresh = st.columns([4, 1])
+            with col_age:
+                caption = (f"Summary computed {format_age(summary['computed_at'])} ago"
+                           f" • {summary.get('total_prices', 0):,} price records")
+                if stale:
+                    caption += f" • {summary['pending_prices']:,} new price(s) since"
+                st.caption(caption)
+            with col_refresh:
+                if stale and st.button("Refresh", key="refresh_summary", use_container_width=True):
+                    db.refresh_user_summaries([current_user['id']])
+                    st.rerun()
+        
+        # Mayores variaciones entre el último precio y el anterior
+        if summary.get('top_movers'):
+            st.markdown('<h2 class="section-title">Top Movers</h2>', unsafe_allow_html=True)
+            
+            cols = st.columns(len(summary['top_movers']))
+            for col, mover in zip(cols, summary['top_movers']):
+                with col:
+                    st.metric(
+                        mover['title'][:30],
+                        f"${mover['current_price']:,.0f}",
+                        f"{mover['change_percent']:+.1f}%",
+                        delta_color="inverse"
+                    )
+        
         st.markdown("<hr>", unsafe_allow_html=True)
         
         # Productos con búsqueda/filtro
         st.markdown('<h2 class="section-title">Tracked Products</h2>', unsafe_allow_html=True)
         
-        # Barra de búsqueda en productos trackeados
-        col_search, col_sort = st.columns([3, 1])
+        # Barra de búsqueda en productos trackeados. Cambiar filtro, orden o
+        # tamaño vuelve a la primera página.
+        def reset_dashboard_page():
+            st.session_state.dashboard_page = 1
+        
+        col_search, col_sort, col_size = st.columns([3, 1, 1])
         with col_search:
             filter_text = st.text_input(
                 "Filter products...",
-                placeholder="Type to filter by name...",
+                placeholder="Type words to filter by name...",
                 key="dashboard_filter",
-                label_visibility="collapsed"
+                label_visibility="collapsed",
+                on_change=reset_dashboard_page
             )
         with col_sort:
             sort_by = st.selectbox(
                 "Sort",
-                ["Recent", "Price ↓", "Price ↑", "Name"],
-                label_visibility="collapsed"
+                list(DASHBOARD_SORTS),
+                label_visibility="collapsed",
+                on_change=reset_dashboard_page
+            )
+        with col_size:
+            page_size = st.selectbox(
+                "Page size",
+                DASHBOARD_PAGE_SIZES,
+                format_func=lambda size: f"{size} / page",
+                label_visibility="collapsed",
+                on_change=reset_dashboard_page
             )
         
-        # Filtrar productos
-        filtered_products = products
-        if filter_text:
-            filtered_products = [p for p in products if filter_text.lower() in p['title'].lower()]
+        # Filtro, orden y página resueltos en SQL: solo se traen los productos visibles
+        matched = get_tracked_totals(filter_text)['count'] if filter_text else totals['count']
+        total_pages = max(1, -(-matched // page_size))
+        if st.session_state.get('dashboard_page', 1) > total_pages:
+            st.session_state.dashboard_page = total_pages
         
-        # Ordenar productos
-        if sort_by == "Price ↓":
-            filtered_products = sorted(filtered_products, key=lambda x: get_price_history(x['id'])[-1]['price'] if get_price_history(x['id']) else 0, reverse=True)
-        elif sort_by == "Price ↑":
-            filtered_products = sorted(filtered_products, key=lambda x: get_price_history(x['id'])[-1]['price'] if get_price_history(x['id']) else 0)
-        elif sort_by == "Name":
-            filtered_products = sorted(filtered_products, key=lambda x: x['title'])
+        page_products = get_tracked_page(
+            filter_text,
+            DASHBOARD_SORTS[sort_by],
+            st.session_state.get('dashboard_page', 1),
+            page_size
+        )
         
-        st.caption(f"Showing {len(filtered_products)} of {len(products)} products")
+        first = (st.session_state.get('dashboard_page', 1) - 1) * page_size
+        col_caption, col_page = st.columns([4, 1])
+        with col_caption:
+            if page_products:
+                st.caption(f"Showing {first + 1:,}–{first + len(page_products):,} of {matched:,} products"
+                           + (f" ({totals['count']:,} tracked)" if filter_text else ""))
+            else:
+                st.caption(f"No products match '{filter_text}'")
+        with col_page:
+            st.number_input(
+                "Page",
+                min_value=1,
+                max_value=total_pages,
+                step=1,
+                key="dashboard_page",
+                label_visibility="collapsed"
+            )
         st.markdown("---")
         
-        for product in filtered_products:
-            with st.container():
-                st.markdown('<div class="product-card">', unsafe_allow_html=True)
-                
-                col1, col2, col3 = st.columns([3, 1, 1])
-                
-                with col1:
-                    st.markdown(f'<div class="product-title">{product.get("title", "Untitled")}</div>', 
-                               unsafe_allow_html=True)
-                    st.markdown(f'<div class="product-meta">Seller: {product.get("seller", "Unknown")}</div>', 
-                               unsafe_allow_html=True)
-                    if product.get('url'):
-                        st.markdown(f"[View on MercadoLibre →]({product['url']})")
-                
-                with col2:
-                    hist = get_price_history(product['id'])
-                    current_price = hist[-1]['price'] if hist else 0
-                    st.markdown(f'<div class="price-tag">${current_price:,.0f}</div>', 
-                               unsafe_allow_html=True)
-                
-                with col3:
-                    if st.button("Update", key=f"update_{product['id']}", use_container_width=True):
-                        with st.spinner("Updating..."):
-                            try:
-                                results = scraper.search_products(product['title'][:50], limit=1)
-                                if results and len(results) > 0:
-                                    updated_product = results[0]
-                                    updated_product['id'] = product['id']
-                                    save_product_to_session(updated_product)
-                                    st.success(f"Updated: ${updated_product['price']:,.0f}")
-                                    st.rerun()
-                                else:
-                                    st.warning("Could not update")
-                            except Exception as e:
-                                st.error(f"Error: {str(e)}")
-                    
-                    if st.button("Chart", key=f"graph_{product['id']}", use_container_width=True):
-                        st.session_state[f'show_graph_{product["id"]}'] = True
-                        st.rerun()
-                
-                # Mostrar gráfico
-                if st.session_state.get(f'show_graph_{product["id"]}', False):
-                    history = get_price_history(product['id'])
-                    
-                    if history and len(history) > 0:
-                        df = pd.DataFrame(history)
-                        df['scraped_at'] = pd.to_datetime(df['scraped_at'])
-                        
-                        # Calcular estadísticas
-                        avg_price = df['price'].mean()
-                        min_price = df['price'].min()
-                        
-                        # Gráfico con líneas de referencia
-                        fig = go.Figure()
-                        
-                        # Línea principal
-                        fig.add_trace(go.Scatter(
-                            x=df['scraped_at'],
-                            y=df['price'],
-                            mode='lines+markers',
-                            name='Price',
-                            line=dict(color='#3498db', width=3),
-                            marker=dict(size=7, color='#3498db'),
-                            hovertemplate='<b>$%{y:,.0f}</b><br>%{x|%d/%m/%Y}<extra></extra>'
-                        ))
-                        
-                        # Línea de promedio
-                        fig.add_trace(go.Scatter(
-                            x=df['scraped_at'],
-                            y=[avg_price] * len(df),
-                            mode='lines',
-                            name=f'Avg: ${avg_price:,.0f}',
-                            line=dict(color='#27ae60', width=2, dash='dash'),
-                            showlegend=True
-                        ))
-                        
-                        # Línea de mínimo
-                        fig.add_trace(go.Scatter(
-                            x=df['scraped_at'],
-                            y=[min_price] * len(df),
-                            mode='lines',
-                            name=f'Min: ${min_price:,.0f}',
-                            line=dict(color='#e74c3c', width=2, dash='dot'),
-                            showlegend=True
-                        ))
-                        
-                        fig.update_layout(
-                            title=f"{product.get('title', 'Product')[:50]}...",
-                            height=350,
-                            font=dict(family='Arial, sans-serif', size=11),
-                            plot_bgcolor='#f8f9fa',
-                            paper_bgcolor='white',
-                            showlegend=True,
-                            legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1),
-                            xaxis=dict(showgrid=True, gridcolor='#e0e0e0'),
-                            yaxis=dict(showgrid=True, gridcolor='#e0e0e0', tickformat='$,.0f'),
-                            margin=dict(l=60, r=20, t=60, b=50)
-                        )
-                        
-                        st.plotly_chart(fig, use_container_width=True)
-                        
-                        if st.button("Close", key=f"close_{product['id']}"):
-                            st.session_state[f'show_graph_{product["id"]}'] = False
-                            st.rerun()
-                
-                st.markdown('</div>', unsafe_allow_html=True)
+        for product in page_products:
+            render_product_card(product)
 
 # ==================== BUSCAR PRODUCTOS ====================
 elif page == "Search Products":
@@ -696,25 +1152,56 @@ elif page == "Search Products":
     with col2:
         limit = st.number_input("Results", min_value=1, max_value=20, value=10)
     
+    # Primero el catálogo local (precios recientes, respuesta inmediata); si no
+    # alcanza para el límite, el scraper completa en segundo plano y los
+    # resultados se combinan al llegar
     if st.button("Search", use_container_width=True, type="primary"):
         if search_query:
-            with st.spinner(f"Searching '{search_query}'..."):
-                try:
-                    results = scraper.search_products(search_query, limit=limit)
-                    
-                    if results:
-                        st.session_state.search_results = results
-                        st.session_state.last_search_query = search_query
-                        st.success(f"Found {len(results)} products")
-                    else:
-                        st.session_state.search_results = []
-                        st.warning("No products found")
-                        
-                except Exception as e:
-                    st.error(f"Error: {str(e)}")
+            try:
+                results = search_local(search_query, limit)
+                st.session_state.search_results = results
+                st.session_state.last_search_query = search_query
+                st.session_state.search_limit = limit
+                
+                if len(results) < limit:
+                    start_live_search(search_query, limit)
+                else:
+                    jobs.cancel(st.session_state.get('search_job_id'))
+                    st.session_state.search_job_id = None
+                    st.success(f"Found {len(results)} products with prices from the last {SEARCH_FRESHNESS_HOURS} h")
+            except Exception as e:
+                st.error(f"Error: {str(e)}")
         else:
             st.warning("Please enter a search term")
     
+    search_job = jobs.get(st.session_state.get('search_job_id'))
+    if search_job:
+        apply_live_results(search_job)
+        
+        @st.fragment(run_every=JOB_POLL_SECONDS if search_job['active'] else None)
+        def live_search_progress():
+            job = jobs.get(st.session_state.get('search_job_id'))
+            if not job:
+                return
+            
+            if job['active']:
+                found = len(st.session_state.search_results)
+                st.info(f"🔎 Searching MercadoLibre live... ({found} recent from the local catalog so far, {job['seconds']:.0f}s)")
+            elif apply_live_results(job):
+                # Llegaron los resultados en vivo: rerun completo para mostrarlos
+                st.rerun(scope="app")
+            elif job['status'] == JOB_FAILED:
+                st.error(f"Live search failed: {job['errors'][-1]['error'] if job['errors'] else 'unknown error'}")
+            elif not st.session_state.search_results:
+                st.warning("No products found")
+        
+        live_search_progress()
+    elif st.session_state.search_results and st.session_state.last_search_query:
+        if st.button("Search live anyway", key="force_live_search"):
+            start_live_search(st.session_state.last_search_query,
+                              st.session_state.get('search_limit', len(st.session_state.search_results)))
+            st.rerun()
+    
     if st.session_state.search_results:
         results = st.session_state.search_results
         
@@ -722,6 +1209,8 @@ elif page == "Search Products":
                    unsafe_allow_html=True)
         st.caption(f"Search: **{st.session_state.last_search_query}**")
         
+        tracked_ids = get_tracked_ids(p['id'] for p in results if p.get('id'))
+        
         for i in range(0, len(results), 2):
             cols = st.columns(2)
             
@@ -763,6 +1252,8 @@ elif page == "Search Products":
                             col_info1, col_info2 = st.columns(2)
                             with col_info1:
                                 st.caption(f"Seller: {product.get('seller', 'Unknown')}")
+                                if product.get('source') == 'local' and product.get('last_at'):
+                                    st.caption(f"Local price • seen {format_age(product['last_at'])} ago")
                             with col_info2:
                                 if product.get('free_shipping'):
                                     st.markdown('<span class="badge badge-success">Free Ship</span>', 
@@ -780,17 +1271,16 @@ elif page == "Search Products":
                                 unique_key = f"add_{product.get('id', '')}_{i}_{j}"
                                 
                                 # Verificar si ya está trackeado
-                                tracked_products = get_all_tracked_products()
-                                already_tracked = any(p['id'] == product.get('id') for p in tracked_products)
+                                already_tracked = product.get('id') in tracked_ids
                                 
                                 if already_tracked:
                                     st.button("✓ Tracked", key=unique_key, use_container_width=True, disabled=True, type="secondary")
                                 else:
                                     if st.button("+ Track", key=unique_key, use_container_width=True, type="primary"):
-                                        with st.spinner("📊 Adding product and fetching price history..."):
+                                        with st.spinner("📊 Adding product..."):
                                             try:
-                                                save_product_to_session(product, auto_fetch_history=True)
-                                                st.success("✅ Product added with price history!")
+                                                track_product(product)
+                                                st.success("✅ Product added! History builds up with each update.")
                                                 st.balloons()
                                                 st.rerun()
                                             except Exception as e:
@@ -840,175 +1330,7 @@ elif page == "Analytics":
         
         # Mostrar nombre del producto seleccionado
         st.markdown(f'<h2 class="section-title">{product["title"]}</h2>', unsafe_allow_html=True)
-        history = get_price_history(product['id'])
-        
-        if history and len(history) > 0:
-            try:
-                df = pd.DataFrame(history)
-                df['scraped_at'] = pd.to_datetime(df['scraped_at'], errors='coerce')
-                df = df.dropna(subset=['scraped_at'])
-                
-                if len(df) == 0:
-                    st.warning("No valid data")
-                    st.stop()
-                    
-            except Exception as e:
-                st.error(f"Error: {str(e)}")
-                st.stop()
-            
-            # Stats
-            col1, col2, col3, col4 = st.columns(4)
-            
-            stats = [
-                ("Current", df['price'].iloc[-1]),
-                ("Minimum", df['price'].min()),
-                ("Maximum", df['price'].max()),
-                ("Average", df['price'].mean())
-            ]
-            
-            for col, (label, value) in zip([col1, col2, col3, col4], stats):
-                with col:
-                    col.markdown(f"""
-                    <div class="metric-card">
-                        <div class="metric-label">{label}</div>
-                        <div class="metric-value">${value:,.0f}</div>
-                    </div>
-                    """, unsafe_allow_html=True)
-            
-            st.markdown("<hr>", unsafe_allow_html=True)
-            
-            # Gráfico
-            st.markdown('<h2 class="section-title">Price Evolution</h2>', unsafe_allow_html=True)
-            
-            # Calcular estadísticas
-            current_price = df['price'].iloc[-1]
-            avg_price = df['price'].mean()
-            min_price = df['price'].min()
-            max_price = df['price'].max()
-            
-            # Crear gráfico con líneas de referencia
-            fig = go.Figure()
-            
-            # Línea principal de precio
-            fig.add_trace(go.Scatter(
-                x=df['scraped_at'],
-                y=df['price'],
-                mode='lines+markers',
-                name='Price',
-                line=dict(color='#e74c3c', width=3),
-                marker=dict(size=8, color='#e74c3c'),
-                hovertemplate='<b>$%{y:,.0f}</b><br>%{x|%d/%m/%Y}<extra></extra>'
-            ))
-            
-            # Línea de promedio
-            fig.add_trace(go.Scatter(
-                x=df['scraped_at'],
-                y=[avg_price] * len(df),
-                mode='lines',
-                name=f'Average: ${avg_price:,.0f}',
-                line=dict(color='#27ae60', width=2, dash='dash'),
-                hovertemplate='Average: $%{y:,.0f}<extra></extra>'
-            ))
-            
-            # Línea de mínimo
-            fig.add_trace(go.Scatter(
-                x=df['scraped_at'],
-                y=[min_price] * len(df),
-                mode='lines',
-                name=f'Minimum: ${min_price:,.0f}',
-                line=dict(color='#3498db', width=2, dash='dot'),
-                hovertemplate='Minimum: $%{y:,.0f}<extra></extra>'
-            ))
-            
-            fig.update_layout(
-                height=450,
-                font=dict(family='Arial, sans-serif', size=12),
-                plot_bgcolor='#f8f9fa',
-                paper_bgcolor='white',
-                showlegend=True,
-                legend=dict(
-                    orientation="h",
-                    yanchor="bottom",
-                    y=1.02,
-                    xanchor="right",
-                    x=1
-                ),
-                xaxis=dict(
-                    title='Date',
-                    showgrid=True,
-                    gridcolor='#e0e0e0',
-                    gridwidth=1,
-                    zeroline=False
-                ),
-                yaxis=dict(
-                    title='Price (ARS)',
-                    showgrid=True,
-                    gridcolor='#e0e0e0',
-                    gridwidth=1,
-                    zeroline=False,
-                    tickformat='$,.0f'
-                ),
-                margin=dict(l=70, r=30, t=80, b=60),
-                hovermode='x unified'
-            )
-            
-            st.plotly_chart(fig, use_container_width=True)
-            
-            # Distribution
-            st.markdown('<h2 class="section-title">Price Distribution</h2>', unsafe_allow_html=True)
-            
-            fig2 = px.histogram(
-                df,
-                x='price',
-                nbins=15,
-                labels={'price': 'Price (ARS)'}
-            )
-            
-            fig2.update_layout(height=350)
-            
-            st.plotly_chart(fig2, use_container_width=True)
-            
-            # Recommendation
-            current = df['price'].iloc[-1]
-            min_price = df['price'].min()
-            avg_price = df['price'].mean()
-            
-            if current <= min_price * 1.05:
-                st.success("★★★★★ Excellent time to buy! Price near historical minimum.")
-            elif current <= avg_price * 0.95:
-                st.info("★★★★ Good time to buy. Price below average.")
-            elif current <= avg_price * 1.05:
-                st.warning("★★★ Normal price. You can wait for a better offer.")
-            else:
-                st.error("★★ High price. We recommend waiting.")
-            
-            # Export
-            st.markdown("<hr>", unsafe_allow_html=True)
-            st.markdown('<h2 class="section-title">Export Data</h2>', unsafe_allow_html=True)
-            
-            col1, col2 = st.columns(2)
-            
-            with col1:
-                csv = df.to_csv(index=False)
-                st.download_button(
-                    label="Download CSV",
-                    data=csv,
-                    file_name=f"prices_{product['id']}.csv",
-                    mime="text/csv",
-                    use_container_width=True
-                )
-            
-            with col2:
-                json_data = df.to_json(orient='records', indent=2)
-                st.download_button(
-                    label="Download JSON",
-                    data=json_data,
-                    file_name=f"prices_{product['id']}.json",
-                    mime="application/json",
-                    use_container_width=True
-                )
-        else:
-            st.info("Insufficient price history")
+        render_product_analysis(product)
 
 # ==================== CONFIGURACIÓN ====================
 elif page == "Settings":
@@ -1016,55 +1338,96 @@ elif page == "Settings":
     
     st.markdown('<h2 class="section-title">Price Alerts</h2>', unsafe_allow_html=True)
     
-    enable_alerts = st.checkbox("Enable price alerts", value=True)
+    # Regla de caída para todo el catálogo (product_id NULL); las de cada
+    # producto se configuran en Analytics
+    global_rules = [rule for rule in db.get_alert_rules(product_ids=[])
+                    if rule['kind'] == RULE_DROP_PERCENT and rule['owner'] is None]
+    
+    enable_alerts = st.checkbox("Enable price alerts", value=bool(global_rules))
     
     if enable_alerts:
         alert_threshold = st.slider(
             "Alert threshold (% drop):",
             min_value=5,
             max_value=50,
-            value=15,
+            value=int(global_rules[0]['threshold']) if global_rules else 15,
             step=5
         )
         
         st.info(f"You'll be notified when a product drops {alert_threshold}% or more")
     
+    if st.button("Save alert settings"):
+        for rule in global_rules:
+            db.delete_alert_rule(rule['id'])
+        if enable_alerts:
+            db.add_alert_rule(RULE_DROP_PERCENT, threshold=alert_threshold)
+        db.refresh_summary(db.get_drop_threshold())
+        db.refresh_user_summaries()
+        st.success("Alert settings saved")
+    
+    recent_alerts = db.get_alert_events(limit=10)
+    if recent_alerts:
+        with st.expander(f"Recent alerts ({len(recent_alerts)})"):
+            for event in recent_alerts:
+                st.caption(f"{event['created_at'][:16]} • {event['title'][:50]} — {event['message']}")
+    
     st.markdown("<hr>", unsafe_allow_html=True)
     
     st.markdown('<h2 class="section-title">Bulk Update</h2>', unsafe_allow_html=True)
     
-    if st.button("Update All Products", use_container_width=True, type="primary"):
-        products = get_all_tracked_products()
+    # El barrido corre en el pool de JobManager: la página sigue respondiendo y
+    # el progreso se consulta cada JOB_POLL_SECONDS sin rerun completo
+    bulk_job = jobs.get(st.session_state.get('bulk_job_id'))
+    
+    if st.button("Update All Products", use_container_width=True, type="primary",
+                 disabled=bool(bulk_job.get('active'))):
+        # Productos seguidos por cualquier usuario, cada uno una sola vez
+        products = db.get_watched_products()
         
         if products:
-            st.info(f"Updating {len(products)} products...")
-            progress = st.progress(0)
-            status = st.empty()
-            
-            updated_count = 0
-            
-            for i, product in enumerate(products):
-                status.text(f"Updating: {product['title'][:40]}...")
-                
-                try:
-                    results = scraper.search_products(product['title'][:50], limit=1)
-                    
-                    if results and len(results) > 0:
-                        updated_product = results[0]
-                        updated_product['id'] = product['id']
-                        save_product_to_session(updated_product)
-                        updated_count += 1
-                except:
-                    pass
-                
-                progress.progress((i + 1) / len(products))
-            
-            status.empty()
-            progress.empty()
-            st.success(f"✓ Updated {updated_count} of {len(products)} products")
+            st.session_state.bulk_job_id = jobs.submit_bulk_update(products)
+            st.rerun()
         else:
             st.warning("No products to update")
     
+    if bulk_job:
+        @st.fragment(run_every=JOB_POLL_SECONDS if bulk_job['active'] else None)
+        def bulk_update_progress():
+            job = jobs.get(st.session_state.get('bulk_job_id'))
+            if not job:
+                return
+            
+            if job['active']:
+                st.progress(job['progress'], text=f"Updating {job['processed']:,} of {job['total']:,} products...")
+                col_status, col_cancel = st.columns([4, 1])
+                with col_status:
+                    if job['current']:
+                        st.caption(f"Current: {job['current'][:60]}")
+                    st.caption(f"Updated {job['updated']:,} • Failed {job['failed']:,} • {job['seconds']:.0f}s")
+                with col_cancel:
+                    if st.button("Cancel", key="cancel_bulk_job", use_container_width=True):
+                        jobs.cancel(job['id'])
+                        st.rerun()
+            elif bulk_job['active']:
+                # Terminó mientras se consultaba: rerun completo para dejar de
+                # consultar y mostrar los precios nuevos
+                st.rerun(scope="app")
+            else:
+                message = f"Updated {job['updated']:,} of {job['total']:,} products in {job['seconds']:.0f}s"
+                if job['status'] == JOB_CANCELLED:
+                    st.warning(f"Cancelled. {message}")
+                elif job['status'] == JOB_FAILED:
+                    st.error(f"Update failed. {message}")
+                else:
+                    st.success(f"✓ {message}")
+            
+            if job['errors']:
+                with st.expander(f"{job['failed']:,} error(s)"):
+                    for error in job['errors']:
+                        st.caption(f"{(error['title'] or '')[:50]}: {error['error']}")
+        
+        bulk_update_progress()
+    
     st.markdown("<hr>", unsafe_allow_html=True)
     
     st.markdown('<h2 class="section-title">System Info</h2>', unsafe_allow_html=True)
@@ -1075,7 +1438,7 @@ elif page == "Settings":
         st.markdown(f"""
         <div class="metric-card">
             <div class="metric-label">Tracked Products</div>
-            <div class="metric-value">{len(get_all_tracked_products())}</div>
+            <div class="metric-value">{get_tracked_totals()['count']:,}</div>
         </div>
         """, unsafe_allow_html=True)
     
@@ -1087,6 +1450,38 @@ elif page == "Settings":
         </div>
         """, unsafe_allow_html=True)
     
+    db_stats = load_db_stats(db.get_data_version())
+    st.caption(f"{db.db_path} • {db_stats.get('total_prices', 0):,} prices recorded"
+               + (f" • last update {db_stats['last_record'][:16]}" if db_stats.get('last_record') else ""))
+    
+    # Métricas de rendimiento del proceso
+    st.markdown("#### Performance Metrics")
+    
+    metrics_snapshot = REGISTRY.snapshot()
+    
+    if metrics_snapshot['histograms']:
+        timings_df = pd.DataFrame([
+            {
+                'Metric': row['metric'].replace('_seconds', ''),
+                'Labels': ", ".join(f"{k}={v}" for k, v in row['labels'].items()),
+                'Calls': row['count'],
+                'Avg (ms)': round(row['avg_ms'], 2),
+                'p95 (ms)': round(row['p95_ms'], 2),
+                'Total (s)': round(row['total_s'], 3)
+            }
+            for row in metrics_snapshot['histograms']
+        ])
+        st.dataframe(timings_df, use_container_width=True, hide_index=True)
+    else:
+        st.caption("No timings recorded yet in this process.")
+    
+    if metrics_server:
+        host, port = metrics_server.server_address[:2]
+        st.caption(f"Prometheus endpoint: http://{host}:{port}/metrics")
+    
+    with st.expander("Prometheus text format"):
+        st.code(REGISTRY.render(), language="text")
+    
     st.markdown("<hr>", unsafe_allow_html=True)
     
     st.markdown('<h2 class="section-title">Resources</h2>', unsafe_allow_html=True)
@@ -1094,4 +1489,6 @@ elif page == "Settings":
     st.markdown("""
     - [Documentation](https://github.com/Vladimir-Bulan/mercadolibre-price-monitor)
     
-    """)
\ No newline at end of file
+    """)
+
+stop_profile(page_profile)
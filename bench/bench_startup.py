@@ -0,0 +1,97 @@
+"""
+Benchmark de Tiempo de Arranque
+Mide cuánto tarda en importarse cada tipo de worker en un intérprete limpio
+
+Uso:
+    python bench/bench_startup.py --repeat 10
+    python -X importtime -c "import database" 2> importtime.log   # detalle por módulo
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from datetime import datetime
+from typing import Dict
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+
+sys.path.insert(0, BENCH_DIR)
+
+from run_bench import RESULTS_DIR, _git_commit
+
+
+# Worker → código importado (se ejecuta con el repo en sys.path)
+WORKERS = {
+    'database_only': "import database",
+    'scraper_only': "import scraper",
+    'scraper_and_database': "import scraper, database",
+    'analyzer': "import analyzer",
+    'analyzer_with_plots': "import analyzer; analyzer._pyplot(); import plotly.graph_objects",
+}
+
+_TIMER = (
+    "import sys, time; sys.path.insert(0, {root!r}); t = time.perf_counter(); "
+    "{code}; print(time.perf_counter() - t)"
+)
+
+
+def time_import(code: str, repeat: int = 5) -> Dict:
+    """
+    Importa `code` en procesos nuevos y devuelve los tiempos
+    
+    Args:
+        code: Sentencias de import a medir
+        repeat: Cantidad de procesos lanzados
+    
+    Returns:
+        Diccionario con min/mediana en milisegundos, o el error si el import falla
+    """
+    times = []
+    for _ in range(repeat):
+        proc = subprocess.run(
+            [sys.executable, "-c", _TIMER.format(root=ROOT_DIR, code=code)],
+            capture_output=True, text=True
+        )
+        if proc.returncode != 0:
+            return {'error': proc.stderr.strip().splitlines()[-1]}
+        times.append(float(proc.stdout.strip().splitlines()[-1]) * 1000)
+    
+    return {'min_ms': min(times), 'median_ms': statistics.median(times), 'repeat': repeat}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tiempo de import por tipo de worker")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', help="Archivo JSON de salida (por defecto bench/results/<commit>_startup.json)")
+    args = parser.parse_args()
+    
+    results = {}
+    print(f"{'worker':<24}{'min (ms)':>12}{'mediana (ms)':>16}")
+    for name, code in WORKERS.items():
+        results[name] = time_import(code, args.repeat)
+        row = results[name]
+        if 'error' in row:
+            print(f"{name:<24}{'—':>12}{'—':>16}   ({row['error']})")
+        else:
+            print(f"{name:<24}{row['min_ms']:>12,.1f}{row['median_ms']:>16,.1f}")
+    
+    commit = _git_commit()
+    output = args.output or os.path.join(RESULTS_DIR, f"{commit}_startup.json")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump({
+            'commit': commit,
+            'timestamp': datetime.now().isoformat(),
+            'python': sys.version.split()[0],
+            'results': results,
+        }, f, indent=2)
+    
+    print(f"\n✓ Resultados guardados en: {output}")
+
+
+if __name__ == "__main__":
+    main()
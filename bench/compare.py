@@ -0,0 +1,63 @@
+"""
+Comparación de Resultados de Benchmarks
+Compara dos corridas de run_bench.py y marca regresiones
+"""
+
+import argparse
+import json
+import sys
+from typing import Dict, List
+
+
+def compare(before: Dict, after: Dict, threshold: float = 10.0) -> List[Dict]:
+    """
+    Compara los tiempos mínimos de dos corridas
+    
+    Args:
+        before: Reporte JSON de referencia
+        after: Reporte JSON nuevo
+        threshold: Porcentaje de enlentecimiento que se considera regresión
+    
+    Returns:
+        Lista de filas con el cambio porcentual por benchmark
+    """
+    rows = []
+    for name, new in after['results'].items():
+        old = before['results'].get(name)
+        if not old:
+            continue
+        
+        change = (new['min_s'] - old['min_s']) / old['min_s'] * 100 if old['min_s'] else 0.0
+        rows.append({
+            'benchmark': name,
+            'before_ms': old['min_s'] * 1000,
+            'after_ms': new['min_s'] * 1000,
+            'change_percent': change,
+            'regression': change >= threshold,
+        })
+    
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compara dos reportes de benchmarks")
+    parser.add_argument('before')
+    parser.add_argument('after')
+    parser.add_argument('--threshold', type=float, default=10.0, help="%% de regresión tolerado")
+    args = parser.parse_args()
+    
+    with open(args.before, encoding='utf-8') as f:
+        before = json.load(f)
+    with open(args.after, encoding='utf-8') as f:
+        after = json.load(f)
+    
+    rows = compare(before, after, args.threshold)
+    
+    print(f"{before['commit']} → {after['commit']}\n")
+    print(f"{'benchmark':<28}{'antes (ms)':>14}{'después (ms)':>16}{'cambio':>10}")
+    for row in rows:
+        flag = "  ⚠️" if row['regression'] else ""
+        print(f"{row['benchmark']:<28}{row['before_ms']:>14,.1f}{row['after_ms']:>16,.1f}"
+              f"{row['change_percent']:>+9.1f}%{flag}")
+    
+    sys.exit(1 if any(row['regression'] for row in rows) else 0)
@@ -0,0 +1,201 @@
+"""
+Suite de Benchmarks
+Mide las APIs principales sobre un catálogo sintético y guarda los resultados en JSON
+
+Uso:
+    python bench/run_bench.py --preset small
+    python bench/run_bench.py --products 50000 --prices 2000000 --repeat 5
+    python bench/compare.py bench/results/<antes>.json bench/results/<despues>.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Callable, Dict, List
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from database import PriceDatabase
+from analyzer import PriceAnalyzer, CatalogAnalyzer, AnomalyDetector, PriceForecaster
+from utils import generate_report
+from synthetic import PRESETS, generate_catalog, iter_price_rows
+
+
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=BENCH_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+def measure(func: Callable, repeat: int = 3, ops: int = 1) -> Dict:
+    """
+    Ejecuta una función varias veces y resume los tiempos
+    
+    Args:
+        func: Función sin argumentos a medir
+        repeat: Cantidad de repeticiones
+        ops: Operaciones lógicas por ejecución (para calcular ops/s)
+    
+    Returns:
+        Diccionario con min/mediana/máximo en segundos y throughput
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    
+    best = min(times)
+    return {
+        'min_s': best,
+        'median_s': statistics.median(times),
+        'max_s': max(times),
+        'repeat': repeat,
+        'ops': ops,
+        'ops_per_s': ops / best if best > 0 else None,
+    }
+
+
+def run_suite(db_path: str, n_products: int, repeat: int = 3, sample: int = 200,
+              write_rows: int = 2_000, skip: List[str] = ()) -> Dict[str, Dict]:
+    """
+    Corre todos los benchmarks sobre una base ya poblada
+    
+    Args:
+        db_path: Base sintética
+        n_products: Productos en la base (para muestrear IDs)
+        repeat: Repeticiones por benchmark
+        sample: Productos consultados en los benchmarks por producto
+        write_rows: Filas usadas en los benchmarks de escritura
+        skip: Nombres de benchmarks a omitir (ej: check_price_alerts en catálogos enormes)
+    
+    Returns:
+        Resultados por benchmark
+    """
+    db = PriceDatabase(db_path)
+    rng = random.Random(7)
+    ids = [f"MLA{1_000_000_000 + rng.randrange(n_products)}" for _ in range(sample)]
+    results = {}
+    
+    def bench(name: str, func: Callable, ops: int = 1, times: int = repeat):
+        if name in skip:
+            return
+        print(f"  · {name} ...", end=" ", flush=True)
+        results[name] = measure(func, times, ops)
+        print(f"{results[name]['min_s'] * 1000:,.1f} ms")
+    
+    # Escrituras: fila a fila vs lote sobre una base aparte para no alterar las lecturas
+    with tempfile.TemporaryDirectory() as tmp:
+        write_db = PriceDatabase(os.path.join(tmp, "writes.db"))
+        rows = list(iter_price_rows(max(1, write_rows // 10), write_rows, seed=99))
+        
+        bench("save_price", lambda: [write_db.save_price(row) for row in rows], ops=len(rows), times=1)
+        bench("save_prices_bulk", lambda: write_db.save_prices(rows), ops=len(rows), times=1)
+    
+    # Lecturas
+    bench("get_price_history", lambda: [db.get_price_history(pid) for pid in ids], ops=len(ids))
+    bench("get_price_stats", lambda: [db.get_price_stats(pid) for pid in ids], ops=len(ids))
+    bench("get_all_products", db.get_all_products)
+    bench("get_price_changes", db.get_price_changes)
+    bench("check_price_alerts", db.check_price_alerts, times=1)
+    bench("refresh_summary", db.refresh_summary, times=1)
+    bench("get_summary", db.get_summary)
+    bench("search_products_local", lambda: db.search_products_local("samsung mod"))
+    bench("get_tracked_totals_query", lambda: db.get_tracked_totals("lenovo notebook"))
+    
+    # Análisis y reportes
+    histories = [db.get_price_history(pid) for pid in ids[:50]]
+    bench("analyzer_get_statistics",
+          lambda: [PriceAnalyzer(history).get_statistics() for history in histories],
+          ops=len(histories))
+    
+    bench("catalog_analyze", lambda: CatalogAnalyzer.from_database(db).analyze(), ops=n_products, times=1)
+    bench("catalog_buy_signals", lambda: CatalogAnalyzer.from_database(db).get_buy_signals(),
+          ops=n_products, times=1)
+    bench("detect_anomalies", lambda: AnomalyDetector().run(db, full=True), ops=n_products, times=1)
+    bench("forecast_fit", lambda: PriceForecaster().run(db, full=True), ops=n_products, times=1)
+    bench("catalog_correlations", lambda: CatalogAnalyzer.from_database(db).get_correlations(),
+          ops=n_products, times=1)
+    
+    catalog = db.get_all_products()
+    for product in catalog:
+        product['price'] = product['avg_price'] or 0
+    bench("generate_report", lambda: generate_report(catalog), ops=len(catalog))
+    
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks del monitor de precios")
+    parser.add_argument('--preset', choices=sorted(PRESETS), default='small')
+    parser.add_argument('--products', type=int, help="Sobrescribe la cantidad de productos del preset")
+    parser.add_argument('--prices', type=int, help="Sobrescribe la cantidad de precios del preset")
+    parser.add_argument('--db', help="Base existente a reutilizar (se genera si no existe)")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--sample', type=int, default=200)
+    parser.add_argument('--skip', action='append', default=[], help="Benchmark a omitir (repetible)")
+    parser.add_argument('--output', help="Archivo JSON de salida (por defecto bench/results/<commit>_<preset>.json)")
+    args = parser.parse_args()
+    
+    n_products, n_prices = PRESETS[args.preset]
+    n_products = args.products or n_products
+    n_prices = args.prices or n_prices
+    
+    tmp = None
+    db_path = args.db
+    if not db_path:
+        tmp = tempfile.TemporaryDirectory()
+        db_path = os.path.join(tmp.name, "bench.db")
+    
+    print(f"=== Benchmark: {n_products:,} productos / {n_prices:,} precios ===\n")
+    
+    generation = None
+    if not os.path.exists(db_path):
+        print("Generando catálogo sintético...")
+        generation = generate_catalog(db_path, n_products, n_prices)
+        print(f"✓ Generado en {generation['seconds']}s\n")
+    
+    results = run_suite(db_path, n_products, args.repeat, args.sample, skip=args.skip)
+    
+    commit = _git_commit()
+    report = {
+        'commit': commit,
+        'timestamp': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'preset': args.preset,
+        'products': n_products,
+        'prices': n_prices,
+        'generation': generation,
+        'results': results,
+    }
+    
+    output = args.output or os.path.join(RESULTS_DIR, f"{commit}_{args.preset}.json")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    
+    print(f"\n✓ Resultados guardados en: {output}")
+    
+    if tmp:
+        tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Generador de Catálogos Sintéticos
+Llena una PriceDatabase con productos e históricos de precios reproducibles
+"""
+
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from database import PriceDatabase
+
+
+# Tamaños predefinidos (productos, filas de precios)
+PRESETS = {
+    'small': (10_000, 100_000),
+    'medium': (100_000, 1_000_000),
+    'large': (1_000_000, 10_000_000),
+    'xl': (1_000_000, 20_000_000),
+}
+
+CATEGORIES = ['Notebook', 'Celular', 'Smart TV', 'Auriculares', 'Heladera', 'Zapatillas', 'Monitor', 'Consola']
+BRANDS = ['Lenovo', 'Samsung', 'Motorola', 'Apple', 'Sony', 'LG', 'Xiaomi', 'Noblex', 'Philips', 'Nike']
+SELLERS = ['Tienda Oficial', 'Vendedor Platinum', 'MercadoLíder', 'Distribuidora Sur', 'Importados BA']
+
+
+def _product(index: int, rng: random.Random) -> Dict:
+    category = CATEGORIES[index % len(CATEGORIES)]
+    brand = rng.choice(BRANDS)
+    return {
+        'id': f"MLA{1_000_000_000 + index}",
+        'title': f"{category} {brand} Modelo {index % 997} Edición {index % 13} envío gratis",
+        'link': f"https://articulo.mercadolibre.com.ar/MLA-{1_000_000_000 + index}",
+        'category': category,
+        'base_price': rng.uniform(5_000, 2_000_000),
+    }
+
+
+def iter_price_rows(n_products: int, n_prices: int, days: int = 365, seed: int = 42) -> Iterator[Dict]:
+    """
+    Genera filas de precios con random walk por producto
+    
+    Args:
+        n_products: Cantidad de productos del catálogo
+        n_prices: Cantidad total de observaciones de precio
+        days: Ventana temporal cubierta por el histórico
+        seed: Semilla para que el catálogo sea reproducible
+    
+    Yields:
+        Diccionarios con el formato que espera PriceDatabase.save_prices
+    """
+    rng = random.Random(seed)
+    per_product = max(1, n_prices // n_products)
+    remainder = n_prices - per_product * n_products
+    start = datetime(2024, 1, 1)
+    step = timedelta(days=days) / per_product
+    
+    for index in range(n_products):
+        product = _product(index, rng)
+        count = per_product + (1 if index < remainder else 0)
+        price = product['base_price']
+        seller = rng.choice(SELLERS)
+        free_shipping = rng.random() < 0.6
+        
+        for i in range(count):
+            price = max(100.0, price * (1 + rng.gauss(0, 0.03)))
+            yield {
+                'id': product['id'],
+                'title': product['title'],
+                'link': product['link'],
+                'category': product['category'],
+                'price': round(price, 2),
+                'seller': seller,
+                'free_shipping': free_shipping,
+                'scraped_at': (start + step * i).isoformat(),
+            }
+
+
+def generate_catalog(db_path: str, n_products: int, n_prices: int, days: int = 365,
+                     seed: int = 42, batch_size: int = 50_000) -> Dict:
+    """
+    Crea (o completa) una base sintética usando la inserción por lotes
+    
+    Args:
+        db_path: Ruta de la base SQLite destino
+        n_products: Cantidad de productos
+        n_prices: Cantidad total de filas de precios
+        days: Días de histórico simulado
+        seed: Semilla del generador
+        batch_size: Filas por transacción
+    
+    Returns:
+        Diccionario con tamaños y tiempo de generación
+    """
+    db = PriceDatabase(db_path)
+    start = time.perf_counter()
+    batch: List[Dict] = []
+    inserted = 0
+    
+    for row in iter_price_rows(n_products, n_prices, days, seed):
+        batch.append(row)
+        if len(batch) >= batch_size:
+            inserted += db.save_prices(batch)
+            batch = []
+    
+    if batch:
+        inserted += db.save_prices(batch)
+    
+    return {
+        'db_path': db_path,
+        'products': n_products,
+        'prices': inserted,
+        'seconds': round(time.perf_counter() - start, 3),
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Genera un catálogo sintético de precios")
+    parser.add_argument('db_path')
+    parser.add_argument('--preset', choices=sorted(PRESETS), default='small')
+    parser.add_argument('--products', type=int)
+    parser.add_argument('--prices', type=int)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    
+    n_products, n_prices = PRESETS[args.preset]
+    info = generate_catalog(args.db_path, args.products or n_products, args.prices or n_prices, seed=args.seed)
+    print(f"✓ {info['products']:,} productos / {info['prices']:,} precios en {info['seconds']}s → {info['db_path']}")
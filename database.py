@@ -3,11 +3,53 @@ Módulo de Base de Datos
 Maneja el almacenamiento y recuperación de precios en SQLite
 """
 
+import json
+import re
 import sqlite3
-from typing import List, Dict, Optional
+from typing import Callable, List, Dict, Optional, Iterator, Tuple
 from datetime import datetime
 import os
 
+try:
+    from .logger import get_logger, configure_logging
+    from .metrics import timed
+    from .streaming import RunningStats
+    from .sketches import TDigest
+except ImportError:
+    from logger import get_logger, configure_logging
+    from metrics import timed
+    from streaming import RunningStats
+    from sketches import TDigest
+
+
+logger = get_logger(__name__)
+
+# Ruta de la base compartida por la app y los procesos batch (por defecto config.DATABASE_PATH)
+DB_PATH_ENV = "MLMONITOR_DB_PATH"
+
+# Órdenes válidos para get_tracked_products (cada uno respaldado por un índice)
+TRACKED_SORTS = {
+    'recent': "p.first_seen DESC, p.rowid DESC",
+    'price_desc': "s.last_price DESC",
+    'price_asc': "s.last_price ASC",
+    'name': "p.title COLLATE NOCASE",
+    'relevance': "f.rank",
+}
+
+# Índice de texto completo sobre products.title: "envio" encuentra "Envío"
+FTS_TOKENIZER = "unicode61 remove_diacritics 2"
+
+# Usuario creado con las tablas de watchlists; hereda los productos ya trackeados
+DEFAULT_USER = "default"
+
+# Parámetros del resumen del dashboard (refresh_summary)
+SUMMARY_ALERT_THRESHOLD = 15
+SUMMARY_MAX_ALERTS = 50
+SUMMARY_TOP_MOVERS = 5
+
+# Scopes de los sketches de cuantiles persistidos en price_sketches
+SKETCH_SCOPES = ('product', 'category', 'global')
+
 
 class PriceDatabase:
     """
@@ -23,11 +65,20 @@ class PriceDatabase:
         """
         self.db_path = db_path
         
+        # Se desactiva si el SQLite instalado no trae FTS5 (búsqueda con LIKE)
+        self.fts_enabled = True
+        
+        # Callbacks avisados después de cada ingesta (ver add_listener)
+        self._listeners = []
+        
         # Crear directorio si no existe
         os.makedirs(os.path.dirname(db_path), exist_ok=True)
         
         # Crear tablas si no existen
         self._create_tables()
+        
+        # Completar estadísticas incrementales en bases creadas antes de price_stats
+        self._ensure_price_stats()
     
     def _create_tables(self):
         """
@@ -36,6 +87,9 @@ class PriceDatabase:
         with sqlite3.connect(self.db_path) as conn:
             cursor = conn.cursor()
             
+            # WAL: lecturas concurrentes mientras se escribe
+            cursor.execute("PRAGMA journal_mode=WAL")
+            
             # Tabla de productos
             cursor.execute("""
                 CREATE TABLE IF NOT EXISTS products (
@@ -70,9 +124,399 @@ class PriceDatabase:
                 ON prices(scraped_at)
             """)
             
+            # Índice compuesto: histórico de un producto y recorridos del catálogo
+            # ordenados por producto sin paso de ordenamiento
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_product_scraped_at 
+                ON prices(product_id, scraped_at)
+            """)
+            
+            # Categoría del producto (columna agregada después del esquema original)
+            cursor.execute("PRAGMA table_info(products)")
+            if 'category' not in [column[1] for column in cursor.fetchall()]:
+                cursor.execute("ALTER TABLE products ADD COLUMN category TEXT")
+            
+            # Estadísticas incrementales por producto (una fila por producto)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS price_stats (
+                    product_id TEXT PRIMARY KEY,
+                    count INTEGER NOT NULL,
+                    mean REAL NOT NULL,
+                    m2 REAL NOT NULL,
+                    min_price REAL,
+                    max_price REAL,
+                    first_price REAL,
+                    first_at TIMESTAMP,
+                    last_price REAL,
+                    last_at TIMESTAMP,
+                    prev_price REAL,
+                    median_state TEXT,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (product_id) REFERENCES products (id)
+                )
+            """)
+            
+            # Listado paginado del dashboard: cada orden de TRACKED_SORTS recorre
+            # un índice y corta en LIMIT sin ordenar todo el catálogo
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_products_first_seen 
+                ON products(first_seen)
+            """)
+            
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_products_title 
+                ON products(title COLLATE NOCASE)
+            """)
+            
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_price_stats_last_price 
+                ON price_stats(last_price)
+            """)
+            
+            # Sketches de cuantiles (t-digest) por producto, categoría y global.
+            # last_price_id es la marca de agua de prices ya incorporada.
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS price_sketches (
+                    scope TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    digest TEXT NOT NULL,
+                    count INTEGER NOT NULL,
+                    last_price_id INTEGER NOT NULL,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (scope, key)
+                )
+            """)
+            
+            # Observaciones marcadas por el detector de anomalías (una fila por tipo)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS price_anomalies (
+                    price_id INTEGER NOT NULL,
+                    product_id TEXT NOT NULL,
+                    kind TEXT NOT NULL,
+                    price REAL NOT NULL,
+                    scraped_at TIMESTAMP,
+                    score REAL,
+                    baseline REAL,
+                    detected_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (price_id, kind),
+                    FOREIGN KEY (price_id) REFERENCES prices (id)
+                )
+            """)
+            
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_anomalies_product 
+                ON price_anomalies(product_id, scraped_at)
+            """)
+            
+            # Pronósticos por producto (parámetros del modelo elegido y banda de confianza)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS price_forecasts (
+                    product_id TEXT PRIMARY KEY,
+                    model TEXT NOT NULL,
+                    params TEXT,
+                    last_at TIMESTAMP,
+                    target_at TIMESTAMP,
+                    forecast REAL,
+                    lower REAL,
+                    upper REAL,
+                    mae REAL,
+                    fitted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (product_id) REFERENCES products (id)
+                )
+            """)
+            
+            # Reglas de alerta por producto (product_id NULL = todo el catálogo).
+            # Se consultan por producto para evaluar solo lo tocado en cada ingesta.
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS alert_rules (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    product_id TEXT,
+                    kind TEXT NOT NULL,
+                    threshold REAL,
+                    owner TEXT,
+                    active INTEGER NOT NULL DEFAULT 1,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (product_id) REFERENCES products (id)
+                )
+            """)
+            
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_alert_rules_product 
+                ON alert_rules(product_id, active)
+            """)
+            
+            # Alertas disparadas: una por regla, producto y observación (reingestar
+            # el mismo precio no vuelve a notificar)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS alert_events (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    rule_id INTEGER NOT NULL,
+                    product_id TEXT NOT NULL,
+                    kind TEXT NOT NULL,
+                    price REAL NOT NULL,
+                    previous_price REAL,
+                    threshold REAL,
+                    owner TEXT,
+                    message TEXT,
+                    scraped_at TIMESTAMP NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    UNIQUE (rule_id, product_id, scraped_at),
+                    FOREIGN KEY (rule_id) REFERENCES alert_rules (id)
+                )
+            """)
+            
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_alert_events_product 
+                ON alert_events(product_id, created_at)
+            """)
+            
+            self._create_watchlists(cursor)
+            
+            # Resumen del dashboard de cada usuario (su watchlist), recalculado por
+            # el listener de ingesta; watchlist_version detecta altas y bajas
+            # posteriores al cálculo
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS user_summaries (
+                    user_id INTEGER PRIMARY KEY,
+                    watchlist_version INTEGER NOT NULL,
+                    data_version INTEGER NOT NULL,
+                    total_products INTEGER NOT NULL,
+                    total_prices INTEGER NOT NULL,
+                    avg_price REAL,
+                    alert_threshold REAL NOT NULL,
+                    alert_count INTEGER NOT NULL,
+                    alerts TEXT NOT NULL,
+                    top_movers TEXT NOT NULL,
+                    computed_at TIMESTAMP NOT NULL,
+                    FOREIGN KEY (user_id) REFERENCES users (id)
+                )
+            """)
+            
+            self._create_fts(cursor)
+            
+            # Resumen de todo el catálogo (una sola fila, lo lee /stats) recalculado al
+            # final de cada trabajo. data_version es el último prices.id incluido:
+            # sirve para medir cuán desactualizado está.
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS dashboard_summary (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    data_version INTEGER NOT NULL,
+                    total_products INTEGER NOT NULL,
+                    total_prices INTEGER NOT NULL,
+                    avg_price REAL,
+                    alert_threshold REAL NOT NULL,
+                    alert_count INTEGER NOT NULL,
+                    alerts TEXT NOT NULL,
+                    top_movers TEXT NOT NULL,
+                    computed_at TIMESTAMP NOT NULL
+                )
+            """)
+            
+            # Marcas de agua de los procesos incrementales (último prices.id procesado)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS watermarks (
+                    name TEXT PRIMARY KEY,
+                    value INTEGER NOT NULL,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            
             conn.commit()
-            print("✓ Base de datos inicializada correctamente")
+            logger.debug("Base de datos inicializada", extra={'db_path': self.db_path})
+    
+    def _create_watchlists(self, cursor):
+        """
+        Crea usuarios y watchlists sobre el catálogo compartido
+        
+        Cada producto se guarda y se scrapea una sola vez; watchlist_items solo
+        referencia products con el objetivo y el umbral de cada usuario. Al
+        crearse sobre una base existente, los productos ya trackeados pasan a
+        la watchlist de DEFAULT_USER.
+        """
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'users'")
+        exists = cursor.fetchone() is not None
+        
+        # watchlist_version se incrementa con cada cambio en la watchlist del
+        # usuario (clave de caché de la app, junto con el último prices.id)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS users (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL UNIQUE,
+                watchlist_version INTEGER NOT NULL DEFAULT 0,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS watchlist_items (
+                user_id INTEGER NOT NULL,
+                product_id TEXT NOT NULL,
+                target_price REAL,
+                drop_threshold REAL,
+                added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (user_id, product_id),
+                FOREIGN KEY (user_id) REFERENCES users (id),
+                FOREIGN KEY (product_id) REFERENCES products (id)
+            )
+        """)
+        
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_watchlist_product 
+            ON watchlist_items(product_id)
+        """)
+        
+        if not exists:
+            cursor.execute("INSERT OR IGNORE INTO users (name) VALUES (?)", (DEFAULT_USER,))
+            cursor.execute("""
+                INSERT OR IGNORE INTO watchlist_items (user_id, product_id)
+                SELECT u.id, p.id FROM products p, users u
+                WHERE u.name = ? AND EXISTS (SELECT 1 FROM prices WHERE product_id = p.id)
+            """, (DEFAULT_USER,))
+            if cursor.rowcount:
+                logger.info("Productos trackeados migrados a la watchlist por defecto",
+                            extra={'count': cursor.rowcount})
+    
+    def _create_fts(self, cursor):
+        """
+        Crea el índice FTS5 de títulos y los triggers que lo mantienen
+        
+        Es una tabla de contenido externo (no duplica los títulos) indexada por
+        products.rowid. Si se crea sobre una base con productos, se llena con
+        un rebuild.
+        """
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'products_fts'")
+        exists = cursor.fetchone() is not None
+        
+        try:
+            cursor.execute(f"""
+                CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+                    title,
+                    content='products',
+                    content_rowid='rowid',
+                    tokenize='{FTS_TOKENIZER}'
+                )
+            """)
+        except sqlite3.OperationalError as e:
+            self.fts_enabled = False
+            logger.warning("FTS5 no disponible, la búsqueda por título usa LIKE: %s", e)
+            return
+        
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS products_fts_insert AFTER INSERT ON products BEGIN
+                INSERT INTO products_fts (rowid, title) VALUES (new.rowid, new.title);
+            END
+        """)
+        
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS products_fts_delete AFTER DELETE ON products BEGIN
+                INSERT INTO products_fts (products_fts, rowid, title) VALUES ('delete', old.rowid, old.title);
+            END
+        """)
+        
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS products_fts_update AFTER UPDATE OF title ON products BEGIN
+                INSERT INTO products_fts (products_fts, rowid, title) VALUES ('delete', old.rowid, old.title);
+                INSERT INTO products_fts (rowid, title) VALUES (new.rowid, new.title);
+            END
+        """)
+        
+        if not exists:
+            cursor.execute("SELECT EXISTS(SELECT 1 FROM products)")
+            if cursor.fetchone()[0]:
+                logger.info("Indexando títulos de productos", extra={'db_path': self.db_path})
+                cursor.execute("INSERT INTO products_fts (products_fts) VALUES ('rebuild')")
+    
+    def _ensure_price_stats(self):
+        """
+        Reconstruye price_stats si hay precios sin estadísticas (migración)
+        """
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT EXISTS(SELECT 1 FROM prices), EXISTS(SELECT 1 FROM price_stats)")
+            has_prices, has_stats = cursor.fetchone()
+        
+        if has_prices and not has_stats:
+            logger.info("Construyendo estadísticas incrementales", extra={'db_path': self.db_path})
+            self.rebuild_price_stats()
+    
+    def _apply_price_stats(self, cursor, rows: List[Tuple]):
+        """
+        Actualiza price_stats con nuevas observaciones en la transacción actual
+        
+        Args:
+            cursor: Cursor de la conexión que insertó los precios
+            rows: Tuplas (product_id, price, scraped_at)
+        
+        Returns:
+            Un cambio por producto tocado: último y anterior precio, mínimo
+            histórico antes y después del lote (lo que reciben los listeners)
+        """
+        product_ids = sorted({row[0] for row in rows})
+        stats: Dict[str, RunningStats] = {}
+        
+        for i in range(0, len(product_ids), 900):
+            chunk = product_ids[i:i + 900]
+            cursor.execute(f"""
+                SELECT {', '.join(RunningStats.COLUMNS)}
+                FROM price_stats
+                WHERE product_id IN ({','.join('?' * len(chunk))})
+            """, chunk)
+            for row in cursor.fetchall():
+                stats[row[0]] = RunningStats.from_row(row)
+        
+        previous_min = {product_id: item.min_price for product_id, item in stats.items()}
+        
+        for product_id, price, scraped_at in sorted(rows, key=lambda row: (row[0], row[2])):
+            if product_id not in stats:
+                stats[product_id] = RunningStats(product_id)
+            stats[product_id].update(price, scraped_at)
+        
+        self._write_price_stats(cursor, stats.values())
+        
+        return [
+            {
+                'product_id': item.product_id,
+                'price': item.last_price,
+                'previous_price': item.prev_price,
+                'previous_min': previous_min.get(item.product_id),
+                'min_price': item.min_price,
+                'count': item.count,
+                'scraped_at': item.last_at,
+            }
+            for item in stats.values()
+        ]
+    
+    def add_listener(self, callback: Callable[[List[Dict]], None]):
+        """
+        Registra un callback que se llama después de cada ingesta confirmada
+        
+        Recibe la lista de cambios de _apply_price_stats (solo los productos
+        tocados). Corre en el thread que guardó los precios; sus errores se
+        registran y no afectan la escritura.
+        
+        Args:
+            callback: Función que recibe la lista de cambios
+        """
+        self._listeners.append(callback)
+    
+    def remove_listener(self, callback: Callable[[List[Dict]], None]):
+        if callback in self._listeners:
+            self._listeners.remove(callback)
     
+    def _notify(self, changes: List[Dict]):
+        for callback in list(self._listeners):
+            try:
+                callback(changes)
+            except Exception as e:
+                logger.error("Error en listener de ingesta: %s", e, extra={'count': len(changes)})
+    
+    def _write_price_stats(self, cursor, stats):
+        cursor.executemany(f"""
+            INSERT OR REPLACE INTO price_stats ({', '.join(RunningStats.COLUMNS)})
+            VALUES ({', '.join('?' * len(RunningStats.COLUMNS))})
+        """, [item.to_row() for item in stats])
+    
+    @timed("db_query", op="save_product")
     def save_product(self, product: Dict) -> bool:
         """
         Guarda o actualiza un producto en la base de datos
@@ -88,21 +532,23 @@ class PriceDatabase:
                 cursor = conn.cursor()
                 
                 cursor.execute("""
-                    INSERT OR IGNORE INTO products (id, title, link)
-                    VALUES (?, ?, ?)
+                    INSERT OR IGNORE INTO products (id, title, link, category)
+                    VALUES (?, ?, ?, ?)
                 """, (
                     product['id'],
                     product['title'],
-                    product.get('link', product.get('url', ''))
+                    product.get('link', product.get('url', '')),
+                    product.get('category')
                 ))
                 
                 conn.commit()
                 return True
                 
         except Exception as e:
-            print(f"Error guardando producto: {e}")
+            logger.error("Error guardando producto: %s", e, extra={'product_id': product.get('id')})
             return False
     
+    @timed("db_query", op="save_price")
     def save_price(self, product: Dict) -> bool:
         """
         Guarda un precio en el histórico
@@ -120,6 +566,8 @@ class PriceDatabase:
             with sqlite3.connect(self.db_path) as conn:
                 cursor = conn.cursor()
                 
+                scraped_at = product.get('scraped_at', datetime.now().isoformat())
+                
                 cursor.execute("""
                     INSERT INTO prices (product_id, price, seller, free_shipping, scraped_at)
                     VALUES (?, ?, ?, ?, ?)
@@ -128,16 +576,76 @@ class PriceDatabase:
                     product['price'],
                     product.get('seller', 'Desconocido'),
                     product.get('free_shipping', False),
-                    product.get('scraped_at', datetime.now().isoformat())
+                    scraped_at
                 ))
                 
+                changes = self._apply_price_stats(cursor, [(product['id'], float(product['price']), scraped_at)])
+                
                 conn.commit()
-                return True
+            
+            self._notify(changes)
+            return True
                 
         except Exception as e:
-            print(f"Error guardando precio: {e}")
+            logger.error("Error guardando precio: %s", e, extra={'product_id': product.get('id')})
             return False
     
+    @timed("db_query", op="save_prices")
+    def save_prices(self, products: List[Dict]) -> int:
+        """
+        Guarda un lote de precios en una sola transacción
+        
+        Args:
+            products: Lista de diccionarios con información de producto y precio
+        
+        Returns:
+            Cantidad de precios insertados (0 si falló el lote)
+        """
+        if not products:
+            return 0
+        
+        now = datetime.now().isoformat()
+        
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                
+                cursor.executemany("""
+                    INSERT OR IGNORE INTO products (id, title, link, category)
+                    VALUES (?, ?, ?, ?)
+                """, [
+                    (p['id'], p['title'], p.get('link', p.get('url', '')), p.get('category'))
+                    for p in products
+                ])
+                
+                cursor.executemany("""
+                    INSERT INTO prices (product_id, price, seller, free_shipping, scraped_at)
+                    VALUES (?, ?, ?, ?, ?)
+                """, [
+                    (
+                        p['id'],
+                        p['price'],
+                        p.get('seller', 'Desconocido'),
+                        p.get('free_shipping', False),
+                        p.get('scraped_at', now)
+                    )
+                    for p in products
+                ])
+                
+                changes = self._apply_price_stats(cursor, [
+                    (p['id'], float(p['price']), p.get('scraped_at', now)) for p in products
+                ])
+                
+                conn.commit()
+            
+            self._notify(changes)
+            return len(products)
+        
+        except Exception as e:
+            logger.error("Error guardando lote de precios: %s", e, extra={'count': len(products)})
+            return 0
+    
+    @timed("db_query", op="get_price_history")
     def get_price_history(self, product_id: str) -> List[Dict]:
         """
         Obtiene el histórico de precios de un producto
@@ -170,129 +678,1338 @@ class PriceDatabase:
                 return [dict(row) for row in rows]
                 
         except Exception as e:
-            print(f"Error obteniendo histórico: {e}")
+            logger.error("Error obteniendo histórico: %s", e, extra={'product_id': product_id})
             return []
     
-    def get_all_products(self) -> List[Dict]:
+    def iter_price_rows(self, batch_size: int = 100_000,
+                        product_ids: Optional[List[str]] = None,
+                        since: Optional[str] = None,
+                        with_ids: bool = False) -> Iterator[List[Tuple]]:
         """
-        Obtiene todos los productos monitoreados
+        Recorre la tabla de precios en lotes, ordenada por producto y fecha
         
-        Returns:
-            Lista de productos
+        Pensado para análisis sobre todo el catálogo sin materializar una
+        lista de diccionarios por fila.
+        
+        Args:
+            batch_size: Filas por lote
+            product_ids: Restringe el recorrido a estos productos (opcional)
+            since: Solo precios con scraped_at >= since (ISO 8601, opcional)
+            with_ids: Agrega prices.id como cuarta columna
+        
+        Yields:
+            Listas de tuplas (product_id, price, scraped_at[, id])
         """
-        try:
+        base_query = "SELECT product_id, price, scraped_at" + (", id" if with_ids else "") + " FROM prices"
+        order = " ORDER BY product_id, scraped_at"
+        since_filter = ("scraped_at >= ?", (since,)) if since else None
+        
+        if product_ids is None:
+            where, params = since_filter or ("", ())
+            queries = [(base_query + (f" WHERE {where}" if where else "") + order, params)]
+        else:
+            # Lotes de IDs por debajo del límite de parámetros de SQLite
+            ids = sorted(set(product_ids))
+            extra, extra_params = (f" AND {since_filter[0]}", since_filter[1]) if since_filter else ("", ())
+            queries = [
+                (base_query + f" WHERE product_id IN ({','.join('?' * len(chunk))})" + extra + order,
+                 tuple(chunk) + extra_params)
+                for chunk in (ids[i:i + 900] for i in range(0, len(ids), 900))
+            ]
+        
+        with timed("db_query", op="iter_price_rows"):
             with sqlite3.connect(self.db_path) as conn:
-                conn.row_factory = sqlite3.Row
                 cursor = conn.cursor()
                 
-                cursor.execute("""
-                    SELECT 
-                        p.id,
-                        p.title,
-                        p.link as url,
-                        p.first_seen,
-                        COUNT(pr.id) as price_count,
-                        MIN(pr.price) as min_price,
-                        MAX(pr.price) as max_price,
-                        AVG(pr.price) as avg_price
-                    FROM products p
-                    LEFT JOIN prices pr ON p.id = pr.product_id
-                    GROUP BY p.id
-                    ORDER BY p.first_seen DESC
-                """)
-                
-                rows = cursor.fetchall()
-                return [dict(row) for row in rows]
-                
-        except Exception as e:
-            print(f"Error obteniendo productos: {e}")
-            return []
+                for query, params in queries:
+                    cursor.execute(query, params)
+                    
+                    while True:
+                        rows = cursor.fetchmany(batch_size)
+                        if not rows:
+                            break
+                        yield rows
     
-    def get_latest_prices(self, limit: int = 10) -> List[Dict]:
+    @timed("db_query", op="get_price_stats")
+    def get_price_stats(self, product_id: str) -> Dict:
         """
-        Obtiene los últimos precios registrados
+        Estadísticas actuales de un producto en O(1)
+        
+        Se leen de price_stats (mantenida en cada save_price/save_prices), por
+        lo que el costo no depende del largo del histórico. La mediana es una
+        aproximación streaming (P²), exacta hasta 5 registros.
         
         Args:
-            limit: Número máximo de resultados
-            
+            product_id: ID del producto
+        
         Returns:
-            Lista de precios recientes
+            Diccionario con las mismas claves que PriceAnalyzer.get_statistics
+            (vacío si el producto no tiene precios)
         """
         try:
             with sqlite3.connect(self.db_path) as conn:
-                conn.row_factory = sqlite3.Row
                 cursor = conn.cursor()
                 
-                cursor.execute("""
-                    SELECT 
-                        p.id,
-                        prod.title,
-                        p.price,
-                        p.seller,
-                        p.scraped_at
-                    FROM prices p
-                    JOIN products prod ON p.product_id = prod.id
-                    ORDER BY p.scraped_at DESC
-                    LIMIT ?
-                """, (limit,))
-                
-                rows = cursor.fetchall()
-                return [dict(row) for row in rows]
+                cursor.execute(f"""
+                    SELECT {', '.join(RunningStats.COLUMNS)}
+                    FROM price_stats
+                    WHERE product_id = ?
+                """, (product_id,))
                 
+                row = cursor.fetchone()
+                return RunningStats.from_row(row).as_statistics() if row else {}
+        
         except Exception as e:
-            print(f"Error obteniendo precios recientes: {e}")
-            return []
+            logger.error("Error obteniendo estadísticas del producto: %s", e, extra={'product_id': product_id})
+            return {}
     
-    def get_price_changes(self, threshold: float = 10.0) -> List[Dict]:
+    @timed("db_query", op="get_product_summaries")
+    def get_product_summaries(self, product_ids: Optional[List[str]] = None) -> Dict[str, Dict]:
         """
-        Detecta productos con cambios significativos de precio
+        Título, categoría y último precio de varios productos sin leer el histórico
         
         Args:
-            threshold: Porcentaje de cambio para considerar significativo
-            
+            product_ids: Productos a consultar (por defecto todos los que tienen precios)
+        
         Returns:
-            Lista de productos con cambios de precio
+            Diccionario {product_id: {title, category, count, last_price, last_at}}
         """
+        base_query = """
+            SELECT p.id, p.title, p.category, s.count, s.last_price, s.last_at
+            FROM products p
+            JOIN price_stats s ON s.product_id = p.id
+        """
+        if product_ids is None:
+            queries = [(base_query, ())]
+        else:
+            ids = sorted(set(product_ids))
+            queries = [
+                (base_query + f" WHERE p.id IN ({','.join('?' * len(chunk))})", tuple(chunk))
+                for chunk in (ids[i:i + 900] for i in range(0, len(ids), 900))
+            ]
+        
         try:
             with sqlite3.connect(self.db_path) as conn:
                 conn.row_factory = sqlite3.Row
                 cursor = conn.cursor()
                 
-                cursor.execute("""
-                    WITH latest_prices AS (
-                        SELECT 
-                            product_id,
-                            price as current_price,
-                            ROW_NUMBER() OVER (PARTITION BY product_id ORDER BY scraped_at DESC) as rn
-                        FROM prices
-                    ),
-                    previous_prices AS (
-                        SELECT 
-                            product_id,
-                            price as previous_price,
-                            ROW_NUMBER() OVER (PARTITION BY product_id ORDER BY scraped_at DESC) as rn
-                        FROM prices
-                    )
-                    SELECT 
-                        p.id,
-                        p.title,
-                        lp.current_price,
-                        pp.previous_price,
-                        ((lp.current_price - pp.previous_price) / pp.previous_price * 100) as change_percent
-                    FROM products p
-                    JOIN latest_prices lp ON p.id = lp.product_id AND lp.rn = 1
-                    JOIN previous_prices pp ON p.id = pp.product_id AND pp.rn = 2
-                    WHERE ABS((lp.current_price - pp.previous_price) / pp.previous_price * 100) >= ?
-                    ORDER BY ABS(change_percent) DESC
-                """, (threshold,))
-                
-                rows = cursor.fetchall()
-                return [dict(row) for row in rows]
+                summaries = {}
+                for query, params in queries:
+                    cursor.execute(query, params)
+                    for row in cursor.fetchall():
+                        summaries[row['id']] = dict(row)
+                return summaries
+        
+        except Exception as e:
+            logger.error("Error obteniendo resúmenes de productos: %s", e)
+            return {}
+    
+    @timed("db_query", op="rebuild_price_stats")
+    def rebuild_price_stats(self, batch_size: int = 100_000, flush_every: int = 10_000) -> int:
+        """
+        Recalcula price_stats desde la tabla de precios
+        
+        Recorre los precios en lotes ordenados por producto y escribe las
+        estadísticas cada `flush_every` productos, con memoria acotada.
+        
+        Args:
+            batch_size: Filas leídas por lote
+            flush_every: Productos acumulados antes de escribir
+        
+        Returns:
+            Cantidad de productos procesados
+        """
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("DELETE FROM price_stats")
+            conn.commit()
+        
+        pending: List[RunningStats] = []
+        current: Optional[RunningStats] = None
+        total = 0
+        
+        def flush(items):
+            with sqlite3.connect(self.db_path) as conn:
+                self._write_price_stats(conn.cursor(), items)
+                conn.commit()
+        
+        for rows in self.iter_price_rows(batch_size):
+            for product_id, price, scraped_at in rows:
+                if current is None or current.product_id != product_id:
+                    if current is not None:
+                        pending.append(current)
+                        total += 1
+                    current = RunningStats(product_id)
+                current.update(price, scraped_at)
+            
+            if len(pending) >= flush_every:
+                flush(pending)
+                pending = []
+        
+        if current is not None:
+            pending.append(current)
+            total += 1
+        if pending:
+            flush(pending)
+        
+        return total
+    
+    @timed("db_query", op="update_sketches")
+    def update_sketches(self, batch_size: int = 200_000) -> int:
+        """
+        Incorpora a price_sketches los precios nuevos desde la última marca de agua
+        
+        Procesa la tabla de precios por lotes de `batch_size` filas: cada lote
+        se resume en un t-digest por producto, categoría y global, que se
+        combina con el digest persistido. La memoria queda acotada por el lote.
+        
+        Se llama desde el camino de ingesta (app, API, JobManager). Cada lote
+        toma el lock de escritura antes de leer la marca de agua, así dos
+        llamadas concurrentes no incorporan las mismas filas dos veces.
+        
+        Args:
+            batch_size: Filas de precios por lote
+        
+        Returns:
+            Cantidad de precios incorporados
+        """
+        processed = 0
+        
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            
+            while True:
+                cursor.execute("BEGIN IMMEDIATE")
+                cursor.execute("SELECT COALESCE(MAX(last_price_id), 0) FROM price_sketches WHERE scope = 'global'")
+                watermark = cursor.fetchone()[0]
+                
+                cursor.execute("""
+                    SELECT p.id, p.product_id, p.price, prod.category
+                    FROM prices p
+                    JOIN products prod ON p.product_id = prod.id
+                    WHERE p.id > ?
+                    ORDER BY p.id
+                    LIMIT ?
+                """, (watermark, batch_size))
+                rows = cursor.fetchall()
+                
+                if not rows:
+                    conn.rollback()
+                    break
+                
+                # Valores del lote agrupados por (scope, key)
+                groups: Dict[Tuple[str, str], List[float]] = {('global', ''): []}
+                for _, product_id, price, category in rows:
+                    groups.setdefault(('product', product_id), []).append(price)
+                    if category:
+                        groups.setdefault(('category', category), []).append(price)
+                    groups[('global', '')].append(price)
+                
+                digests = self._load_sketches(cursor, list(groups))
+                watermark = rows[-1][0]
+                
+                cursor.executemany("""
+                    INSERT OR REPLACE INTO price_sketches (scope, key, digest, count, last_price_id, updated_at)
+                    VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+                """, [
+                    (scope, key, digest.to_json(), int(digest.count), watermark)
+                    for (scope, key), digest in (
+                        (group, digests.get(group, TDigest()).merge(TDigest.from_values(values)))
+                        for group, values in groups.items()
+                    )
+                ])
+                
+                conn.commit()
+                processed += len(rows)
+        
+        return processed
+    
+    def _load_sketches(self, cursor, keys: List[Tuple[str, str]]) -> Dict[Tuple[str, str], TDigest]:
+        """
+        Lee los digests persistidos para una lista de (scope, key)
+        """
+        digests = {}
+        by_scope: Dict[str, List[str]] = {}
+        for scope, key in keys:
+            by_scope.setdefault(scope, []).append(key)
+        
+        for scope, scope_keys in by_scope.items():
+            for i in range(0, len(scope_keys), 900):
+                chunk = scope_keys[i:i + 900]
+                cursor.execute(f"""
+                    SELECT key, digest FROM price_sketches
+                    WHERE scope = ? AND key IN ({','.join('?' * len(chunk))})
+                """, [scope] + chunk)
+                for key, payload in cursor.fetchall():
+                    digests[(scope, key)] = TDigest.from_json(payload)
+        
+        return digests
+    
+    def get_sketch(self, scope: str = 'global', key: str = '') -> Optional[TDigest]:
+        """
+        Obtiene el t-digest persistido de un scope (al día con la última update_sketches)
+        
+        Args:
+            scope: 'product', 'category' o 'global'
+            key: ID de producto o nombre de categoría ('' para global)
+        
+        Returns:
+            TDigest (mergeable con los de otros shards) o None si no hay datos
+        """
+        if scope not in SKETCH_SCOPES:
+            raise ValueError(f"Scope inválido: {scope}")
+        
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT digest FROM price_sketches WHERE scope = ? AND key = ?", (scope, key))
+                row = cursor.fetchone()
+                return TDigest.from_json(row[0]) if row else None
+        
+        except Exception as e:
+            logger.error("Error obteniendo sketch: %s", e, extra={'scope': scope, 'key': key})
+            return None
+    
+    @timed("db_query", op="get_price_quantiles")
+    def get_price_quantiles(self, scope: str = 'global', key: str = '',
+                            quantiles: Tuple[float, ...] = (0.05, 0.25, 0.5, 0.75, 0.95)) -> Dict[float, float]:
+        """
+        Percentiles aproximados de precio con memoria acotada
+        
+        Args:
+            scope: 'product', 'category' o 'global'
+            key: ID de producto o categoría
+            quantiles: Cuantiles a estimar (0 a 1)
+        
+        Returns:
+            Diccionario {cuantil: precio}
+        """
+        digest = self.get_sketch(scope, key)
+        return digest.quantiles(quantiles) if digest else {}
+    
+    @timed("db_query", op="get_category_medians")
+    def get_category_medians(self) -> Dict[str, float]:
+        """
+        Mediana aproximada de precio por categoría (sin ordenar los precios)
+        
+        Returns:
+            Diccionario {categoría: mediana}
+        """
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT key, digest FROM price_sketches WHERE scope = 'category' ORDER BY key")
+                return {key: TDigest.from_json(payload).quantile(0.5) for key, payload in cursor.fetchall()}
+        
+        except Exception as e:
+            logger.error("Error obteniendo medianas por categoría: %s", e)
+            return {}
+    
+    def get_watermark(self, name: str) -> int:
+        """
+        Último prices.id procesado por un proceso incremental (0 si nunca corrió)
+        """
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT value FROM watermarks WHERE name = ?", (name,))
+            row = cursor.fetchone()
+            return row[0] if row else 0
+    
+    def set_watermark(self, name: str, value: int):
+        """
+        Registra hasta qué prices.id llegó un proceso incremental
+        """
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("""
+                INSERT OR REPLACE INTO watermarks (name, value, updated_at)
+                VALUES (?, ?, CURRENT_TIMESTAMP)
+            """, (name, value))
+            conn.commit()
+    
+    @timed("db_query", op="get_products_updated_since")
+    def get_products_updated_since(self, price_id: int) -> Tuple[Dict[str, str], int]:
+        """
+        Productos con precios nuevos desde una marca de agua
+        
+        Args:
+            price_id: Último prices.id ya procesado
+        
+        Returns:
+            Tupla ({product_id: primer scraped_at nuevo}, último prices.id)
+        """
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT product_id, MIN(scraped_at), MAX(id)
+                FROM prices
+                WHERE id > ?
+                GROUP BY product_id
+            """, (price_id,))
+            rows = cursor.fetchall()
+        
+        return {row[0]: row[1] for row in rows}, max((row[2] for row in rows), default=price_id)
+    
+    @timed("db_query", op="save_anomalies")
+    def save_anomalies(self, anomalies: List[Tuple]) -> int:
+        """
+        Guarda observaciones marcadas por el detector de anomalías
+        
+        Args:
+            anomalies: Tuplas (price_id, product_id, kind, price, scraped_at, score, baseline)
+        
+        Returns:
+            Cantidad de filas escritas
+        """
+        if not anomalies:
+            return 0
+        
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.executemany("""
+                    INSERT OR REPLACE INTO price_anomalies
+                        (price_id, product_id, kind, price, scraped_at, score, baseline)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                """, anomalies)
+                conn.commit()
+                return len(anomalies)
+        
+        except Exception as e:
+            logger.error("Error guardando anomalías: %s", e, extra={'count': len(anomalies)})
+            return 0
+    
+    def clear_anomalies(self):
+        """
+        Borra las anomalías detectadas (para recalcular todo el histórico)
+        """
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("DELETE FROM price_anomalies")
+            conn.commit()
+    
+    @timed("db_query", op="get_anomalies")
+    def get_anomalies(self, product_id: Optional[str] = None, kind: Optional[str] = None,
+                      limit: int = 100) -> List[Dict]:
+        """
+        Obtiene las anomalías detectadas, de la más reciente a la más antigua
+        
+        Args:
+            product_id: Filtra por producto (opcional)
+            kind: Filtra por tipo: 'outlier', 'spike' o 'fake_discount' (opcional)
+            limit: Número máximo de resultados
+        
+        Returns:
+            Lista de anomalías con el título del producto
+        """
+        conditions, params = [], []
+        if product_id:
+            conditions.append("a.product_id = ?")
+            params.append(product_id)
+        if kind:
+            conditions.append("a.kind = ?")
+            params.append(kind)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.row_factory = sqlite3.Row
+                cursor = conn.cursor()
+                
+                cursor.execute(f"""
+                    SELECT a.*, p.title
+                    FROM price_anomalies a
+                    JOIN products p ON a.product_id = p.id
+                    {where}
+                    ORDER BY a.scraped_at DESC
+                    LIMIT ?
+                """, params + [limit])
+                
+                return [dict(row) for row in cursor.fetchall()]
+        
+        except Exception as e:
+            logger.error("Error obteniendo anomalías: %s", e, extra={'product_id': product_id})
+            return []
+    
+    @timed("db_query", op="add_alert_rule")
+    def add_alert_rule(self, kind: str, product_id: Optional[str] = None,
+                       threshold: Optional[float] = None, owner: Optional[str] = None) -> Optional[int]:
+        """
+        Crea una regla de alerta
+        
+        Args:
+            kind: Tipo de regla (ver alerts.RULE_KINDS)
+            product_id: Producto vigilado (None = todo el catálogo)
+            threshold: Precio objetivo o porcentaje de caída según el tipo
+            owner: Dueño de la regla (opcional)
+        
+        Returns:
+            ID de la regla, o None si no se pudo guardar
+        """
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    INSERT INTO alert_rules (product_id, kind, threshold, owner)
+                    VALUES (?, ?, ?, ?)
+                """, (product_id, kind, threshold, owner))
+                conn.commit()
+                return cursor.lastrowid
+        
+        except Exception as e:
+            logger.error("Error guardando regla de alerta: %s", e, extra={'product_id': product_id})
+            return None
+    
+    def delete_alert_rule(self, rule_id: int) -> bool:
+        """
+        Desactiva una regla (sus alertas ya disparadas se conservan)
+        """
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.execute("UPDATE alert_rules SET active = 0 WHERE id = ?", (rule_id,))
+                conn.commit()
+                return cursor.rowcount > 0
+        
+        except Exception as e:
+            logger.error("Error borrando regla de alerta: %s", e, extra={'rule_id': rule_id})
+            return False
+    
+    @timed("db_query", op="get_alert_rules")
+    def get_alert_rules(self, product_ids: Optional[List[str]] = None,
+                        owner: Optional[str] = None, include_global: bool = True) -> List[Dict]:
+        """
+        Obtiene las reglas activas
+        
+        Args:
+            product_ids: Solo reglas de estos productos (usa el índice por producto)
+            owner: Filtra por dueño (opcional)
+            include_global: Incluir las reglas de todo el catálogo (product_id NULL)
+        
+        Returns:
+            Lista de reglas con el título del producto
+        """
+        conditions, params = ["r.active = 1"], []
+        if owner is not None:
+            conditions.append("r.owner = ?")
+            params.append(owner)
+        
+        queries = []
+        if product_ids is None:
+            if not include_global:
+                conditions.append("r.product_id IS NOT NULL")
+            queries.append((conditions, params))
+        else:
+            ids = sorted(set(product_ids))
+            for i in range(0, len(ids), 900):
+                chunk = ids[i:i + 900]
+                queries.append((conditions + [f"r.product_id IN ({','.join('?' * len(chunk))})"], params + chunk))
+            if include_global:
+                queries.append((conditions + ["r.product_id IS NULL"], params))
+        
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.row_factory = sqlite3.Row
+                cursor = conn.cursor()
+                
+                rules = []
+                for where, query_params in queries:
+                    cursor.execute(f"""
+                        SELECT r.*, p.title
+                        FROM alert_rules r
+                        LEFT JOIN products p ON p.id = r.product_id
+                        WHERE {' AND '.join(where)}
+                        ORDER BY r.id
+                    """, query_params)
+                    rules.extend(dict(row) for row in cursor.fetchall())
+                return rules
+        
+        except Exception as e:
+            logger.error("Error obteniendo reglas de alerta: %s", e)
+            return []
+    
+    def get_drop_threshold(self) -> float:
+        """
+        Umbral de caída (%) de los resúmenes del dashboard
+        
+        Returns:
+            El de la regla drop_percent global activa (la que guarda Settings)
+            o SUMMARY_ALERT_THRESHOLD si no hay
+        """
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    SELECT threshold FROM alert_rules
+                    WHERE product_id IS NULL AND owner IS NULL AND kind = 'drop_percent'
+                        AND active = 1 AND threshold IS NOT NULL
+                    ORDER BY id DESC
+                    LIMIT 1
+                """)
+                row = cursor.fetchone()
+                return row[0] if row else SUMMARY_ALERT_THRESHOLD
+        
+        except Exception as e:
+            logger.error("Error leyendo umbral de alertas: %s", e)
+            return SUMMARY_ALERT_THRESHOLD
+    
+    @timed("db_query", op="save_alert_events")
+    def save_alert_events(self, events: List[Dict]) -> List[Dict]:
+        """
+        Guarda alertas disparadas descartando las repetidas
+        
+        Args:
+            events: Diccionarios con rule_id, product_id, kind, price, previous_price,
+                threshold, owner, message y scraped_at
+        
+        Returns:
+            Solo las alertas nuevas (las que hay que entregar), con su id
+        """
+        if not events:
+            return []
+        
+        created_at = datetime.now().isoformat()
+        
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                
+                saved = []
+                for event in events:
+                    cursor.execute("""
+                        INSERT OR IGNORE INTO alert_events (
+                            rule_id, product_id, kind, price, previous_price,
+                            threshold, owner, message, scraped_at, created_at
+                        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    """, (
+                        event['rule_id'], event['product_id'], event['kind'], event['price'],
+                        event.get('previous_price'), event.get('threshold'), event.get('owner'),
+                        event.get('message'), event['scraped_at'], created_at
+                    ))
+                    if cursor.rowcount:
+                        saved.append({**event, 'id': cursor.lastrowid, 'created_at': created_at})
+                
+                conn.commit()
+                return saved
+        
+        except Exception as e:
+            logger.error("Error guardando alertas: %s", e, extra={'count': len(events)})
+            return []
+    
+    @timed("db_query", op="get_alert_events")
+    def get_alert_events(self, product_id: Optional[str] = None, owner: Optional[str] = None,
+                         limit: int = 100) -> List[Dict]:
+        """
+        Obtiene las alertas disparadas, de la más reciente a la más antigua
+        
+        Args:
+            product_id: Filtra por producto (opcional)
+            owner: Filtra por dueño de la regla (opcional)
+            limit: Número máximo de resultados
+        
+        Returns:
+            Lista de alertas con el título y link del producto
+        """
+        conditions, params = [], []
+        if product_id:
+            conditions.append("e.product_id = ?")
+            params.append(product_id)
+        if owner is not None:
+            conditions.append("e.owner = ?")
+            params.append(owner)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.row_factory = sqlite3.Row
+                cursor = conn.cursor()
+                
+                cursor.execute(f"""
+                    SELECT e.*, p.title, p.link as url
+                    FROM alert_events e
+                    JOIN products p ON e.product_id = p.id
+                    {where}
+                    ORDER BY e.id DESC
+                    LIMIT ?
+                """, params + [limit])
+                
+                return [dict(row) for row in cursor.fetchall()]
+        
+        except Exception as e:
+            logger.error("Error obteniendo alertas: %s", e, extra={'product_id': product_id})
+            return []
+    
+    @timed("db_query", op="get_or_create_user")
+    def get_or_create_user(self, name: str) -> Optional[int]:
+        """
+        ID del usuario con ese nombre (lo crea si no existe)
+        
+        Args:
+            name: Nombre del usuario
+        
+        Returns:
+            ID del usuario, o None si no se pudo guardar
+        """
+        name = name.strip()
+        if not name:
+            return None
+        
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.execute("INSERT OR IGNORE INTO users (name) VALUES (?)", (name,))
+                cursor.execute("SELECT id FROM users WHERE name = ?", (name,))
+                conn.commit()
+                return cursor.fetchone()[0]
+        
+        except Exception as e:
+            logger.error("Error guardando usuario: %s", e, extra={'user': name})
+            return None
+    
+    @timed("db_query", op="get_users")
+    def get_users(self) -> List[Dict]:
+        """
+        Usuarios con la cantidad de productos de su watchlist
+        """
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.row_factory = sqlite3.Row
+                cursor = conn.cursor()
+                cursor.execute("""
+                    SELECT 
+                        u.id,
+                        u.name,
+                        u.watchlist_version,
+                        (SELECT COUNT(*) FROM watchlist_items w WHERE w.user_id = u.id) as items
+                    FROM users u
+                    ORDER BY u.id
+                """)
+                return [dict(row) for row in cursor.fetchall()]
+        
+        except Exception as e:
+            logger.error("Error obteniendo usuarios: %s", e)
+            return []
+    
+    def get_watchlist_version(self, user_id: int) -> int:
+        """
+        Contador de cambios de la watchlist (0 si el usuario no existe)
+        """
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                row = conn.execute("SELECT watchlist_version FROM users WHERE id = ?", (user_id,)).fetchone()
+                return row[0] if row else 0
+        
+        except Exception as e:
+            logger.error("Error leyendo versión de watchlist: %s", e, extra={'user_id': user_id})
+            return 0
+    
+    def _sync_watch_rules(self, cursor, user_id: int, product_id: str,
+                          target_price: Optional[float], drop_threshold: Optional[float]):
+        """
+        Refleja objetivo y umbral del usuario en sus reglas de alerta del producto
+        
+        Las reglas (alerts.RULE_BELOW_TARGET / RULE_DROP_PERCENT) quedan con el
+        nombre del usuario como owner; AlertEngine las evalúa en cada ingesta.
+        """
+        cursor.execute("SELECT name FROM users WHERE id = ?", (user_id,))
+        owner = cursor.fetchone()[0]
+        
+        cursor.execute("""
+            UPDATE alert_rules SET active = 0
+            WHERE product_id = ? AND owner = ? AND kind IN ('below_target', 'drop_percent')
+        """, (product_id, owner))
+        
+        rules = [(kind, value) for kind, value in (('below_target', target_price), ('drop_percent', drop_threshold))
+                 if value is not None]
+        cursor.executemany("""
+            INSERT INTO alert_rules (product_id, kind, threshold, owner)
+            VALUES (?, ?, ?, ?)
+        """, [(product_id, kind, value, owner) for kind, value in rules])
+    
+    @timed("db_query", op="add_to_watchlist")
+    def add_to_watchlist(self, user_id: int, product_id: str, target_price: Optional[float] = None,
+                         drop_threshold: Optional[float] = None) -> bool:
+        """
+        Agrega un producto a la watchlist de un usuario
+        
+        El producto y sus precios son compartidos: si otro usuario ya lo
+        sigue no se duplica nada. Si ya estaba en la watchlist se conservan
+        el objetivo y el umbral existentes salvo que se pasen nuevos.
+        
+        Args:
+            user_id: ID del usuario
+            product_id: Producto ya guardado en products
+            target_price: Precio objetivo para alertar (opcional)
+            drop_threshold: Caída mínima (%) para alertar (opcional)
+        
+        Returns:
+            True si se guardó correctamente
+        """
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                
+                cursor.execute("""
+                    INSERT OR IGNORE INTO watchlist_items (user_id, product_id)
+                    VALUES (?, ?)
+                """, (user_id, product_id))
+                
+                if cursor.rowcount:
+                    cursor.execute("UPDATE users SET watchlist_version = watchlist_version + 1 WHERE id = ?",
+                                   (user_id,))
+                
+                conn.commit()
+            
+            if target_price is not None or drop_threshold is not None:
+                return self.set_watch_targets(user_id, product_id, target_price, drop_threshold)
+            return True
+        
+        except Exception as e:
+            logger.error("Error agregando a la watchlist: %s", e,
+                         extra={'user_id': user_id, 'product_id': product_id})
+            return False
+    
+    @timed("db_query", op="set_watch_targets")
+    def set_watch_targets(self, user_id: int, product_id: str, target_price: Optional[float],
+                          drop_threshold: Optional[float]) -> bool:
+        """
+        Cambia el precio objetivo y el umbral de caída de un producto seguido
+        
+        Args:
+            user_id: ID del usuario
+            product_id: Producto de su watchlist
+            target_price: Precio objetivo (None = sin alerta por objetivo)
+            drop_threshold: Caída mínima en % (None = sin alerta por caída)
+        
+        Returns:
+            True si el producto estaba en la watchlist
+        """
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                
+                cursor.execute("""
+                    UPDATE watchlist_items SET target_price = ?, drop_threshold = ?
+                    WHERE user_id = ? AND product_id = ?
+                """, (target_price, drop_threshold, user_id, product_id))
+                if not cursor.rowcount:
+                    return False
+                
+                self._sync_watch_rules(cursor, user_id, product_id, target_price, drop_threshold)
+                cursor.execute("UPDATE users SET watchlist_version = watchlist_version + 1 WHERE id = ?",
+                               (user_id,))
+                conn.commit()
+                return True
+        
+        except Exception as e:
+            logger.error("Error guardando objetivos de la watchlist: %s", e,
+                         extra={'user_id': user_id, 'product_id': product_id})
+            return False
+    
+    @timed("db_query", op="remove_from_watchlist")
+    def remove_from_watchlist(self, user_id: int, product_id: str) -> bool:
+        """
+        Quita un producto de la watchlist (el producto y su histórico se conservan)
+        
+        Args:
+            user_id: ID del usuario
+            product_id: Producto a dejar de seguir
+        
+        Returns:
+            True si el producto estaba en la watchlist
+        """
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                
+                cursor.execute("DELETE FROM watchlist_items WHERE user_id = ? AND product_id = ?",
+                               (user_id, product_id))
+                if not cursor.rowcount:
+                    return False
+                
+                cursor.execute("""
+                    UPDATE alert_rules SET active = 0
+                    WHERE product_id = ? AND owner = (SELECT name FROM users WHERE id = ?)
+                """, (product_id, user_id))
+                cursor.execute("UPDATE users SET watchlist_version = watchlist_version + 1 WHERE id = ?",
+                               (user_id,))
+                conn.commit()
+                return True
+        
+        except Exception as e:
+            logger.error("Error quitando de la watchlist: %s", e,
+                         extra={'user_id': user_id, 'product_id': product_id})
+            return False
+    
+    @timed("db_query", op="get_watchlist_ids")
+    def get_watchlist_ids(self, user_id: int, product_ids: Optional[List[str]] = None) -> set:
+        """
+        IDs de la watchlist del usuario (opcionalmente solo entre product_ids)
+        """
+        base_query = "SELECT product_id FROM watchlist_items WHERE user_id = ?"
+        if product_ids is None:
+            queries = [(base_query, (user_id,))]
+        else:
+            ids = sorted(set(product_ids))
+            queries = [
+                (base_query + f" AND product_id IN ({','.join('?' * len(chunk))})", (user_id, *chunk))
+                for chunk in (ids[i:i + 900] for i in range(0, len(ids), 900))
+            ]
+        
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                watched = set()
+                for query, params in queries:
+                    watched.update(row[0] for row in conn.execute(query, params))
+                return watched
+        
+        except Exception as e:
+            logger.error("Error obteniendo watchlist: %s", e, extra={'user_id': user_id})
+            return set()
+    
+    @timed("db_query", op="get_watched_products")
+    def get_watched_products(self) -> List[Dict]:
+        """
+        Productos seguidos por al menos un usuario, cada uno una sola vez
+        
+        Es el conjunto a refrescar: un producto con varios seguidores se
+        scrapea una vez por barrido.
+        
+        Returns:
+            Lista de productos (id, title, url, watchers)
+        """
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.row_factory = sqlite3.Row
+                cursor = conn.cursor()
+                cursor.execute("""
+                    SELECT p.id, p.title, p.link as url, w.watchers
+                    FROM (
+                        SELECT product_id, COUNT(*) as watchers
+                        FROM watchlist_items
+                        GROUP BY product_id
+                    ) w
+                    JOIN products p ON p.id = w.product_id
+                    ORDER BY p.rowid
+                """)
+                return [dict(row) for row in cursor.fetchall()]
+        
+        except Exception as e:
+            logger.error("Error obteniendo productos seguidos: %s", e)
+            return []
+    
+    @timed("db_query", op="save_forecasts")
+    def save_forecasts(self, forecasts: List[Tuple]) -> int:
+        """
+        Guarda (reemplazando) los pronósticos de un lote de productos
+        
+        Args:
+            forecasts: Tuplas (product_id, model, params, last_at, target_at,
+                forecast, lower, upper, mae)
+        
+        Returns:
+            Cantidad de filas escritas
+        """
+        if not forecasts:
+            return 0
+        
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.executemany("""
+                    INSERT OR REPLACE INTO price_forecasts
+                        (product_id, model, params, last_at, target_at, forecast, lower, upper, mae, fitted_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+                """, forecasts)
+                conn.commit()
+                return len(forecasts)
+        
+        except Exception as e:
+            logger.error("Error guardando pronósticos: %s", e, extra={'count': len(forecasts)})
+            return 0
+    
+    @timed("db_query", op="get_forecast")
+    def get_forecast(self, product_id: str) -> Dict:
+        """
+        Último pronóstico guardado de un producto
+        
+        Args:
+            product_id: ID del producto
+        
+        Returns:
+            Diccionario con model, params, target_at, forecast, lower, upper y mae
+            (vacío si el producto no tiene pronóstico)
+        """
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.row_factory = sqlite3.Row
+                cursor = conn.cursor()
+                cursor.execute("SELECT * FROM price_forecasts WHERE product_id = ?", (product_id,))
+                row = cursor.fetchone()
+                return dict(row) if row else {}
+        
+        except Exception as e:
+            logger.error("Error obteniendo pronóstico: %s", e, extra={'product_id': product_id})
+            return {}
+    
+    @timed("db_query", op="get_all_products")
+    def get_all_products(self) -> List[Dict]:
+        """
+        Obtiene todos los productos monitoreados
+        
+        Returns:
+            Lista de productos
+        """
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.row_factory = sqlite3.Row
+                cursor = conn.cursor()
+                
+                cursor.execute("""
+                    SELECT 
+                        p.id,
+                        p.title,
+                        p.link as url,
+                        p.first_seen,
+                        COUNT(pr.id) as price_count,
+                        MIN(pr.price) as min_price,
+                        MAX(pr.price) as max_price,
+                        AVG(pr.price) as avg_price
+                    FROM products p
+                    LEFT JOIN prices pr ON p.id = pr.product_id
+                    GROUP BY p.id
+                    ORDER BY p.first_seen DESC
+                """)
+                
+                rows = cursor.fetchall()
+                return [dict(row) for row in rows]
+                
+        except Exception as e:
+            logger.error("Error obteniendo productos: %s", e)
+            return []
+    
+    @staticmethod
+    def _fts_query(query: str) -> str:
+        """
+        Convierte texto libre en una consulta FTS5 segura
+        
+        Cada palabra se cita (sin operadores ni sintaxis de FTS) y todas deben
+        aparecer; la última se busca como prefijo porque es la que se está
+        escribiendo: "lenovo note" encuentra "Notebook Lenovo".
+        """
+        tokens = [f'"{token}"' for token in re.findall(r"\w+", query.lower())]
+        if tokens:
+            tokens[-1] += "*"
+        return " ".join(tokens)
+    
+    def _title_filter(self, query: Optional[str]) -> Tuple[str, str, Tuple]:
+        """
+        JOIN y WHERE del filtro por título
+        
+        Con FTS5 se buscan palabras por prefijo, sin acentos ni mayúsculas, y
+        el JOIN expone f.rank para ordenar por relevancia. Sin FTS5 se usa
+        LIKE por subcadena.
+        
+        Returns:
+            Tupla (join, where, params); vacíos si no hay filtro
+        """
+        if not query or not query.strip():
+            return "", "", ()
+        
+        if self.fts_enabled:
+            match = self._fts_query(query)
+            if not match:
+                return "", "WHERE 0", ()
+            return "JOIN products_fts f ON f.rowid = p.rowid", "WHERE f.products_fts MATCH ?", (match,)
+        
+        pattern = query.strip().replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        return "", "WHERE p.title LIKE ? ESCAPE '\\'", (f"%{pattern}%",)
+    
+    @staticmethod
+    def _watchlist_filter(user_id: Optional[int]) -> Tuple[str, str, Tuple]:
+        """
+        JOIN y columnas para restringir un listado a la watchlist de un usuario
+        
+        Returns:
+            Tupla (join, columnas extra, params); vacíos sin usuario
+        """
+        if user_id is None:
+            return "", "", ()
+        return ("JOIN watchlist_items w ON w.product_id = p.id AND w.user_id = ?",
+                ", w.target_price, w.drop_threshold", (user_id,))
+    
+    def _order_by(self, sort: str, query: Optional[str]) -> str:
+        if sort not in TRACKED_SORTS:
+            raise ValueError(f"Orden desconocido: {sort} (opciones: {', '.join(TRACKED_SORTS)})")
+        
+        # La relevancia solo existe con un filtro resuelto por FTS5
+        if sort == 'relevance' and not (self.fts_enabled and query and self._fts_query(query)):
+            sort = 'recent'
+        return TRACKED_SORTS[sort]
+    
+    @staticmethod
+    def _attach_sellers(cursor, products: List[Dict]):
+        """
+        Agrega vendedor y envío gratis del último precio a cada producto (uno por índice)
+        """
+        for product in products:
+            cursor.execute("""
+                SELECT seller, free_shipping FROM prices
+                WHERE product_id = ?
+                ORDER BY scraped_at DESC
+                LIMIT 1
+            """, (product['id'],))
+            row = cursor.fetchone()
+            product['seller'] = row[0] if row else None
+            product['free_shipping'] = bool(row[1]) if row else False
+    
+    @timed("db_query", op="get_tracked_products")
+    def get_tracked_products(self, query: Optional[str] = None, sort: str = 'recent',
+                             limit: Optional[int] = None, offset: int = 0,
+                             user_id: Optional[int] = None) -> List[Dict]:
+        """
+        Obtiene los productos con precios junto a su último valor
+        
+        A diferencia de get_all_products no agrega el histórico: las métricas
+        salen de price_stats. El filtro, el orden y la página se resuelven en
+        SQL y el vendedor del último precio se busca solo para la página.
+        
+        Args:
+            query: Palabras a buscar en el título (None = todos)
+            sort: Orden (clave de TRACKED_SORTS; 'relevance' requiere query)
+            limit: Tamaño de página (None = sin límite)
+            offset: Productos a saltear
+            user_id: Solo la watchlist de este usuario (None = todo el catálogo)
+        
+        Returns:
+            Lista de productos (id, title, url, category, first_seen, price,
+            previous_price, min_price, max_price, avg_price, price_count,
+            last_at, seller; con user_id también target_price y drop_threshold)
+        """
+        order_by = self._order_by(sort, query)
+        watch_join, watch_columns, watch_params = self._watchlist_filter(user_id)
+        join, where, params = self._title_filter(query)
+        
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.row_factory = sqlite3.Row
+                cursor = conn.cursor()
+                
+                cursor.execute(f"""
+                    SELECT 
+                        p.id,
+                        p.title,
+                        p.link as url,
+                        p.category,
+                        p.first_seen,
+                        s.last_price as price,
+                        s.prev_price as previous_price,
+                        s.min_price,
+                        s.max_price,
+                        s.mean as avg_price,
+                        s.count as price_count,
+                        s.last_at
+                        {watch_columns}
+                    FROM products p
+                    JOIN price_stats s ON s.product_id = p.id
+                    {watch_join}
+                    {join}
+                    {where}
+                    ORDER BY {order_by}
+                    LIMIT ? OFFSET ?
+                """, watch_params + params + (-1 if limit is None else limit, offset))
+                
+                products = [dict(row) for row in cursor.fetchall()]
+                self._attach_sellers(cursor, products)
+                return products
+        
+        except Exception as e:
+            logger.error("Error obteniendo productos monitoreados: %s", e, extra={'query': query})
+            return []
+    
+    @timed("db_query", op="search_products_local")
+    def search_products_local(self, query: str, limit: int = 20, offset: int = 0,
+                              since: Optional[str] = None) -> List[Dict]:
+        """
+        Busca en todo el catálogo guardado por palabras del título
+        
+        Usa el índice FTS5 (prefijos, sin acentos ni mayúsculas) y ordena por
+        relevancia BM25; sin FTS5 cae a LIKE por subcadena, ordenado por título.
+        Incluye productos sin precios (price y demás métricas en None).
+        
+        Args:
+            query: Texto libre (ej: "envio gratis lenovo")
+            limit: Cantidad máxima de resultados
+            offset: Resultados a saltear
+            since: Solo productos con un precio observado desde este timestamp ISO
+        
+        Returns:
+            Lista de productos como get_tracked_products más rank (menor = más relevante)
+        """
+        join, where, params = self._title_filter(query)
+        if not where:
+            return []
+        
+        if since:
+            where += " AND s.last_at >= ?"
+            params += (since,)
+        
+        rank = "f.rank" if join else "NULL"
+        order_by = "f.rank" if join else "p.title COLLATE NOCASE"
+        
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.row_factory = sqlite3.Row
+                cursor = conn.cursor()
+                
+                cursor.execute(f"""
+                    SELECT 
+                        p.id,
+                        p.title,
+                        p.link as url,
+                        p.category,
+                        p.first_seen,
+                        s.last_price as price,
+                        s.prev_price as previous_price,
+                        s.min_price,
+                        s.max_price,
+                        s.mean as avg_price,
+                        s.count as price_count,
+                        s.last_at,
+                        {rank} as rank
+                    FROM products p
+                    LEFT JOIN price_stats s ON s.product_id = p.id
+                    {join}
+                    {where}
+                    ORDER BY {order_by}
+                    LIMIT ? OFFSET ?
+                """, params + (limit, offset))
+                
+                products = [dict(row) for row in cursor.fetchall()]
+                self._attach_sellers(cursor, products)
+                return products
+        
+        except Exception as e:
+            logger.error("Error buscando productos: %s", e, extra={'query': query})
+            return []
+    
+    @timed("db_query", op="get_tracked_totals")
+    def get_tracked_totals(self, query: Optional[str] = None, user_id: Optional[int] = None) -> Dict:
+        """
+        Cantidad de productos con precios y promedio de su último precio
+        
+        Args:
+            query: Mismo filtro por título que get_tracked_products
+            user_id: Solo la watchlist de este usuario (None = todo el catálogo)
+        
+        Returns:
+            Diccionario {count, avg_price}
+        """
+        watch_join, _, watch_params = self._watchlist_filter(user_id)
+        join, where, params = self._title_filter(query)
+        
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                
+                cursor.execute(f"""
+                    SELECT COUNT(*), AVG(s.last_price)
+                    FROM products p
+                    JOIN price_stats s ON s.product_id = p.id
+                    {watch_join}
+                    {join}
+                    {where}
+                """, watch_params + params)
+                
+                count, avg_price = cursor.fetchone()
+                return {'count': count, 'avg_price': avg_price or 0.0}
+        
+        except Exception as e:
+            logger.error("Error contando productos monitoreados: %s", e, extra={'query': query})
+            return {'count': 0, 'avg_price': 0.0}
+    
+    @timed("db_query", op="get_latest_prices")
+    def get_latest_prices(self, limit: int = 10) -> List[Dict]:
+        """
+        Obtiene los últimos precios registrados
+        
+        Args:
+            limit: Número máximo de resultados
+            
+        Returns:
+            Lista de precios recientes
+        """
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.row_factory = sqlite3.Row
+                cursor = conn.cursor()
+                
+                cursor.execute("""
+                    SELECT 
+                        p.id,
+                        prod.title,
+                        p.price,
+                        p.seller,
+                        p.scraped_at
+                    FROM prices p
+                    JOIN products prod ON p.product_id = prod.id
+                    ORDER BY p.scraped_at DESC
+                    LIMIT ?
+                """, (limit,))
+                
+                rows = cursor.fetchall()
+                return [dict(row) for row in rows]
+                
+        except Exception as e:
+            logger.error("Error obteniendo precios recientes: %s", e)
+            return []
+    
+    @timed("db_query", op="get_price_changes")
+    def get_price_changes(self, threshold: float = 10.0) -> List[Dict]:
+        """
+        Detecta productos con cambios significativos de precio
+        
+        Args:
+            threshold: Porcentaje de cambio para considerar significativo
+            
+        Returns:
+            Lista de productos con cambios de precio
+        """
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.row_factory = sqlite3.Row
+                cursor = conn.cursor()
+                
+                cursor.execute("""
+                    WITH latest_prices AS (
+                        SELECT 
+                            product_id,
+                            price as current_price,
+                            ROW_NUMBER() OVER (PARTITION BY product_id ORDER BY scraped_at DESC) as rn
+                        FROM prices
+                    ),
+                    previous_prices AS (
+                        SELECT 
+                            product_id,
+                            price as previous_price,
+                            ROW_NUMBER() OVER (PARTITION BY product_id ORDER BY scraped_at DESC) as rn
+                        FROM prices
+                    )
+                    SELECT 
+                        p.id,
+                        p.title,
+                        lp.current_price,
+                        pp.previous_price,
+                        ((lp.current_price - pp.previous_price) / pp.previous_price * 100) as change_percent
+                    FROM products p
+                    JOIN latest_prices lp ON p.id = lp.product_id AND lp.rn = 1
+                    JOIN previous_prices pp ON p.id = pp.product_id AND pp.rn = 2
+                    WHERE ABS((lp.current_price - pp.previous_price) / pp.previous_price * 100) >= ?
+                    ORDER BY ABS(change_percent) DESC
+                """, (threshold,))
+                
+                rows = cursor.fetchall()
+                return [dict(row) for row in rows]
                 
         except Exception as e:
-            print(f"Error detectando cambios: {e}")
+            logger.error("Error detectando cambios: %s", e)
             return []
     
+    @timed("db_query", op="get_stats")
     def get_stats(self) -> Dict:
         """
         Obtiene estadísticas generales de la base de datos
@@ -328,40 +2045,401 @@ class PriceDatabase:
                 }
                 
         except Exception as e:
-            print(f"Error obteniendo estadísticas: {e}")
+            logger.error("Error obteniendo estadísticas: %s", e)
+            return {}
+    
+    def get_data_version(self) -> int:
+        """
+        Versión de los datos para invalidar cachés de lectura
+        
+        Es el último prices.id insertado: cambia con cada save_price/save_prices,
+        sin importar qué proceso escribió, y se resuelve por la clave primaria.
+        
+        Returns:
+            Versión actual (0 si la base está vacía o no se pudo leer)
+        """
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT COALESCE(MAX(id), 0) FROM prices")
+                return cursor.fetchone()[0]
+        
+        except Exception as e:
+            logger.error("Error obteniendo versión de datos: %s", e)
+            return 0
+    
+    def _compute_summary(self, cursor, threshold_percent: float, max_alerts: int, top_movers: int,
+                         user_id: Optional[int] = None) -> Dict:
+        """
+        Totales, alertas y top movers desde price_stats (opcionalmente de una watchlist)
+        
+        Returns:
+            Diccionario con total_products, total_prices, avg_price,
+            alert_threshold, alert_count, alerts y top_movers
+        """
+        # Con usuario, un JOIN por la clave de watchlist_items: el costo
+        # depende del tamaño de su watchlist y no del catálogo
+        join, params = "", ()
+        if user_id is not None:
+            join, params = "JOIN watchlist_items w ON w.product_id = s.product_id AND w.user_id = ?", (user_id,)
+        
+        cursor.execute(f"""
+            SELECT COUNT(*), AVG(s.last_price), COALESCE(SUM(s.count), 0)
+            FROM price_stats s
+            {join}
+        """, params)
+        total_products, avg_price, total_prices = cursor.fetchone()
+        
+        drop = "(s.prev_price - s.last_price) / s.prev_price * 100"
+        cursor.execute(f"""
+            SELECT COUNT(*) FROM price_stats s
+            {join}
+            WHERE s.prev_price > 0 AND {drop} >= ?
+        """, params + (threshold_percent,))
+        alert_count = cursor.fetchone()[0]
+        
+        cursor.execute(f"""
+            SELECT 
+                p.id as product_id,
+                p.title,
+                p.link as url,
+                s.prev_price as previous_price,
+                s.last_price as current_price,
+                {drop} as drop_percent
+            FROM price_stats s
+            {join}
+            JOIN products p ON p.id = s.product_id
+            WHERE s.prev_price > 0 AND {drop} >= ?
+            ORDER BY drop_percent DESC
+            LIMIT ?
+        """, params + (threshold_percent, max_alerts))
+        alerts = [dict(row) for row in cursor.fetchall()]
+        
+        cursor.execute(f"""
+            SELECT 
+                p.id as product_id,
+                p.title,
+                s.prev_price as previous_price,
+                s.last_price as current_price,
+                (s.last_price - s.prev_price) / s.prev_price * 100 as change_percent
+            FROM price_stats s
+            {join}
+            JOIN products p ON p.id = s.product_id
+            WHERE s.prev_price > 0 AND s.last_price != s.prev_price
+            ORDER BY ABS(s.last_price - s.prev_price) / s.prev_price DESC
+            LIMIT ?
+        """, params + (top_movers,))
+        movers = [dict(row) for row in cursor.fetchall()]
+        
+        return {
+            'total_products': total_products,
+            'total_prices': total_prices,
+            'avg_price': avg_price or 0.0,
+            'alert_threshold': threshold_percent,
+            'alert_count': alert_count,
+            'alerts': alerts,
+            'top_movers': movers,
+        }
+    
+    @timed("db_query", op="refresh_summary")
+    def refresh_summary(self, threshold_percent: float = SUMMARY_ALERT_THRESHOLD,
+                        max_alerts: int = SUMMARY_MAX_ALERTS,
+                        top_movers: int = SUMMARY_TOP_MOVERS) -> Dict:
+        """
+        Recalcula el resumen de todo el catálogo a partir de price_stats
+        
+        Se llama al terminar un trabajo de actualización y al cambiar el
+        umbral en Settings (no por cada producto trackeado); /stats lo lee con
+        get_summary() e informa lo pendiente. El dashboard usa el resumen por
+        usuario (refresh_user_summaries). Las alertas comparan el último
+        precio con el anterior de cada producto, igual que check_price_alerts.
+        
+        Args:
+            threshold_percent: Caída mínima (%) para contar como alerta
+            max_alerts: Alertas guardadas con detalle (las de mayor caída)
+            top_movers: Productos con mayor variación absoluta a guardar
+        
+        Returns:
+            Resumen calculado (mismo formato que get_summary)
+        """
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.row_factory = sqlite3.Row
+                cursor = conn.cursor()
+                
+                # La versión se lee primero: lo que entre durante el cálculo
+                # queda marcado como pendiente en vez de perderse
+                cursor.execute("SELECT COALESCE(MAX(id), 0) FROM prices")
+                data_version = cursor.fetchone()[0]
+                
+                summary = self._compute_summary(cursor, threshold_percent, max_alerts, top_movers)
+                
+                computed_at = datetime.now().isoformat()
+                cursor.execute("""
+                    INSERT OR REPLACE INTO dashboard_summary (
+                        id, data_version, total_products, total_prices, avg_price,
+                        alert_threshold, alert_count, alerts, top_movers, computed_at
+                    ) VALUES (1, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """, (
+                    data_version, summary['total_products'], summary['total_prices'], summary['avg_price'],
+                    threshold_percent, summary['alert_count'], json.dumps(summary['alerts']),
+                    json.dumps(summary['top_movers']), computed_at
+                ))
+                
+                conn.commit()
+                logger.info("Resumen del dashboard actualizado", extra={
+                    'products': summary['total_products'], 'alerts': summary['alert_count'],
+                    'data_version': data_version
+                })
+                
+                return {'data_version': data_version, **summary, 'computed_at': computed_at, 'pending_prices': 0}
+        
+        except Exception as e:
+            logger.error("Error actualizando resumen del dashboard: %s", e)
+            return {}
+    
+    @timed("db_query", op="get_summary")
+    def get_summary(self) -> Dict:
+        """
+        Lee el resumen del dashboard en O(1)
+        
+        Returns:
+            Diccionario con total_products, total_prices, avg_price,
+            alert_threshold, alert_count, alerts, top_movers, computed_at,
+            data_version y pending_prices (precios guardados después del
+            cálculo; > 0 significa que el resumen está desactualizado).
+            Vacío si nunca se calculó.
+        """
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.row_factory = sqlite3.Row
+                cursor = conn.cursor()
+                
+                cursor.execute("SELECT * FROM dashboard_summary WHERE id = 1")
+                row = cursor.fetchone()
+                if row is None:
+                    return {}
+                
+                cursor.execute("SELECT COALESCE(MAX(id), 0) FROM prices")
+                current_version = cursor.fetchone()[0]
+                
+                summary = self._summary_from_row(row)
+                del summary['id']
+                summary['pending_prices'] = max(0, current_version - summary['data_version'])
+                return summary
+        
+        except Exception as e:
+            logger.error("Error leyendo resumen del dashboard: %s", e)
+            return {}
+    
+    def _summary_from_row(self, row) -> Dict:
+        """
+        Decodifica una fila de dashboard_summary / user_summaries
+        """
+        summary = dict(row)
+        summary['avg_price'] = summary['avg_price'] or 0.0
+        summary['alerts'] = json.loads(summary['alerts'])
+        summary['top_movers'] = json.loads(summary['top_movers'])
+        return summary
+    
+    @timed("db_query", op="refresh_user_summaries")
+    def refresh_user_summaries(self, user_ids: Optional[List[int]] = None,
+                               threshold_percent: Optional[float] = None,
+                               max_alerts: int = SUMMARY_MAX_ALERTS,
+                               top_movers: int = SUMMARY_TOP_MOVERS) -> int:
+        """
+        Recalcula el resumen guardado de la watchlist de cada usuario
+        
+        Lo llama el listener de ingesta (refresh_summaries_on_ingest) solo
+        para los usuarios que siguen algún producto tocado; el dashboard lo
+        lee con get_user_summary() sin recalcular.
+        
+        Args:
+            user_ids: Usuarios a recalcular (None = todos)
+            threshold_percent: Caída mínima (%) para contar como alerta
+                (por defecto la de get_drop_threshold())
+            max_alerts: Alertas guardadas con detalle (las de mayor caída)
+            top_movers: Productos con mayor variación absoluta a guardar
+        
+        Returns:
+            Cantidad de resúmenes recalculados
+        """
+        if threshold_percent is None:
+            threshold_percent = self.get_drop_threshold()
+        
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.row_factory = sqlite3.Row
+                cursor = conn.cursor()
+                
+                if user_ids is None:
+                    cursor.execute("SELECT id FROM users")
+                    user_ids = [row[0] for row in cursor.fetchall()]
+                
+                # La versión se lee primero: lo que entre durante el cálculo
+                # queda marcado como pendiente en vez de perderse
+                cursor.execute("SELECT COALESCE(MAX(id), 0) FROM prices")
+                data_version = cursor.fetchone()[0]
+                computed_at = datetime.now().isoformat()
+                
+                refreshed = 0
+                for user_id in user_ids:
+                    cursor.execute("SELECT watchlist_version FROM users WHERE id = ?", (user_id,))
+                    row = cursor.fetchone()
+                    if row is None:
+                        continue
+                    
+                    summary = self._compute_summary(cursor, threshold_percent, max_alerts, top_movers, user_id)
+                    cursor.execute("""
+                        INSERT OR REPLACE INTO user_summaries (
+                            user_id, watchlist_version, data_version, total_products, total_prices,
+                            avg_price, alert_threshold, alert_count, alerts, top_movers, computed_at
+                        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    """, (
+                        user_id, row[0], data_version, summary['total_products'], summary['total_prices'],
+                        summary['avg_price'], threshold_percent, summary['alert_count'],
+                        json.dumps(summary['alerts']), json.dumps(summary['top_movers']), computed_at
+                    ))
+                    refreshed += 1
+                
+                conn.commit()
+                logger.debug("Resúmenes de usuario actualizados",
+                             extra={'users': refreshed, 'data_version': data_version})
+                return refreshed
+        
+        except Exception as e:
+            logger.error("Error actualizando resúmenes de usuario: %s", e)
+            return 0
+    
+    def refresh_summaries_on_ingest(self, changes: List[Dict]):
+        """
+        Listener de ingesta (ver add_listener): recalcula los resúmenes de los
+        usuarios que siguen alguno de los productos tocados
+        
+        Args:
+            changes: Cambios por producto de save_price/save_prices
+        """
+        product_ids = list({change['product_id'] for change in changes})
+        if not product_ids:
+            return
+        
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                user_ids = set()
+                for i in range(0, len(product_ids), 900):
+                    chunk = product_ids[i:i + 900]
+                    cursor.execute(f"""
+                        SELECT DISTINCT user_id FROM watchlist_items
+                        WHERE product_id IN ({','.join('?' * len(chunk))})
+                    """, chunk)
+                    user_ids.update(row[0] for row in cursor.fetchall())
+        
+        except Exception as e:
+            logger.error("Error buscando usuarios de la ingesta: %s", e, extra={'count': len(product_ids)})
+            return
+        
+        if user_ids:
+            self.refresh_user_summaries(sorted(user_ids))
+    
+    @timed("db_query", op="get_user_summary")
+    def get_user_summary(self, user_id: int) -> Dict:
+        """
+        Lee el resumen guardado de la watchlist de un usuario en O(1)
+        
+        Solo se recalcula acá si nunca se calculó o si la watchlist cambió
+        después del cálculo; los precios nuevos no lo recalculan (de eso se
+        encarga el listener de ingesta) y se informan en pending_prices.
+        
+        Args:
+            user_id: ID del usuario
+        
+        Returns:
+            Mismo formato que get_summary (pending_prices: precios de la
+            watchlist guardados después del cálculo). Vacío si el usuario no
+            existe.
+        """
+        summary = self._read_user_summary(user_id)
+        if summary is None:
+            self.refresh_user_summaries([user_id])
+            summary = self._read_user_summary(user_id)
+        return summary or {}
+    
+    def _read_user_summary(self, user_id: int) -> Optional[Dict]:
+        """
+        Resumen guardado del usuario, o None si falta o es de otra versión de su watchlist
+        """
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.row_factory = sqlite3.Row
+                cursor = conn.cursor()
+                
+                cursor.execute("""
+                    SELECT s.* FROM user_summaries s
+                    JOIN users u ON u.id = s.user_id AND u.watchlist_version = s.watchlist_version
+                    WHERE s.user_id = ?
+                """, (user_id,))
+                row = cursor.fetchone()
+                if row is None:
+                    return None
+                
+                # Recorre solo los precios posteriores al cálculo (rango de prices.id)
+                cursor.execute("""
+                    SELECT COUNT(*) FROM prices p
+                    JOIN watchlist_items w ON w.product_id = p.product_id AND w.user_id = ?
+                    WHERE p.id > ?
+                """, (user_id, row['data_version']))
+                
+                summary = self._summary_from_row(row)
+                del summary['user_id'], summary['watchlist_version']
+                summary['pending_prices'] = cursor.fetchone()[0]
+                return summary
+        
+        except Exception as e:
+            logger.error("Error leyendo resumen del usuario: %s", e, extra={'user_id': user_id})
             return {}
     
+    @timed("db_query", op="check_price_alerts")
     def check_price_alerts(self, threshold_percent=15):
         """
         Detecta productos con caída de precio significativa
-        threshold_percent: porcentaje mínimo de caída para alertar
+        
+        Compara último y anterior precio desde price_stats (una consulta, sin
+        recorrer históricos). Para alertas a medida que llegan los precios
+        usar alerts.AlertEngine.
+        
+        Args:
+            threshold_percent: Porcentaje mínimo de caída para alertar
+        
+        Returns:
+            Lista de alertas, de la mayor caída a la menor
         """
-        alerts = []
-        products = self.get_all_products()
+        drop = "(s.prev_price - s.last_price) / s.prev_price * 100"
         
-        for product in products:
-            history = self.get_price_history(product['id'])
-            
-            if len(history) >= 2:
-                # Precio actual vs precio anterior
-                current_price = history[-1]['price']
-                previous_price = history[-2]['price']
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.row_factory = sqlite3.Row
+                cursor = conn.cursor()
                 
-                # Calcular porcentaje de caída
-                if previous_price > 0:
-                    price_drop = ((previous_price - current_price) / previous_price) * 100
-                    
-                    if price_drop >= threshold_percent:
-                        alerts.append({
-                            'product_id': product['id'],
-                            'title': product['title'],
-                            'previous_price': previous_price,
-                            'current_price': current_price,
-                            'drop_percent': price_drop,
-                            'url': product.get('url', '')
-                        })
-        
-        return alerts
+                cursor.execute(f"""
+                    SELECT 
+                        p.id as product_id,
+                        p.title,
+                        s.prev_price as previous_price,
+                        s.last_price as current_price,
+                        {drop} as drop_percent,
+                        p.link as url
+                    FROM price_stats s
+                    JOIN products p ON p.id = s.product_id
+                    WHERE s.prev_price > 0 AND {drop} >= ?
+                    ORDER BY drop_percent DESC
+                """, (threshold_percent,))
+                
+                return [dict(row) for row in cursor.fetchall()]
+        
+        except Exception as e:
+            logger.error("Error buscando alertas de precio: %s", e)
+            return []
 
 
 # Funciones helper para facilitar el uso
@@ -391,6 +2469,7 @@ def get_all_products(db_path: str = "data/prices.db") -> List[Dict]:
 
 if __name__ == "__main__":
     # Ejemplo de uso
+    configure_logging("INFO")
     print("=== Ejemplo de uso de la base de datos ===\n")
     
     db = PriceDatabase("data/prices.db")
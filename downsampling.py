@@ -0,0 +1,146 @@
+"""
+Módulo de Downsampling
+Reduce series largas de precios antes de graficarlas (LTTB + envolvente min/max)
+"""
+
+import os
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+
+# Variable de entorno y presupuesto de puntos por serie graficada
+MAX_POINTS_ENV = "MLMONITOR_PLOT_POINTS"
+DEFAULT_MAX_POINTS = int(os.environ.get(MAX_POINTS_ENV, 2000))
+
+
+def _as_float(values) -> np.ndarray:
+    """
+    Convierte fechas (ns desde epoch) o números a float64 para la geometría
+    """
+    values = np.asarray(values)
+    if np.issubdtype(values.dtype, np.datetime64):
+        return values.astype('datetime64[ns]').astype('int64').astype('float64')
+    return values.astype('float64')
+
+
+def lttb_indices(x, y, n_out: int) -> np.ndarray:
+    """
+    Selecciona puntos con Largest-Triangle-Three-Buckets
+    
+    Divide la serie en n_out - 2 buckets y de cada uno conserva el punto que
+    forma el triángulo de mayor área con el punto elegido antes y el promedio
+    del bucket siguiente. Mantiene picos y caídas visibles con pocos puntos.
+    
+    Args:
+        x: Eje X ordenado (números o datetime64)
+        y: Valores
+        n_out: Cantidad de puntos a conservar (incluye primero y último)
+    
+    Returns:
+        Índices (ordenados) de los puntos elegidos
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    
+    x = _as_float(x)
+    y = _as_float(y)
+    
+    # n_out - 2 buckets sobre los puntos interiores; el primero y el último se conservan
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    
+    anchor = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+        
+        area = np.abs(
+            (x[anchor] - avg_x) * (y[start:end] - y[anchor])
+            - (x[anchor] - x[start:end]) * (avg_y - y[anchor])
+        )
+        anchor = start + int(area.argmax())
+        selected[i + 1] = anchor
+    
+    return selected
+
+
+def minmax_envelope(df: pd.DataFrame, n_buckets: Optional[int] = None,
+                    x: str = 'scraped_at', y: str = 'price') -> pd.DataFrame:
+    """
+    Mínimo y máximo de cada bucket de la serie
+    
+    Acompaña a la línea reducida con LTTB para que los extremos que quedaron
+    fuera de la muestra sigan visibles como banda.
+    
+    Args:
+        df: DataFrame ordenado por x
+        n_buckets: Cantidad de buckets (por defecto DEFAULT_MAX_POINTS / 2)
+        x: Columna del eje X
+        y: Columna de valores
+    
+    Returns:
+        DataFrame con columnas x, min y max (una fila por bucket)
+    """
+    n_buckets = n_buckets or DEFAULT_MAX_POINTS // 2
+    if df.empty:
+        return pd.DataFrame(columns=[x, 'min', 'max'])
+    
+    values = df[y].to_numpy(dtype='float64')
+    starts = np.unique(np.linspace(0, len(values), min(n_buckets, len(values)) + 1).astype(np.int64)[:-1])
+    
+    return pd.DataFrame({
+        x: df[x].to_numpy()[starts],
+        'min': np.minimum.reduceat(values, starts),
+        'max': np.maximum.reduceat(values, starts),
+    })
+
+
+def downsample_frame(df: pd.DataFrame, max_points: Optional[int] = None,
+                     x: str = 'scraped_at', y: str = 'price') -> pd.DataFrame:
+    """
+    Reduce un DataFrame de precios a lo sumo max_points filas con LTTB
+    
+    Args:
+        df: DataFrame ordenado por x
+        max_points: Presupuesto de puntos (por defecto DEFAULT_MAX_POINTS)
+        x: Columna del eje X
+        y: Columna de valores
+    
+    Returns:
+        El mismo DataFrame si ya entra en el presupuesto, o las filas elegidas
+    """
+    max_points = max_points or DEFAULT_MAX_POINTS
+    if len(df) <= max_points:
+        return df
+    
+    return df.iloc[lttb_indices(df[x].to_numpy(), df[y].to_numpy(), max_points)]
+
+
+def plotly_envelope_traces(envelope: pd.DataFrame, color: str = 'rgba(46, 134, 171, 0.15)',
+                           x: str = 'scraped_at', name: str = 'Rango min/máx') -> list:
+    """
+    Trazas Plotly de la envolvente min/max como banda sombreada
+    
+    Args:
+        envelope: Resultado de minmax_envelope
+        color: Color de relleno (con transparencia)
+        x: Columna del eje X
+        name: Nombre de la banda en la leyenda
+    
+    Returns:
+        Lista de dos trazas (máximo y mínimo con relleno entre ambas)
+    """
+    import plotly.graph_objects as go
+    
+    return [
+        go.Scatter(x=envelope[x], y=envelope['max'], mode='lines', line=dict(width=0),
+                   showlegend=False, hoverinfo='skip'),
+        go.Scatter(x=envelope[x], y=envelope['min'], mode='lines', line=dict(width=0),
+                   fill='tonexty', fillcolor=color, name=name, hoverinfo='skip'),
+    ]
@@ -0,0 +1,456 @@
+"""
+Módulo de Trabajos en Segundo Plano
+Actualizaciones masivas y búsquedas en vivo en pools de threads con progreso y cancelación
+"""
+
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+try:
+    from .logger import get_logger
+    from .metrics import counter, timed
+except ImportError:
+    from logger import get_logger
+    from metrics import counter, timed
+
+
+logger = get_logger(__name__)
+
+# Navegadores en paralelo (cada thread del pool mantiene el suyo abierto)
+JOB_WORKERS_ENV = "MLMONITOR_JOB_WORKERS"
+DEFAULT_JOB_WORKERS = 3
+
+# Precios acumulados antes de escribirlos en una sola transacción
+JOB_FLUSH_EVERY = 20
+
+# Trabajos terminados que se conservan para consultar su resultado
+MAX_FINISHED_JOBS = 50
+
+# Estados de un trabajo
+JOB_PENDING = 'pending'
+JOB_RUNNING = 'running'
+JOB_DONE = 'done'
+JOB_CANCELLED = 'cancelled'
+JOB_FAILED = 'failed'
+ACTIVE_STATES = (JOB_PENDING, JOB_RUNNING)
+
+job_products_counter = counter("job_products_total", "Productos procesados por trabajos en segundo plano")
+
+
+def _refresh_product(scraper, product: Dict) -> Optional[Dict]:
+    """
+    Vuelve a buscar un producto por título y devuelve el precio actual
+    
+    Args:
+        scraper: Instancia de MercadoLibreScraper del thread actual
+        product: Producto trackeado (id, title)
+    
+    Returns:
+        Producto con el precio nuevo y el id original, o None si no hubo resultados
+    """
+    results = scraper.search_products(product['title'][:50], limit=1)
+    if not results:
+        return None
+    
+    updated = dict(results[0])
+    updated['id'] = product['id']
+    return updated
+
+
+class Job:
+    """
+    Estado de un trabajo de actualización (modificado solo bajo su lock)
+    """
+    
+    def __init__(self, job_id: str, kind: str, products: List[Dict], owner: Optional[str] = None):
+        self.id = job_id
+        self.kind = kind
+        self.owner = owner
+        self.products = products
+        self.total = len(products)
+        self.status = JOB_PENDING
+        self.processed = 0
+        self.updated = 0
+        self.saved = 0
+        self.errors: List[Dict] = []
+        self.results: List[Dict] = []
+        self.current: Optional[str] = None
+        self.created_at = datetime.now()
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self.cancel_event = threading.Event()
+        self.pending: List[Dict] = []
+        self.futures = []
+        self.lock = threading.Lock()
+    
+    @property
+    def active(self) -> bool:
+        return self.status in ACTIVE_STATES
+    
+    def snapshot(self) -> Dict:
+        """
+        Copia del estado apta para mostrar (no comparte listas con los workers)
+        """
+        with self.lock:
+            finished = self.finished_at or datetime.now()
+            return {
+                'id': self.id,
+                'kind': self.kind,
+                'owner': self.owner,
+                'status': self.status,
+                'active': self.active,
+                'total': self.total,
+                'processed': self.processed,
+                'updated': self.updated,
+                'saved': self.saved,
+                'failed': len(self.errors),
+                'errors': list(self.errors[-20:]),
+                'results': list(self.results),
+                'current': self.current,
+                'progress': self.processed / self.total if self.total else 1.0,
+                'created_at': self.created_at,
+                'started_at': self.started_at,
+                'finished_at': self.finished_at,
+                'seconds': (finished - self.started_at).total_seconds() if self.started_at else 0.0,
+            }
+
+
+class JobManager:
+    """
+    Ejecuta actualizaciones masivas en segundo plano
+    
+    Todos los trabajos comparten un pool de `workers` threads, así que la
+    cantidad de navegadores abiertos queda acotada sin importar cuántas
+    sesiones lancen actualizaciones. Cada thread crea su propio scraper
+    (Selenium no es thread-safe) y lo reutiliza entre productos.
+    
+    Las búsquedas en vivo usan un thread aparte para no quedar en cola
+    detrás de un barrido masivo.
+    """
+    
+    def __init__(self, db, workers: Optional[int] = None,
+                 scraper_factory: Optional[Callable] = None,
+                 flush_every: int = JOB_FLUSH_EVERY):
+        """
+        Args:
+            db: PriceDatabase donde se guardan los precios
+            workers: Threads del pool (por defecto MLMONITOR_JOB_WORKERS o 3)
+            scraper_factory: Crea un scraper por thread (por defecto MercadoLibreScraper)
+            flush_every: Precios acumulados por escritura en la base
+        """
+        self.db = db
+        self.workers = int(workers or os.environ.get(JOB_WORKERS_ENV, DEFAULT_JOB_WORKERS))
+        self.scraper_factory = scraper_factory
+        self.flush_every = flush_every
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bulk-update")
+        self._search_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="live-search")
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._scrapers = []
+    
+    def _scraper(self):
+        """
+        Scraper del thread actual (se crea en el primer uso)
+        """
+        scraper = getattr(self._local, 'scraper', None)
+        if scraper is None:
+            factory = self.scraper_factory
+            if factory is None:
+                try:
+                    from .scraper import MercadoLibreScraper
+                except ImportError:
+                    from scraper import MercadoLibreScraper
+                factory = MercadoLibreScraper
+            
+            scraper = self._local.scraper = factory()
+            with self._lock:
+                self._scrapers.append(scraper)
+        return scraper
+    
+    def submit_bulk_update(self, products: List[Dict], owner: Optional[str] = None) -> str:
+        """
+        Encola la actualización de precios de varios productos
+        
+        Args:
+            products: Productos trackeados (al menos id y title); los IDs
+                repetidos se scrapean una sola vez
+            owner: Quién lanzó el trabajo (solo informativo)
+        
+        Returns:
+            ID del trabajo
+        """
+        unique = list({product['id']: product for product in products}.values())
+        job = Job(uuid.uuid4().hex[:12], 'bulk_update', unique, owner)
+        
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune()
+        
+        logger.info("Trabajo encolado", extra={'job_id': job.id, 'count': job.total})
+        
+        if not job.products:
+            self._finish(job)
+            return job.id
+        
+        with job.lock:
+            job.futures = [self._pool.submit(self._run_product, job, product) for product in job.products]
+        return job.id
+    
+    def submit_search(self, query: str, limit: int = 10, owner: Optional[str] = None) -> str:
+        """
+        Encola una búsqueda en vivo; los resultados quedan en el snapshot del trabajo
+        
+        Args:
+            query: Término de búsqueda
+            limit: Cantidad máxima de resultados
+            owner: Quién lanzó el trabajo (solo informativo)
+        
+        Returns:
+            ID del trabajo
+        """
+        job = Job(uuid.uuid4().hex[:12], 'search', [], owner)
+        job.total = 1
+        
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune()
+        
+        logger.info("Búsqueda encolada", extra={'job_id': job.id, 'query': query})
+        
+        with job.lock:
+            job.futures = [self._search_pool.submit(self._run_search, job, query, limit)]
+        return job.id
+    
+    def _run_search(self, job: Job, query: str, limit: int):
+        """
+        Ejecuta una búsqueda en vivo (se ejecuta en el thread de búsquedas)
+        """
+        with job.lock:
+            if job.cancel_event.is_set():
+                return
+            job.status = JOB_RUNNING
+            job.started_at = datetime.now()
+            job.current = query
+        
+        results, error = [], None
+        try:
+            with timed("job_search", job=job.kind):
+                results = self._scraper().search_products(query, limit=limit) or []
+        except Exception as e:
+            error = str(e)
+            logger.warning("Error en búsqueda en vivo: %s", e, extra={'job_id': job.id, 'query': query})
+        
+        with job.lock:
+            job.processed = 1
+            job.results = list(results)
+            job.updated = len(job.results)
+            if error is not None:
+                job.errors.append({'product_id': None, 'title': query, 'error': error})
+        
+        self._finish(job)
+    
+    def _run_product(self, job: Job, product: Dict):
+        """
+        Actualiza un producto de un trabajo (se ejecuta en un thread del pool)
+        """
+        with job.lock:
+            if job.cancel_event.is_set():
+                return
+            if job.status == JOB_PENDING:
+                job.status = JOB_RUNNING
+                job.started_at = datetime.now()
+            job.current = product.get('title')
+        
+        updated, error = None, None
+        try:
+            with timed("job_product", job=job.kind):
+                updated = _refresh_product(self._scraper(), product)
+        except Exception as e:
+            error = str(e)
+            logger.warning("Error actualizando producto: %s", e,
+                           extra={'job_id': job.id, 'product_id': product.get('id')})
+        
+        with job.lock:
+            job.processed += 1
+            if updated is not None:
+                job.updated += 1
+                job.pending.append(updated)
+            elif error is not None:
+                job.errors.append({'product_id': product.get('id'), 'title': product.get('title'), 'error': error})
+            
+            flush = job.pending if len(job.pending) >= self.flush_every or job.processed == job.total else []
+            if flush:
+                job.pending = []
+            finished = job.processed == job.total
+        
+        job_products_counter.inc(status='updated' if updated is not None else 'failed' if error else 'not_found')
+        
+        if flush:
+            self._save(job, flush)
+        if finished:
+            self._finish(job)
+    
+    def _save(self, job: Job, products: List[Dict]):
+        saved = self.db.save_prices(products)
+        with job.lock:
+            job.saved += saved
+            if saved < len(products):
+                job.errors.append({'product_id': None, 'title': None,
+                                   'error': f"No se pudieron guardar {len(products) - saved} precios"})
+    
+    def _finish(self, job: Job):
+        with job.lock:
+            if not job.active:
+                return
+            saved = job.saved
+        
+        # Una ingesta, un recálculo del resumen del catálogo (/stats) y de los modelos
+        # (antes de publicar el fin del trabajo para que la UI no lea lo anterior)
+        if saved:
+            self.db.refresh_summary(self.db.get_drop_threshold())
+            self._refresh_models()
+        
+        with job.lock:
+            if not job.active:
+                return
+            job.status = JOB_CANCELLED if job.cancel_event.is_set() else JOB_DONE
+            if job.total and not job.saved and job.errors and job.status == JOB_DONE:
+                job.status = JOB_FAILED
+            job.current = None
+            job.finished_at = datetime.now()
+            job.started_at = job.started_at or job.finished_at
+            stats = {'job_id': job.id, 'status': job.status, 'processed': job.processed,
+                     'updated': job.updated, 'failed': len(job.errors)}
+        
+        logger.info("Trabajo terminado", extra=stats)
+    
+    def _refresh_models(self):
+        """
+        Actualiza sketches, marca anomalías y reajusta pronósticos con los precios nuevos
+        
+        Los tres procesos continúan desde su marca de agua: el costo depende de
+        lo que trajo el trabajo y no del tamaño del catálogo.
+        """
+        try:
+            from .analyzer import AnomalyDetector, PriceForecaster
+        except ImportError:
+            from analyzer import AnomalyDetector, PriceForecaster
+        
+        try:
+            self.db.update_sketches()
+        except Exception as e:
+            logger.error("Error actualizando sketches: %s", e)
+        
+        try:
+            AnomalyDetector().run(self.db)
+        except Exception as e:
+            logger.error("Error detectando anomalías: %s", e)
+        
+        try:
+            PriceForecaster().run(self.db)
+        except Exception as e:
+            logger.error("Error actualizando pronósticos: %s", e)
+    
+    def cancel(self, job_id: str) -> bool:
+        """
+        Cancela un trabajo: los productos en curso terminan, el resto no se procesa
+        
+        Los precios ya obtenidos se guardan igual.
+        
+        Args:
+            job_id: ID del trabajo
+        
+        Returns:
+            True si el trabajo estaba activo
+        """
+        job = self._jobs.get(job_id)
+        if job is None or not job.active:
+            return False
+        
+        job.cancel_event.set()
+        with job.lock:
+            futures = list(job.futures)
+        
+        cancelled = sum(1 for future in futures if future.cancel())
+        
+        with job.lock:
+            flush, job.pending = job.pending, []
+            running = len(futures) - cancelled - job.processed
+        
+        if flush:
+            self._save(job, flush)
+        
+        # Sin productos en curso nadie más va a cerrar el trabajo
+        if running <= 0:
+            self._finish(job)
+        else:
+            threading.Thread(target=self._finish_when_idle, args=(job, futures),
+                             name=f"job-{job.id}-cancel", daemon=True).start()
+        
+        logger.info("Trabajo cancelado", extra={'job_id': job_id, 'skipped': cancelled})
+        return True
+    
+    def _finish_when_idle(self, job: Job, futures: List):
+        for future in futures:
+            if not future.cancelled():
+                try:
+                    future.result()
+                except Exception:
+                    pass
+        
+        with job.lock:
+            flush, job.pending = job.pending, []
+        if flush:
+            self._save(job, flush)
+        self._finish(job)
+    
+    def get(self, job_id: Optional[str]) -> Dict:
+        """
+        Estado actual de un trabajo
+        
+        Args:
+            job_id: ID devuelto por submit_bulk_update
+        
+        Returns:
+            Snapshot del trabajo (vacío si no existe)
+        """
+        job = self._jobs.get(job_id) if job_id else None
+        return job.snapshot() if job else {}
+    
+    def list_jobs(self, active_only: bool = False) -> List[Dict]:
+        """
+        Trabajos conocidos, del más reciente al más antiguo
+        """
+        with self._lock:
+            jobs = list(self._jobs.values())
+        snapshots = [job.snapshot() for job in reversed(jobs)]
+        return [job for job in snapshots if job['active']] if active_only else snapshots
+    
+    def _prune(self):
+        finished = [job_id for job_id, job in self._jobs.items() if not job.active]
+        for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self._jobs[job_id]
+    
+    def shutdown(self, wait: bool = True):
+        """
+        Cancela los trabajos activos, espera el pool y cierra los navegadores
+        """
+        for job in self.list_jobs(active_only=True):
+            self.cancel(job['id'])
+        
+        self._pool.shutdown(wait=wait)
+        self._search_pool.shutdown(wait=wait)
+        
+        with self._lock:
+            scrapers, self._scrapers = self._scrapers, []
+        for scraper in scrapers:
+            try:
+                scraper.close()
+            except Exception as e:
+                logger.warning("Error cerrando scraper: %s", e)
@@ -0,0 +1,139 @@
+"""
+Módulo de Logging
+Loggers por módulo con campos estructurados (query, product_id, duration_ms)
+"""
+
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+
+# Namespace común para todos los loggers del proyecto
+LOGGER_NAMESPACE = "mlmonitor"
+
+# Variables de entorno para configurar el logging sin tocar código
+LOG_LEVEL_ENV = "MLMONITOR_LOG_LEVEL"
+LOG_FORMAT_ENV = "MLMONITOR_LOG_FORMAT"
+
+# Atributos estándar de LogRecord (todo lo demás se considera campo estructurado)
+_RESERVED_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+# Sin handler propio (no se agrega NullHandler) los WARNING y ERROR salen por
+# logging.lastResort a stderr hasta que se llame a configure_logging()
+
+
+def _extra_fields(record: logging.LogRecord) -> dict:
+    """
+    Extrae los campos estructurados pasados vía `extra=`
+    """
+    return {
+        key: value for key, value in vars(record).items()
+        if key not in _RESERVED_ATTRS and not key.startswith('_')
+    }
+
+
+class StructuredFormatter(logging.Formatter):
+    """
+    Formatter de texto que agrega los campos estructurados como key=value
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        message = super().format(record)
+        fields = _extra_fields(record)
+
+        if not fields:
+            return message
+
+        return message + " | " + " ".join(f"{key}={value}" for key, value in fields.items())
+
+
+class JSONFormatter(logging.Formatter):
+    """
+    Formatter que emite una línea JSON por evento
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            'ts': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        payload.update(_extra_fields(record))
+
+        if record.exc_info:
+            payload['exc_info'] = self.formatException(record.exc_info)
+
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+def get_logger(name: str) -> logging.Logger:
+    """
+    Obtiene el logger de un módulo dentro del namespace del proyecto
+
+    Args:
+        name: Nombre del módulo (normalmente __name__)
+
+    Returns:
+        Logger "mlmonitor.<modulo>"
+    """
+    module = name.rsplit('.', 1)[-1]
+    return logging.getLogger(f"{LOGGER_NAMESPACE}.{module}")
+
+
+def configure_logging(level: Optional[str] = None, fmt: Optional[str] = None):
+    """
+    Configura el handler de consola del proyecto (idempotente)
+
+    Args:
+        level: Nivel de log (por defecto MLMONITOR_LOG_LEVEL o WARNING)
+        fmt: "text" o "json" (por defecto MLMONITOR_LOG_FORMAT o text)
+    """
+    level = (level or os.environ.get(LOG_LEVEL_ENV, "WARNING")).upper()
+    fmt = (fmt or os.environ.get(LOG_FORMAT_ENV, "text")).lower()
+
+    root = logging.getLogger(LOGGER_NAMESPACE)
+    root.setLevel(level)
+
+    for handler in list(root.handlers):
+        if getattr(handler, '_mlmonitor', False):
+            root.removeHandler(handler)
+
+    handler = logging.StreamHandler()
+    handler._mlmonitor = True
+
+    if fmt == "json":
+        handler.setFormatter(JSONFormatter())
+    else:
+        handler.setFormatter(StructuredFormatter("%(asctime)s %(levelname)-7s %(name)s: %(message)s"))
+
+    root.addHandler(handler)
+    root.propagate = False
+
+
+@contextmanager
+def log_duration(logger: logging.Logger, message: str, level: int = logging.INFO, **fields):
+    """
+    Loggea la duración de un bloque con el campo duration_ms
+
+    Si el nivel está deshabilitado no se mide ni se formatea nada.
+
+    Args:
+        logger: Logger destino
+        message: Mensaje a emitir al finalizar el bloque
+        level: Nivel del evento
+        **fields: Campos estructurados adicionales
+    """
+    if not logger.isEnabledFor(level):
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        fields['duration_ms'] = round((time.perf_counter() - start) * 1000, 2)
+        logger.log(level, message, extra=fields)
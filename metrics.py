@@ -0,0 +1,279 @@
+"""
+Módulo de Métricas
+Contadores e histogramas de latencia exportables en formato Prometheus
+"""
+
+import functools
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+
+# Buckets de latencia en segundos (desde operaciones de DB hasta arranque del navegador)
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Puerto del endpoint HTTP (si está definido, la app lo levanta automáticamente)
+METRICS_PORT_ENV = "MLMONITOR_METRICS_PORT"
+
+
+def _label_key(labels: Dict) -> Tuple:
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key: Tuple, extra: Optional[Dict] = None) -> str:
+    items = list(key) + list((extra or {}).items())
+    if not items:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in items) + "}"
+
+
+class Counter:
+    """
+    Contador monotónico con labels
+    """
+
+    def __init__(self, name: str, help_text: str = ""):
+        self.name = name
+        self.help = help_text
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return lines
+
+    def snapshot(self) -> List[Dict]:
+        with self._lock:
+            return [
+                {'metric': self.name, 'labels': dict(key), 'count': value}
+                for key, value in sorted(self._values.items())
+            ]
+
+
+class Histogram:
+    """
+    Histograma acumulativo con buckets fijos (estilo Prometheus)
+    """
+
+    def __init__(self, name: str, help_text: str = "", buckets: Tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple, Dict] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+                self._series[key] = series
+
+            series['sum'] += value
+            series['count'] += 1
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series['counts'][i] += 1
+                    break
+
+    def _quantile(self, series: Dict, q: float) -> Optional[float]:
+        """
+        Estima un cuantil interpolando dentro del bucket correspondiente
+        """
+        if series['count'] == 0:
+            return None
+
+        target = q * series['count']
+        cumulative = 0
+        lower = 0.0
+        for bound, count in zip(self.buckets, series['counts']):
+            if cumulative + count >= target and count > 0:
+                return lower + (bound - lower) * (target - cumulative) / count
+            cumulative += count
+            lower = bound
+
+        return self.buckets[-1]
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, series['counts']):
+                    cumulative += count
+                    lines.append(f"{self.name}_bucket{_format_labels(key, {'le': bound})} {cumulative}")
+                lines.append(f"{self.name}_bucket{_format_labels(key, {'le': '+Inf'})} {series['count']}")
+                lines.append(f"{self.name}_sum{_format_labels(key)} {series['sum']}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {series['count']}")
+        return lines
+
+    def snapshot(self) -> List[Dict]:
+        with self._lock:
+            return [
+                {
+                    'metric': self.name,
+                    'labels': dict(key),
+                    'count': series['count'],
+                    'avg_ms': series['sum'] / series['count'] * 1000 if series['count'] else 0.0,
+                    'p95_ms': (self._quantile(series, 0.95) or 0.0) * 1000,
+                    'total_s': series['sum'],
+                }
+                for key, series in sorted(self._series.items())
+            ]
+
+
+class MetricsRegistry:
+    """
+    Registro de métricas del proceso
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, help_text: str = "") -> Counter:
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = Counter(name, help_text)
+            return self._metrics[name]
+
+    def histogram(self, name: str, help_text: str = "", buckets: Tuple = DEFAULT_BUCKETS) -> Histogram:
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = Histogram(name, help_text, buckets)
+            return self._metrics[name]
+
+    def render(self) -> str:
+        """
+        Exporta todas las métricas en formato de texto Prometheus
+        """
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> Dict[str, List[Dict]]:
+        """
+        Exporta las métricas como filas (para mostrarlas en tablas)
+        """
+        result = {'histograms': [], 'counters': []}
+        for metric in list(self._metrics.values()):
+            kind = 'histograms' if isinstance(metric, Histogram) else 'counters'
+            result[kind].extend(metric.snapshot())
+        return result
+
+    def reset(self):
+        with self._lock:
+            self._metrics.clear()
+
+
+REGISTRY = MetricsRegistry()
+
+
+class timed:
+    """
+    Mide la duración de una función o bloque en el histograma <name>_seconds
+
+    Usable como decorador (@timed("db_query", op="save_price")) o como
+    context manager (with timed("scraper_page_load"): ...). Los errores se
+    cuentan en <name>_errors_total.
+    """
+
+    def __init__(self, name: str, help_text: str = "", registry: MetricsRegistry = None, **labels):
+        self.name = name
+        self.labels = labels
+        self.registry = registry or REGISTRY
+        self.histogram = self.registry.histogram(f"{name}_seconds", help_text or f"Duración de {name}")
+        self.errors = self.registry.counter(f"{name}_errors_total", f"Errores en {name}")
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.observe(time.perf_counter() - self._start, **self.labels)
+        if exc_type is not None:
+            self.errors.inc(**self.labels)
+        return False
+
+    def __call__(self, func):
+        histogram, errors, labels = self.histogram, self.errors, self.labels
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            except Exception:
+                errors.inc(**labels)
+                raise
+            finally:
+                histogram.observe(time.perf_counter() - start, **labels)
+
+        return wrapper
+
+
+def counter(name: str, help_text: str = "") -> Counter:
+    """
+    Obtiene (o crea) un contador del registro global
+    """
+    return REGISTRY.counter(name, help_text)
+
+
+def start_metrics_server(port: Optional[int] = None, host: str = "127.0.0.1"):
+    """
+    Levanta el endpoint /metrics en un thread daemon
+
+    Args:
+        port: Puerto (por defecto MLMONITOR_METRICS_PORT o 9108)
+        host: Interfaz de escucha (solo local por defecto)
+
+    Returns:
+        Servidor HTTP en ejecución
+    """
+    # http.server se importa acá: duplica el tiempo de import de los workers
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    
+    class _MetricsHandler(BaseHTTPRequestHandler):
+        registry = REGISTRY
+        
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            
+            body = self.registry.render().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        
+        def log_message(self, format, *args):
+            # El scrapeo periódico de Prometheus no debe ensuciar la consola
+            pass
+    
+    port = int(port if port is not None else os.environ.get(METRICS_PORT_ENV, 9108))
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    thread = threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True)
+    thread.start()
+    return server
+
+
+if __name__ == "__main__":
+    server = start_metrics_server()
+    print(f"Métricas disponibles en http://{server.server_address[0]}:{server.server_address[1]}/metrics")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,231 @@
+"""
+Módulo de Profiling
+Profiling opcional (cProfile + tracemalloc) activado por variable de entorno
+"""
+
+import cProfile
+import functools
+import os
+import random
+import re
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Optional
+
+try:
+    from .logger import get_logger
+except ImportError:
+    from logger import get_logger
+
+
+logger = get_logger(__name__)
+
+# MLMONITOR_PROFILE: "cpu", "mem" o "all"/"1" (vacío = deshabilitado)
+PROFILE_ENV = "MLMONITOR_PROFILE"
+# Fracción de ejecuciones perfiladas (ej: 0.1 = una de cada diez)
+PROFILE_SAMPLE_ENV = "MLMONITOR_PROFILE_SAMPLE"
+PROFILE_DIR_ENV = "MLMONITOR_PROFILE_DIR"
+
+DEFAULT_PROFILE_DIR = os.path.join("output", "profiles")
+TOP_ALLOCATIONS = 25
+
+_settings = {}
+_local = threading.local()
+
+
+def configure_profiling(mode: Optional[str] = None, sample_rate: Optional[float] = None,
+                        output_dir: Optional[str] = None):
+    """
+    Configura el profiling (por defecto desde las variables de entorno)
+    
+    Args:
+        mode: "cpu", "mem", "all" o "" para deshabilitar
+        sample_rate: Probabilidad de perfilar cada ejecución (0 a 1)
+        output_dir: Directorio donde se escriben los reportes
+    """
+    mode = (os.environ.get(PROFILE_ENV, "") if mode is None else mode).strip().lower()
+    if sample_rate is None:
+        sample_rate = float(os.environ.get(PROFILE_SAMPLE_ENV, 1.0))
+    
+    _settings.update({
+        'enabled': mode not in ("", "0", "false", "off"),
+        'cpu': mode in ("1", "true", "on", "all", "cpu"),
+        'memory': mode in ("1", "true", "on", "all", "mem", "memory"),
+        'sample_rate': max(0.0, min(1.0, sample_rate)),
+        'output_dir': output_dir or os.environ.get(PROFILE_DIR_ENV, DEFAULT_PROFILE_DIR),
+    })
+
+
+def profiling_enabled() -> bool:
+    """
+    Indica si el profiling está activo en este proceso
+    """
+    return _settings['enabled']
+
+
+class ProfileSession:
+    """
+    Sesión de profiling de un bloque (CPU y/o memoria)
+    """
+    
+    def __init__(self, name: str, cpu: bool, memory: bool, output_dir: str):
+        self.name = name
+        self.cpu = cpu
+        self.memory = memory
+        self.output_dir = output_dir
+        self.profiler = None
+        self.paths = None
+        self._owns_tracemalloc = False
+    
+    def start(self):
+        if self.cpu:
+            self.profiler = cProfile.Profile()
+            try:
+                self.profiler.enable()
+            except ValueError:
+                # Otro profiler activo en el intérprete (ej: profiling externo)
+                self.profiler = None
+        
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._owns_tracemalloc = True
+    
+    def stop(self) -> Dict[str, str]:
+        """
+        Detiene la sesión y escribe los reportes (una sola vez)
+        
+        Returns:
+            Rutas de los archivos generados
+        """
+        if self.paths is not None:
+            return self.paths
+        
+        paths = self.paths = {}
+        stamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+        base = os.path.join(self.output_dir, f"{stamp}_{re.sub(r'[^A-Za-z0-9_.-]+', '_', self.name)}")
+        os.makedirs(self.output_dir, exist_ok=True)
+        
+        if self.profiler is not None:
+            self.profiler.disable()
+            paths['pstats'] = base + ".pstats"
+            self.profiler.dump_stats(paths['pstats'])
+        
+        if self.memory and tracemalloc.is_tracing():
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            
+            if self._owns_tracemalloc:
+                tracemalloc.stop()
+            
+            paths['alloc'] = base + "_alloc.txt"
+            with open(paths['alloc'], 'w', encoding='utf-8') as f:
+                f.write(f"{self.name}\n")
+                f.write(f"Memoria actual: {current / 1024:,.1f} KiB | Pico: {peak / 1024:,.1f} KiB\n\n")
+                for stat in snapshot.statistics('lineno')[:TOP_ALLOCATIONS]:
+                    f.write(f"{stat}\n")
+        
+        logger.info("Profile guardado", extra={'profile': self.name, **paths})
+        return paths
+
+
+def start_profile(name: str, detached: bool = False) -> Optional[ProfileSession]:
+    """
+    Inicia una sesión si el profiling está activo y la ejecución fue muestreada
+    
+    Las sesiones no se anidan: si ya hay una activa en el thread, la interna
+    queda incluida en la externa. Una sesión detached (ej: la de una página de
+    Streamlit, que st.rerun() puede interrumpir sin llegar a stop_profile())
+    solo la reemplaza la siguiente sesión detached, que la cierra antes de
+    abrirse; las sesiones comunes dentro de ella no la tocan.
+    
+    Args:
+        name: Nombre del bloque (se usa en el nombre de archivo)
+        detached: La sesión puede quedar sin cerrar
+    
+    Returns:
+        La sesión iniciada o None
+    """
+    if not _settings['enabled']:
+        return None
+    
+    stale = getattr(_local, 'session', None)
+    if stale is not None:
+        if not (detached and getattr(_local, 'detached', False)):
+            return None
+        stop_profile(stale)
+    
+    if random.random() >= _settings['sample_rate']:
+        return None
+    
+    session = ProfileSession(name, _settings['cpu'], _settings['memory'], _settings['output_dir'])
+    session.start()
+    _local.session = session
+    _local.detached = detached
+    return session
+
+
+def detach_profile(session: Optional[ProfileSession]):
+    """
+    Marca una sesión como cerrable por la siguiente start_profile(detached=True)
+    
+    Para bloques que pueden terminar sin llegar a stop_profile() (scripts de
+    Streamlit interrumpidos por st.stop()/st.rerun()).
+    """
+    if session is not None and getattr(_local, 'session', None) is session:
+        _local.detached = True
+
+
+def stop_profile(session: Optional[ProfileSession]) -> Dict[str, str]:
+    """
+    Cierra una sesión iniciada con start_profile()
+    """
+    if session is None:
+        return {}
+    
+    if getattr(_local, 'session', None) is session:
+        _local.session = None
+        _local.detached = False
+    
+    return session.stop()
+
+
+@contextmanager
+def profile_section(name: str):
+    """
+    Perfila un bloque de código si MLMONITOR_PROFILE está activo
+    
+    Args:
+        name: Nombre del bloque
+    """
+    session = start_profile(name)
+    try:
+        yield session
+    finally:
+        stop_profile(session)
+
+
+def profiled(name: Optional[str] = None):
+    """
+    Decorador equivalente a profile_section (sin costo si está deshabilitado)
+    
+    Args:
+        name: Nombre del bloque (por defecto modulo.funcion)
+    """
+    def decorator(func):
+        section = name or f"{func.__module__}.{func.__qualname__}"
+        
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _settings['enabled']:
+                return func(*args, **kwargs)
+            with profile_section(section):
+                return func(*args, **kwargs)
+        
+        return wrapper
+    
+    return decorator
+
+
+configure_profiling()
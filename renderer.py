@@ -0,0 +1,283 @@
+"""
+Módulo de Renderizado por Lotes
+Genera los gráficos y reportes de output/ en paralelo, salteando productos sin cambios
+"""
+
+import contextlib
+import io
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+try:
+    from .logger import get_logger, configure_logging
+    from .metrics import counter, timed
+    from .utils import generate_report, save_report
+except ImportError:
+    from logger import get_logger, configure_logging
+    from metrics import counter, timed
+    from utils import generate_report, save_report
+
+
+logger = get_logger(__name__)
+
+# Destino por defecto y manifiesto de caché dentro de él
+OUTPUT_DIR = "output"
+MANIFEST_NAME = ".render_manifest.json"
+
+# Gráficos disponibles: tipo -> patrón del archivo
+RENDER_KINDS = {
+    'evolution': "price_evolution_{product_id}.png",
+    'distribution': "price_distribution_{product_id}.png",
+}
+
+# 300 dpi cuadruplica el tiempo de savefig respecto de 150 y no aporta en pantalla
+DEFAULT_DPI = 150
+
+rendered_counter = counter("renderer_products_total", "Productos procesados por el renderer")
+
+
+def _init_worker():
+    """
+    Inicializa cada proceso del pool con el backend sin ventana de Matplotlib
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+
+
+def _render_product(task: Dict) -> Dict:
+    """
+    Renderiza los gráficos de un producto (se ejecuta en un proceso del pool)
+    
+    Args:
+        task: product_id, title, history [(price, scraped_at)], output_dir, kinds, dpi
+    
+    Returns:
+        Diccionario con product_id, files y seconds (o error)
+    """
+    start = time.perf_counter()
+    product_id = task['product_id']
+    
+    try:
+        try:
+            from .analyzer import PriceAnalyzer
+        except ImportError:
+            from analyzer import PriceAnalyzer
+        
+        analyzer = PriceAnalyzer([
+            {'price': price, 'scraped_at': scraped_at, 'title': task['title']}
+            for price, scraped_at in task['history']
+        ])
+        
+        files = []
+        # PriceAnalyzer informa cada archivo por stdout; en el pool sería ruido
+        with contextlib.redirect_stdout(io.StringIO()):
+            for kind in task['kinds']:
+                path = os.path.join(task['output_dir'], RENDER_KINDS[kind].format(product_id=product_id))
+                if kind == 'evolution':
+                    analyzer.plot_price_evolution(path, interactive=False, dpi=task['dpi'])
+                else:
+                    analyzer.plot_price_distribution(path, dpi=task['dpi'])
+                files.append(path)
+        
+        return {'product_id': product_id, 'files': files, 'seconds': time.perf_counter() - start}
+    
+    except Exception as e:
+        return {'product_id': product_id, 'error': str(e), 'seconds': time.perf_counter() - start}
+
+
+class BatchRenderer:
+    """
+    Renderizador por lotes de gráficos de productos
+    
+    Reparte los productos en un ProcessPoolExecutor (backend Agg) y guarda un
+    manifiesto con la clave (producto, último scraped_at) de cada render: los
+    productos sin precios nuevos desde la última corrida se saltean.
+    """
+    
+    def __init__(self, db, output_dir: str = OUTPUT_DIR, workers: Optional[int] = None,
+                 dpi: int = DEFAULT_DPI, kinds: Tuple[str, ...] = tuple(RENDER_KINDS)):
+        """
+        Inicializa el renderizador
+        
+        Args:
+            db: Instancia de PriceDatabase
+            output_dir: Carpeta de salida
+            workers: Procesos del pool (por defecto os.cpu_count())
+            dpi: Resolución de los PNG
+            kinds: Gráficos a generar ('evolution', 'distribution')
+        """
+        unknown = set(kinds) - set(RENDER_KINDS)
+        if unknown:
+            raise ValueError(f"Tipos de gráfico inválidos: {sorted(unknown)}")
+        
+        self.db = db
+        self.output_dir = output_dir
+        self.workers = workers or os.cpu_count() or 1
+        self.dpi = dpi
+        self.kinds = tuple(kinds)
+        self.manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+    
+    def _load_manifest(self) -> Dict[str, Dict]:
+        try:
+            with open(self.manifest_path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+    
+    def _save_manifest(self, manifest: Dict[str, Dict]):
+        # Escritura atómica: un render interrumpido no deja el manifiesto a medias
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, self.manifest_path)
+    
+    def _cache_key(self, summary: Dict) -> str:
+        return f"{summary['last_at']}|{self.dpi}|{','.join(self.kinds)}"
+    
+    def _is_fresh(self, entry: Optional[Dict], key: str) -> bool:
+        return bool(entry) and entry.get('key') == key and all(os.path.exists(path) for path in entry['files'])
+    
+    def _tasks(self, product_ids: List[str], summaries: Dict[str, Dict]) -> Iterator[Dict]:
+        """
+        Arma una tarea por producto leyendo los históricos en lotes ordenados por producto
+        """
+        current, history = None, []
+        for rows in self.db.iter_price_rows(product_ids=product_ids):
+            for product_id, price, scraped_at in rows:
+                if product_id != current:
+                    if current is not None:
+                        yield self._task(current, history, summaries)
+                    current, history = product_id, []
+                history.append((price, scraped_at))
+        
+        if current is not None:
+            yield self._task(current, history, summaries)
+    
+    def _task(self, product_id: str, history: List[Tuple], summaries: Dict[str, Dict]) -> Dict:
+        return {
+            'product_id': product_id,
+            'title': summaries[product_id]['title'],
+            'history': history,
+            'output_dir': self.output_dir,
+            'kinds': self.kinds,
+            'dpi': self.dpi,
+        }
+    
+    @timed("renderer_batch")
+    def render(self, product_ids: Optional[List[str]] = None, force: bool = False,
+               report: bool = True) -> Dict:
+        """
+        Renderiza los gráficos de los productos indicados
+        
+        Args:
+            product_ids: Productos a renderizar (por defecto todos)
+            force: Ignora la caché y vuelve a renderizar todo
+            report: Genera además reporte_<fecha>.txt con los productos procesados
+        
+        Returns:
+            Diccionario con rendered, skipped, failed, files, seconds y products_per_s
+        """
+        start = time.perf_counter()
+        os.makedirs(self.output_dir, exist_ok=True)
+        
+        summaries = self.db.get_product_summaries(product_ids)
+        manifest = {} if force else self._load_manifest()
+        
+        stale = [
+            product_id for product_id, summary in summaries.items()
+            if not self._is_fresh(manifest.get(product_id), self._cache_key(summary))
+        ]
+        skipped = len(summaries) - len(stale)
+        rendered, failed, files = 0, 0, 0
+        
+        if stale:
+            # Como máximo unas pocas tareas por proceso en vuelo: los históricos no se
+            # materializan todos a la vez
+            max_in_flight = self.workers * 4
+            with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker) as pool:
+                pending = set()
+                tasks = self._tasks(stale, summaries)
+                
+                while True:
+                    for task in tasks:
+                        pending.add(pool.submit(_render_product, task))
+                        if len(pending) >= max_in_flight:
+                            break
+                    
+                    if not pending:
+                        break
+                    
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        result = future.result()
+                        product_id = result['product_id']
+                        
+                        if 'error' in result:
+                            failed += 1
+                            rendered_counter.inc(status='failed')
+                            logger.error("Error renderizando producto: %s", result['error'],
+                                         extra={'product_id': product_id})
+                            continue
+                        
+                        rendered += 1
+                        files += len(result['files'])
+                        rendered_counter.inc(status='rendered')
+                        manifest[product_id] = {
+                            'key': self._cache_key(summaries[product_id]),
+                            'files': result['files'],
+                        }
+            
+            self._save_manifest(manifest)
+        
+        rendered_counter.inc(skipped, status='skipped')
+        
+        if report and summaries:
+            with contextlib.redirect_stdout(io.StringIO()):
+                save_report(
+                    generate_report([
+                        {'id': product_id, 'title': summary['title'], 'price': summary['last_price']}
+                        for product_id, summary in summaries.items()
+                    ]),
+                    os.path.join(self.output_dir, f"reporte_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt")
+                )
+        
+        seconds = time.perf_counter() - start
+        stats = {
+            'rendered': rendered,
+            'skipped': skipped,
+            'failed': failed,
+            'files': files,
+            'seconds': round(seconds, 3),
+            'products_per_s': round(rendered / seconds, 2) if seconds > 0 else None,
+        }
+        logger.info("Render por lotes completado", extra=stats)
+        return stats
+
+
+if __name__ == "__main__":
+    import argparse
+    
+    try:
+        from .database import PriceDatabase
+    except ImportError:
+        from database import PriceDatabase
+    
+    parser = argparse.ArgumentParser(description="Renderiza gráficos de productos en paralelo")
+    parser.add_argument('product_ids', nargs='*', help="Productos a renderizar (por defecto todos)")
+    parser.add_argument('--db', default="data/prices.db")
+    parser.add_argument('--output', default=OUTPUT_DIR)
+    parser.add_argument('--workers', type=int)
+    parser.add_argument('--dpi', type=int, default=DEFAULT_DPI)
+    parser.add_argument('--force', action='store_true', help="Ignora la caché de renders")
+    args = parser.parse_args()
+    
+    configure_logging("INFO")
+    renderer = BatchRenderer(PriceDatabase(args.db), args.output, args.workers, args.dpi)
+    stats = renderer.render(args.product_ids or None, force=args.force)
+    
+    print(f"✓ {stats['rendered']} renderizados, {stats['skipped']} sin cambios, {stats['failed']} con error "
+          f"en {stats['seconds']}s ({stats['products_per_s']} productos/s)")
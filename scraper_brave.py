@@ -13,9 +13,27 @@ from selenium.common.exceptions import TimeoutException
 import time
 import re
 import os
+import logging
 from typing import List, Dict
 from datetime import datetime
 
+try:
+    from .logger import get_logger, configure_logging
+    from .metrics import timed, counter
+except ImportError:
+    from logger import get_logger, configure_logging
+    from metrics import timed, counter
+
+
+logger = get_logger(__name__)
+
+# Las instancias con debug=True loggean por un hijo en DEBUG: el nivel del
+# logger del módulo, compartido con las demás instancias, no cambia
+debug_logger = logger.getChild("debug")
+debug_logger.setLevel(logging.DEBUG)
+
+products_counter = counter("scraper_products_total", "Productos extraídos por el scraper")
+
 
 class MercadoLibreScraper:
     """
@@ -27,6 +45,9 @@ class MercadoLibreScraper:
         self.headless = headless
         self.base_url = "https://listado.mercadolibre.com.ar"
         self.driver = None
+        
+        # En modo debug se habilitan los eventos por producto (solo de esta instancia)
+        self.logger = debug_logger if debug else logger
     
     def _find_brave_path(self):
         """Encuentra la ruta de Brave Browser"""
@@ -50,13 +71,13 @@ class MercadoLibreScraper:
         brave_path = self._find_brave_path()
         
         if not brave_path:
-            print("❌ No se encontró Brave Browser")
-            print("\n💡 OPCIONES:")
-            print("   1. Instalar Chrome: https://www.google.com/chrome/")
-            print("   2. O decime dónde está instalado Brave")
+            self.logger.error(
+                "No se encontró Brave Browser. Opciones: instalar Chrome "
+                "(https://www.google.com/chrome/) o indicar dónde está instalado Brave"
+            )
             raise Exception("Brave no encontrado")
         
-        print(f"✅ Brave encontrado: {brave_path}")
+        self.logger.info("Brave encontrado: %s", brave_path)
         
         chrome_options = Options()
         chrome_options.binary_location = brave_path
@@ -76,47 +97,53 @@ class MercadoLibreScraper:
         chrome_options.add_experimental_option('useAutomationExtension', False)
         
         try:
-            self.driver = webdriver.Chrome(options=chrome_options)
+            with timed("scraper_driver_start", "Arranque del navegador"):
+                self.driver = webdriver.Chrome(options=chrome_options)
             self.driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
-            print("✅ Navegador iniciado correctamente")
+            self.logger.info("Navegador iniciado correctamente")
         except Exception as e:
-            print(f"❌ Error iniciando navegador: {e}")
-            print("\n💡 SOLUCIÓN:")
-            print("   Brave usa ChromeDriver igual que Chrome.")
-            print("   Selenium debería descargarlo automáticamente.")
+            self.logger.error(
+                "Error iniciando navegador: %s (Brave usa ChromeDriver igual que Chrome; "
+                "Selenium debería descargarlo automáticamente)", e
+            )
             raise
     
+    @timed("scraper_search", "Búsqueda completa (driver + carga + extracción)")
     def search_products(self, query: str, limit: int = 10) -> List[Dict]:
         """Busca productos en MercadoLibre"""
-        print(f"🔍 Buscando: {query}")
+        start = time.perf_counter()
+        self.logger.info("Buscando productos", extra={'query': query})
         
         try:
             self._init_driver()
             
             search_url = f"{self.base_url}/{query.replace(' ', '-')}"
-            print(f"🌐 Accediendo a: {search_url}")
-            
-            self.driver.get(search_url)
+            self.logger.debug("Accediendo a URL", extra={'query': query, 'url': search_url})
             
-            wait = WebDriverWait(self.driver, 20)
-            
-            try:
-                wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, "li.ui-search-layout__item")))
-                print("✅ Productos cargados")
-            except TimeoutException:
-                print("⏱️ Timeout esperando productos, intentando de todas formas...")
-            
-            time.sleep(3)
+            with timed("scraper_page_load", "Carga de la página de resultados"):
+                self.driver.get(search_url)
+                
+                wait = WebDriverWait(self.driver, 20)
+                
+                try:
+                    wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, "li.ui-search-layout__item")))
+                    self.logger.debug("Productos cargados", extra={'query': query})
+                except TimeoutException:
+                    self.logger.warning("Timeout esperando productos, intentando de todas formas", extra={'query': query})
+                
+                time.sleep(3)
             
             products_elements = self.driver.find_elements(By.CSS_SELECTOR, "li.ui-search-layout__item")
             
             if not products_elements:
-                print("❌ No se encontraron productos")
+                self.logger.warning("No se encontraron productos", extra={'query': query})
                 return []
             
-            print(f"📦 {len(products_elements)} elementos encontrados")
+            self.logger.debug("Elementos encontrados", extra={'query': query, 'count': len(products_elements)})
             
             results = []
+            # Se evalúa una sola vez: con DEBUG deshabilitado el loop no formatea nada
+            debug_enabled = self.logger.isEnabledFor(logging.DEBUG)
             
             for i, elem in enumerate(products_elements[:limit * 2]):
                 try:
@@ -125,29 +152,32 @@ class MercadoLibreScraper:
                     if product and product.get('price', 0) > 0:
                         results.append(product)
                         
-                        if self.debug:
-                            print(f"   ✓ {len(results)}: {product['title'][:50]}")
+                        if debug_enabled:
+                            self.logger.debug("Producto agregado: %s", product['title'][:50],
+                                         extra={'product_id': product['id'], 'price': product['price']})
                     
                     if len(results) >= limit:
                         break
                         
                 except Exception as e:
-                    if self.debug:
-                        print(f"   ⚠️ Error: {e}")
+                    if debug_enabled:
+                        self.logger.debug("Error procesando elemento: %s", e, extra={'query': query})
                     continue
             
-            print(f"✅ {len(results)} productos extraídos correctamente")
-            
-            for i, p in enumerate(results[:3], 1):
-                print(f"   {i}. {p['title'][:55]}... - ${p['price']:,.0f}")
+            products_counter.inc(len(results))
+            self.logger.info("Productos extraídos", extra={
+                'query': query,
+                'count': len(results),
+                'duration_ms': round((time.perf_counter() - start) * 1000, 2)
+            })
             
             return results
             
         except Exception as e:
-            print(f"❌ Error en búsqueda: {e}")
-            if self.debug:
-                import traceback
-                traceback.print_exc()
+            self.logger.error("Error en búsqueda: %s", e, exc_info=self.debug, extra={
+                'query': query,
+                'duration_ms': round((time.perf_counter() - start) * 1000, 2)
+            })
             return []
         
         # NO cerrar el driver aquí - mantenerlo abierto para búsquedas siguientes
@@ -155,6 +185,7 @@ class MercadoLibreScraper:
         #     if self.driver:
         #         self.driver.quit()
     
+    @timed("scraper_extract_product", "Extracción de un producto del DOM")
     def _extract_product_info(self, element) -> Dict:
         """Extrae información de un producto"""
         try:
@@ -185,8 +216,7 @@ class MercadoLibreScraper:
                     pass
             
             if not title or len(title) < 10:
-                if self.debug:
-                    print(f"   ⚠️ Sin título válido")
+                self.logger.debug("Sin título válido")
                 return None
             
             # Precio - múltiples estrategias
@@ -223,8 +253,7 @@ class MercadoLibreScraper:
                     pass
             
             if price < 100:
-                if self.debug:
-                    print(f"   ⚠️ Precio inválido: {title[:30]}")
+                self.logger.debug("Precio inválido: %s", title[:30])
                 return None
             
             # URL
@@ -276,8 +305,8 @@ class MercadoLibreScraper:
             except:
                 pass
             
-            if self.debug:
-                print(f"   ✅ {title[:40]}... - ${price:,.0f}")
+            if self.logger.isEnabledFor(logging.DEBUG):
+                self.logger.debug("Producto extraído: %s", title[:40], extra={'product_id': product_id, 'price': price})
             
             return {
                 'id': product_id,
@@ -291,8 +320,7 @@ class MercadoLibreScraper:
             }
             
         except Exception as e:
-            if self.debug:
-                print(f"   ❌ Error extrayendo: {e}")
+            self.logger.debug("Error extrayendo producto: %s", e)
             return None
 
 
@@ -302,7 +330,7 @@ class MercadoLibreScraper:
             try:
                 self.driver.quit()
                 self.driver = None
-                print("🔒 Navegador cerrado")
+                self.logger.info("Navegador cerrado")
             except:
                 pass
 
@@ -318,6 +346,8 @@ def search_product(query: str, limit: int = 10, debug: bool = False) -> List[Dic
 
 
 if __name__ == "__main__":
+    configure_logging("INFO")
+    
     print("="*70)
     print("  SCRAPER MERCADOLIBRE - BRAVE BROWSER")
     print("  Datos 100% REALES")
@@ -0,0 +1,227 @@
+"""
+Módulo de Sketches de Cuantiles
+t-digest mergeable para percentiles y distribuciones con memoria acotada
+"""
+
+import bisect
+import json
+import math
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+
+DEFAULT_COMPRESSION = 100
+
+
+class TDigest:
+    """
+    t-digest (variante "merging" de Dunning)
+    
+    Resume cualquier cantidad de observaciones en O(compression) centroides.
+    Dos digests se combinan con merge(), por lo que pueden construirse por
+    producto, categoría o shard y agregarse después sin volver a los datos.
+    """
+    
+    def __init__(self, compression: float = DEFAULT_COMPRESSION):
+        self.compression = compression
+        self.means: List[float] = []
+        self.weights: List[float] = []
+        self.total = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+        self._buffer: List[Tuple[float, float]] = []
+        self._buffer_limit = int(5 * compression)
+    
+    @classmethod
+    def from_values(cls, values: Iterable[float], compression: float = DEFAULT_COMPRESSION) -> 'TDigest':
+        digest = cls(compression)
+        digest._buffer = [(float(value), 1.0) for value in values]
+        digest._compress()
+        return digest
+    
+    def add(self, value: float, weight: float = 1.0):
+        self._buffer.append((float(value), weight))
+        if len(self._buffer) >= self._buffer_limit:
+            self._compress()
+    
+    def merge(self, other: 'TDigest') -> 'TDigest':
+        """
+        Incorpora otro digest (in place) y devuelve self
+        """
+        other._compress()
+        # Los extremos reales no sobreviven en los centroides: se combinan aparte
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+        self._buffer.extend(zip(other.means, other.weights))
+        self._compress()
+        return self
+    
+    def _k_limit(self, q: float) -> float:
+        """
+        Límite superior de cuantil para un centroide que empieza en q (escala k1)
+        """
+        k = self.compression / (2 * math.pi) * math.asin(2 * q - 1) + 1
+        if k >= self.compression / 4:
+            return 1.0
+        return (math.sin(k * 2 * math.pi / self.compression) + 1) / 2
+    
+    def _compress(self):
+        if not self._buffer:
+            return
+        
+        points = sorted(list(zip(self.means, self.weights)) + self._buffer)
+        self._buffer = []
+        
+        total = sum(weight for _, weight in points)
+        self.min = points[0][0] if self.min is None else min(self.min, points[0][0])
+        self.max = points[-1][0] if self.max is None else max(self.max, points[-1][0])
+        
+        means, weights = [], []
+        cumulative = 0.0
+        mean, weight = points[0]
+        limit = self._k_limit(0.0) * total
+        
+        for value, value_weight in points[1:]:
+            if cumulative + weight + value_weight <= limit:
+                weight += value_weight
+                mean += (value - mean) * value_weight / weight
+            else:
+                means.append(mean)
+                weights.append(weight)
+                cumulative += weight
+                limit = self._k_limit(cumulative / total) * total
+                mean, weight = value, value_weight
+        
+        means.append(mean)
+        weights.append(weight)
+        
+        self.means, self.weights, self.total = means, weights, total
+    
+    @property
+    def count(self) -> float:
+        return self.total + sum(weight for _, weight in self._buffer)
+    
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        Estima el cuantil q (0 a 1) interpolando entre centroides
+        """
+        self._compress()
+        if not self.means:
+            return None
+        if q <= 0:
+            return self.min
+        if q >= 1:
+            return self.max
+        if len(self.means) == 1:
+            return self.means[0]
+        
+        target = q * self.total
+        cumulative = 0.0
+        for i, weight in enumerate(self.weights):
+            center = cumulative + weight / 2
+            if target < center:
+                if i == 0:
+                    # Entre el mínimo y el centro del primer centroide
+                    return self.min + (self.means[0] - self.min) * target / center
+                previous_center = cumulative - self.weights[i - 1] / 2
+                fraction = (target - previous_center) / (center - previous_center)
+                return self.means[i - 1] + (self.means[i] - self.means[i - 1]) * fraction
+            cumulative += weight
+        
+        # Entre el centro del último centroide y el máximo
+        last_center = self.total - self.weights[-1] / 2
+        fraction = (target - last_center) / (self.total - last_center)
+        return self.means[-1] + (self.max - self.means[-1]) * fraction
+    
+    def quantiles(self, qs: Sequence[float]) -> Dict[float, Optional[float]]:
+        return {q: self.quantile(q) for q in qs}
+    
+    def cdf(self, value: float) -> float:
+        """
+        Fracción estimada de observaciones <= value
+        """
+        self._compress()
+        if not self.means:
+            return 0.0
+        if value < self.min:
+            return 0.0
+        if value >= self.max:
+            return 1.0
+        
+        centers = []
+        cumulative = 0.0
+        for weight in self.weights:
+            centers.append(cumulative + weight / 2)
+            cumulative += weight
+        
+        # Interpolación lineal sobre los puntos (min, 0), (mean_i, center_i), (max, total)
+        xs = [self.min] + self.means + [self.max]
+        ys = [0.0] + centers + [self.total]
+        i = bisect.bisect_right(xs, value)
+        x0, x1, y0, y1 = xs[i - 1], xs[i], ys[i - 1], ys[i]
+        position = y0 if x1 == x0 else y0 + (y1 - y0) * (value - x0) / (x1 - x0)
+        return position / self.total
+    
+    def histogram(self, bins: int = 20, range_: Optional[Tuple[float, float]] = None) -> Tuple[List[float], List[float]]:
+        """
+        Histograma estimado a partir de la CDF
+        
+        Args:
+            bins: Cantidad de intervalos
+            range_: (mínimo, máximo); por defecto el rango observado
+        
+        Returns:
+            (bordes, conteos) con len(bordes) == bins + 1
+        """
+        self._compress()
+        if not self.means:
+            return [], []
+        
+        low, high = range_ or (self.min, self.max)
+        if high <= low:
+            return [low, high], [self.total]
+        
+        step = (high - low) / bins
+        edges = [low + step * i for i in range(bins + 1)]
+        cdfs = [self.cdf(edge) for edge in edges]
+        cdfs[0] = 0.0 if range_ is None else cdfs[0]
+        counts = [(cdfs[i + 1] - cdfs[i]) * self.total for i in range(bins)]
+        return edges, counts
+    
+    def to_dict(self) -> Dict:
+        self._compress()
+        return {
+            'compression': self.compression,
+            'min': self.min,
+            'max': self.max,
+            'means': self.means,
+            'weights': self.weights,
+        }
+    
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), separators=(',', ':'))
+    
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'TDigest':
+        digest = cls(data.get('compression', DEFAULT_COMPRESSION))
+        digest.means = list(data.get('means', []))
+        digest.weights = list(data.get('weights', []))
+        digest.total = float(sum(digest.weights))
+        digest.min = data.get('min')
+        digest.max = data.get('max')
+        return digest
+    
+    @classmethod
+    def from_json(cls, payload: str) -> 'TDigest':
+        return cls.from_dict(json.loads(payload))
+
+
+def merge_digests(digests: Iterable[TDigest], compression: float = DEFAULT_COMPRESSION) -> TDigest:
+    """
+    Combina varios digests (ej: el mismo scope en distintos shards)
+    """
+    merged = TDigest(compression)
+    for digest in digests:
+        if digest is not None:
+            merged.merge(digest)
+    return merged
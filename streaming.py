@@ -0,0 +1,214 @@
+"""
+Módulo de Estadísticas Incrementales
+Estadísticas por producto actualizables precio a precio en O(1)
+"""
+
+import json
+import math
+from typing import Dict, List, Optional
+
+
+def _interpolated_quantile(values: List[float], q: float) -> float:
+    """
+    Cuantil exacto con interpolación lineal (mismo criterio que pandas)
+    """
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q
+    lower = math.floor(position)
+    upper = math.ceil(position)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+class P2Quantile:
+    """
+    Estimador streaming de un cuantil (algoritmo P² de Jain & Chlamtac)
+    
+    Mantiene cinco marcadores, por lo que el estado es constante sin importar
+    cuántas observaciones se agreguen. Con menos de cinco valores el resultado
+    es exacto.
+    """
+    
+    def __init__(self, q: float = 0.5):
+        self.q = q
+        self.initial: List[float] = []
+        self.heights: Optional[List[float]] = None
+        self.positions: Optional[List[float]] = None
+        self.desired: Optional[List[float]] = None
+    
+    def add(self, x: float):
+        if self.heights is None:
+            self.initial.append(x)
+            if len(self.initial) == 5:
+                q = self.q
+                self.heights = sorted(self.initial)
+                self.positions = [1, 2, 3, 4, 5]
+                self.desired = [1, 1 + 2 * q, 1 + 4 * q, 3 + 2 * q, 5]
+                self.initial = []
+            return
+        
+        h, n, q = self.heights, self.positions, self.q
+        
+        # Celda donde cae la observación (ajustando extremos)
+        if x < h[0]:
+            h[0] = x
+            k = 0
+        elif x >= h[4]:
+            h[4] = x
+            k = 3
+        else:
+            k = next(i for i in range(1, 5) if x < h[i]) - 1
+        
+        for i in range(k + 1, 5):
+            n[i] += 1
+        
+        for i, increment in enumerate((0, q / 2, q, (1 + q) / 2, 1)):
+            self.desired[i] += increment
+        
+        # Ajuste de los marcadores centrales
+        for i in range(1, 4):
+            d = self.desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                parabolic = h[i] + d / (n[i + 1] - n[i - 1]) * (
+                    (n[i] - n[i - 1] + d) * (h[i + 1] - h[i]) / (n[i + 1] - n[i]) +
+                    (n[i + 1] - n[i] - d) * (h[i] - h[i - 1]) / (n[i] - n[i - 1])
+                )
+                if h[i - 1] < parabolic < h[i + 1]:
+                    h[i] = parabolic
+                else:
+                    h[i] = h[i] + d * (h[i + d] - h[i]) / (n[i + d] - n[i])
+                n[i] += d
+    
+    def value(self) -> Optional[float]:
+        """
+        Estimación actual del cuantil (None sin observaciones)
+        """
+        if self.heights is not None:
+            return self.heights[2]
+        if not self.initial:
+            return None
+        return _interpolated_quantile(self.initial, self.q)
+    
+    def to_state(self) -> Dict:
+        return {
+            'q': self.q,
+            'initial': self.initial,
+            'heights': self.heights,
+            'positions': self.positions,
+            'desired': self.desired,
+        }
+    
+    @classmethod
+    def from_state(cls, state: Dict) -> 'P2Quantile':
+        estimator = cls(state.get('q', 0.5))
+        estimator.initial = state.get('initial') or []
+        estimator.heights = state.get('heights')
+        estimator.positions = state.get('positions')
+        estimator.desired = state.get('desired')
+        return estimator
+
+
+class RunningStats:
+    """
+    Estadísticas incrementales de un producto
+    
+    Media y varianza por el método de Welford, mínimo/máximo acumulados,
+    primer/último precio por fecha y mediana aproximada con P².
+    """
+    
+    # Columnas de la tabla price_stats (en orden)
+    COLUMNS = (
+        'product_id', 'count', 'mean', 'm2', 'min_price', 'max_price',
+        'first_price', 'first_at', 'last_price', 'last_at', 'prev_price', 'median_state'
+    )
+    
+    def __init__(self, product_id: str):
+        self.product_id = product_id
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min_price: Optional[float] = None
+        self.max_price: Optional[float] = None
+        self.first_price: Optional[float] = None
+        self.first_at: Optional[str] = None
+        self.last_price: Optional[float] = None
+        self.last_at: Optional[str] = None
+        self.prev_price: Optional[float] = None
+        self.median = P2Quantile(0.5)
+    
+    def update(self, price: float, scraped_at: str):
+        """
+        Incorpora una observación de precio
+        
+        Args:
+            price: Precio observado
+            scraped_at: Fecha ISO 8601 de la observación
+        """
+        self.count += 1
+        delta = price - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (price - self.mean)
+        
+        self.min_price = price if self.min_price is None else min(self.min_price, price)
+        self.max_price = price if self.max_price is None else max(self.max_price, price)
+        
+        # Las fechas ISO 8601 se comparan correctamente como texto
+        if self.first_at is None or scraped_at < self.first_at:
+            self.first_price, self.first_at = price, scraped_at
+        if self.last_at is None or scraped_at >= self.last_at:
+            self.prev_price = self.last_price
+            self.last_price, self.last_at = price, scraped_at
+        
+        self.median.add(price)
+    
+    @property
+    def std(self) -> Optional[float]:
+        """
+        Desviación estándar muestral (ddof=1, como pandas)
+        """
+        if self.count < 2:
+            return None
+        return math.sqrt(self.m2 / (self.count - 1))
+    
+    def as_statistics(self) -> Dict:
+        """
+        Estadísticas con las mismas claves que PriceAnalyzer.get_statistics
+        """
+        if self.count == 0:
+            return {}
+        
+        variation = 0.0
+        if self.count >= 2 and self.first_price:
+            variation = (self.last_price - self.first_price) / self.first_price * 100
+        
+        return {
+            'precio_actual': self.last_price,
+            'precio_minimo': self.min_price,
+            'precio_maximo': self.max_price,
+            'precio_promedio': self.mean,
+            'precio_mediana': self.median.value(),
+            'desviacion_estandar': self.std,
+            'variacion_porcentual': variation,
+            'total_registros': self.count,
+            'fecha_primer_registro': self.first_at,
+            'fecha_ultimo_registro': self.last_at,
+        }
+    
+    def to_row(self) -> tuple:
+        return (
+            self.product_id, self.count, self.mean, self.m2, self.min_price, self.max_price,
+            self.first_price, self.first_at, self.last_price, self.last_at, self.prev_price,
+            json.dumps(self.median.to_state())
+        )
+    
+    @classmethod
+    def from_row(cls, row) -> 'RunningStats':
+        """
+        Reconstruye el estado desde una fila de price_stats (tupla o sqlite3.Row)
+        """
+        values = dict(zip(cls.COLUMNS, tuple(row)))
+        stats = cls(values['product_id'])
+        for column in cls.COLUMNS[1:-1]:
+            setattr(stats, column, values[column])
+        stats.median = P2Quantile.from_state(json.loads(values['median_state']))
+        return stats
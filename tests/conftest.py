@@ -0,0 +1,22 @@
+"""
+Fixtures compartidas de los tests
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import PriceDatabase
+
+
+@pytest.fixture
+def db(tmp_path):
+    return PriceDatabase(str(tmp_path / "prices.db"))
+
+
+def make_product(product_id, price, title=None, **extra):
+    return {'id': product_id, 'title': title or f"Producto {product_id}", 'price': price,
+            'seller': 'test', 'url': f"https://example.com/{product_id}", **extra}
@@ -0,0 +1,65 @@
+"""
+Tests de reglas y motor de alertas
+"""
+
+from alerts import AlertEngine, evaluate_rule, RULE_BELOW_TARGET, RULE_DROP_PERCENT, RULE_NEW_LOW
+from conftest import make_product
+
+
+def test_global_rule_fires_for_every_product_in_batch(db):
+    delivered = []
+    engine = AlertEngine(db, sinks=[delivered.append]).attach()
+    db.add_alert_rule(RULE_DROP_PERCENT, threshold=20)
+    
+    ids = [f"MLA{i}" for i in range(5)]
+    db.save_prices([make_product(product_id, 1000) for product_id in ids])
+    db.save_prices([make_product(product_id, 500) for product_id in ids])
+    
+    assert engine.flush(timeout=5)
+    assert sorted(event['product_id'] for event in delivered) == ids
+    assert len(db.get_alert_events()) == 5
+
+
+def _change(price, previous_price=None, **extra):
+    return {'product_id': 'MLA1', 'price': price, 'previous_price': previous_price,
+            'scraped_at': '2024-01-01T00:00:00', **extra}
+
+
+def test_below_target_fires_only_when_crossing():
+    rule = {'id': 1, 'kind': RULE_BELOW_TARGET, 'threshold': 100}
+    
+    assert evaluate_rule(rule, _change(90, previous_price=120)) is not None
+    assert evaluate_rule(rule, _change(90)) is not None
+    assert evaluate_rule(rule, _change(80, previous_price=90)) is None
+    assert evaluate_rule(rule, _change(110, previous_price=120)) is None
+
+
+def test_drop_percent_uses_threshold():
+    rule = {'id': 1, 'kind': RULE_DROP_PERCENT, 'threshold': 20}
+    
+    assert evaluate_rule(rule, _change(80, previous_price=100)) is not None
+    assert evaluate_rule(rule, _change(81, previous_price=100)) is None
+    assert evaluate_rule(rule, _change(80)) is None
+
+
+def test_new_low_requires_previous_minimum():
+    rule = {'id': 1, 'kind': RULE_NEW_LOW, 'threshold': None}
+    
+    assert evaluate_rule(rule, _change(90, previous_price=100, previous_min=95, min_price=90)) is not None
+    assert evaluate_rule(rule, _change(95, previous_price=100, previous_min=95, min_price=95)) is None
+    assert evaluate_rule(rule, _change(90, min_price=90)) is None
+
+
+def test_alert_events_dedup_per_product(db):
+    rule_id = db.add_alert_rule(RULE_DROP_PERCENT, threshold=20)
+    db.save_prices([make_product("MLA1", 100), make_product("MLA2", 100)])
+    events = [
+        {'rule_id': rule_id, 'product_id': product_id, 'kind': RULE_DROP_PERCENT, 'price': 50,
+         'previous_price': 100, 'threshold': 20, 'owner': None, 'message': "Bajó",
+         'scraped_at': '2024-01-01T00:00:00'}
+        for product_id in ("MLA1", "MLA2")
+    ]
+    
+    assert len(db.save_alert_events(events)) == 2
+    assert db.save_alert_events(events) == []
+    assert len(db.get_alert_events()) == 2
@@ -0,0 +1,229 @@
+"""
+Tests de los cálculos vectorizados de analyzer.py
+"""
+
+import sqlite3
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from analyzer import (compute_indicators, correlate_prices, price_grid, _buy_signals, AnomalyDetector,
+                      PriceForecaster, SIGNAL_MESSAGES, SIGNAL_DEFAULT, FORECAST_ALPHAS, FORECAST_TREND_WINDOW)
+from conftest import make_product
+
+
+def _daily(prices, product_id="MLA1", start="2024-01-01"):
+    return pd.DataFrame({
+        'product_id': product_id,
+        'price': np.asarray(prices, dtype=float),
+        'scraped_at': pd.date_range(start, periods=len(prices), freq='D'),
+    })
+
+
+def test_indicators_on_linear_series():
+    prices = np.arange(1, 11, dtype=float)
+    result = compute_indicators(_daily(prices))
+    last = result.iloc[-1]
+    
+    # Ventana temporal '7D' = (t - 7 días, t]: días 4 a 10
+    assert last['mean_7d'] == pytest.approx(7.0)
+    assert last['median_7d'] == pytest.approx(7.0)
+    assert last['min_7d'] == 4.0
+    assert last['min_30d'] == 1.0
+    assert last['zscore'] == pytest.approx((10 - prices.mean()) / prices.std(ddof=1))
+    assert (result['drawdown_pct'] == 0).all()
+    assert np.isnan(result['zscore'].iloc[0])
+
+
+def test_indicators_handle_irregular_timestamps_and_drawdown():
+    prices = pd.DataFrame({
+        'product_id': "MLA1",
+        'price': [100.0, 120.0, 90.0],
+        'scraped_at': pd.to_datetime(["2024-01-01", "2024-01-09", "2024-01-10"]),
+    })
+    result = compute_indicators(prices)
+    
+    # El 1/1 queda fuera de la ventana de 7 días del 9/1
+    assert result['mean_7d'].tolist() == [100.0, 120.0, 105.0]
+    assert result['drawdown_pct'].iloc[-1] == pytest.approx(-25.0)
+
+
+def test_indicators_do_not_mix_products():
+    prices = pd.concat([_daily([10.0] * 5, "MLA1"), _daily([1000.0] * 5, "MLA2")], ignore_index=True)
+    result = compute_indicators(prices)
+    
+    assert (result.loc[result['product_id'] == "MLA1", 'mean_30d'] == 10.0).all()
+    assert (result.loc[result['product_id'] == "MLA2", 'min_30d'] == 1000.0).all()
+    assert result['ewma'].tolist() == pytest.approx([10.0] * 5 + [1000.0] * 5)
+
+
+def test_buy_signals_scores():
+    latest = pd.DataFrame({
+        'price': [100.0, 100.0, 100.0, 100.0, 100.0],
+        'zscore': [-1.5, -1.5, 0.5, 2.5, -3.0],
+        'min_30d': [100.0, 80.0, 80.0, 80.0, 100.0],
+        'ewma': [110.0, 110.0, 100.0, 100.0, 110.0],
+    })
+    signals = _buy_signals(latest, [30, 30, 30, 30, 3])
+    
+    assert signals['score'].tolist()[:4] == [5, 4, 3, 1]
+    assert signals['signal'].tolist()[:4] == [SIGNAL_MESSAGES[0], SIGNAL_MESSAGES[1], SIGNAL_MESSAGES[2],
+                                              SIGNAL_DEFAULT]
+    assert np.isnan(signals['score'].iloc[4])
+    assert signals['signal'].iloc[4] == "Necesitas más datos históricos"
+
+
+def _flagged(prices):
+    flagged = AnomalyDetector().detect(_daily(prices))
+    return {(int(index), kind) for index, kind in
+            zip(flagged['scraped_at'].map(lambda at: (at - pd.Timestamp("2024-01-01")).days), flagged['kind'])}
+
+
+def test_detects_outlier_without_spike_when_price_stays():
+    prices = [100.0, 101.0, 99.0, 100.0, 102.0, 98.0, 100.0, 101.0, 99.0, 100.0, 300.0, 300.0]
+    flagged = _flagged(prices)
+    
+    assert (10, 'outlier') in flagged
+    assert not any(kind == 'spike' for _, kind in flagged)
+    assert not any(day < 10 for day, _ in flagged)
+
+
+def test_detects_spike_that_reverts():
+    prices = [100.0] * 10 + [150.0, 100.0, 100.0]
+    flagged = _flagged(prices)
+    
+    assert (10, 'spike') in flagged
+    assert not any(kind == 'spike' and day != 10 for day, kind in flagged)
+
+
+def test_fake_discount_only_after_inflation():
+    inflated = [100.0] * 10 + [130.0, 130.0, 100.0]
+    real = [100.0] * 10 + [80.0]
+    
+    assert (12, 'fake_discount') in _flagged(inflated)
+    assert not any(kind == 'fake_discount' for _, kind in _flagged(real))
+
+
+def test_anomaly_run_is_incremental_and_idempotent(db):
+    def save(prices, start):
+        days = pd.date_range(start, periods=len(prices), freq='D')
+        db.save_prices([make_product(product_id, price, scraped_at=at.isoformat())
+                        for product_id in ("MLA1", "MLA2") for price, at in zip(prices, days)])
+    
+    save([100.0] * 10 + [150.0], "2024-01-01")
+    detector = AnomalyDetector()
+    detector.run(db)
+    # El último spike necesita el registro siguiente: todavía no se marca
+    assert not [a for a in db.get_anomalies() if a['kind'] == 'spike']
+    
+    save([100.0] * 3, "2024-01-12")
+    detector.run(db)
+    assert detector.run(db) == 0
+    incremental = sorted((a['product_id'], a['kind'], a['scraped_at']) for a in db.get_anomalies())
+    
+    detector.run(db, full=True)
+    full = sorted((a['product_id'], a['kind'], a['scraped_at']) for a in db.get_anomalies())
+    assert incremental == full
+    assert ("MLA1", 'spike', "2024-01-11T00:00:00") in incremental
+
+
+def _correlated_catalog(n_products=12, n_days=90, seed=0):
+    rng = np.random.default_rng(seed)
+    factors = rng.normal(0, 0.02, (n_days, 3))
+    frames = []
+    for i in range(n_products):
+        returns = factors[:, i % 3] * rng.uniform(0.5, 1.5) + rng.normal(0, 0.01 * (1 + i % 4), n_days)
+        frame = _daily(1000 * np.exp(returns.cumsum()), product_id=f"MLA{i}")
+        # Huecos aleatorios: cada par comparte una cantidad distinta de días
+        frames.append(frame[rng.random(n_days) > 0.15 * (i % 3)])
+    return pd.concat(frames, ignore_index=True)
+
+
+@pytest.mark.parametrize("block_size", [1, 5, 1024])
+def test_correlate_prices_top_k_matches_corrcoef(block_size):
+    prices = _correlated_catalog()
+    top_k, min_correlation, min_overlap = 3, 0.2, 14
+    result = correlate_prices(prices, top_k=top_k, min_correlation=min_correlation,
+                              min_overlap=min_overlap, block_size=block_size)
+    
+    # Referencia por fuerza bruta: np.corrcoef sobre los días con variación en ambos
+    grid, product_ids, _ = price_grid(prices)
+    returns = np.diff(np.log(grid.astype('float64')), axis=0)
+    returns[returns == 0] = np.nan
+    n = len(product_ids)
+    corr = np.full((n, n), -np.inf)
+    for a in range(n):
+        for b in range(n):
+            both = ~np.isnan(returns[:, a]) & ~np.isnan(returns[:, b])
+            if a != b and both.sum() >= min_overlap:
+                corr[a, b] = np.corrcoef(returns[both, a], returns[both, b])[0, 1]
+    expected = {}
+    for a in range(n):
+        for b in np.argsort(-corr[a])[:top_k]:
+            if corr[a, b] >= min_correlation:
+                expected[tuple(sorted((product_ids[a], product_ids[b])))] = corr[a, b]
+    
+    found = {tuple(sorted(pair)): value for pair, value in
+             zip(zip(result['product_a'], result['product_b']), result['correlation'])}
+    assert found.keys() == expected.keys()
+    for pair, value in expected.items():
+        assert found[pair] == pytest.approx(value, abs=1e-4)
+    assert result['correlation'].is_monotonic_decreasing
+
+
+def test_trend_and_ses_on_linear_series():
+    t = np.arange(60, dtype=float)
+    y = np.column_stack([100 + 2 * t, 500 - 3 * t, np.full(60, 80.0)])
+    y[:20, 1] = np.nan
+    
+    trend, slope, intercept = PriceForecaster._trend(y, 7)
+    assert slope == pytest.approx([2.0, -3.0, 0.0])
+    assert intercept == pytest.approx(y[-FORECAST_TREND_WINDOW])
+    assert trend[:, 0] == pytest.approx(y[-1, 0] + 2 * np.arange(1, 8))
+    assert trend[-1, 1] == pytest.approx(y[-1, 1] - 21)
+    
+    ses, alpha = PriceForecaster._ses(y, 7)
+    # Con tendencia gana el alpha más alto; el nivel queda atrasado slope·(1-α)/α
+    assert alpha[:2] == pytest.approx([max(FORECAST_ALPHAS)] * 2)
+    lag = (1 - max(FORECAST_ALPHAS)) / max(FORECAST_ALPHAS)
+    assert ses[:, 0] == pytest.approx(y[-1, 0] - 2 * lag)
+    assert ses[:, 1] == pytest.approx(y[-1, 1] + 3 * lag)
+    assert ses[:, 2] == pytest.approx(80.0)
+
+
+def test_forecaster_picks_trend_for_linear_series():
+    result = PriceForecaster(horizon=7).fit(_daily(100 + 2 * np.arange(60, dtype=float)))
+    row = result.loc["MLA1"]
+    
+    assert row['model'] == 'trend'
+    assert row['forecast'] == pytest.approx(218 + 14)
+    assert row['mae'] == pytest.approx(0.0, abs=1e-6)
+    assert row['target_at'] == pd.Timestamp("2024-03-07")
+
+
+def test_forecaster_run_refits_only_products_past_watermark(db):
+    def save(product_id, prices, start):
+        days = pd.date_range(start, periods=len(prices), freq='D')
+        db.save_prices([make_product(product_id, price, scraped_at=at.isoformat())
+                        for price, at in zip(prices, days)])
+    
+    def mark_stale():
+        with sqlite3.connect(db.db_path) as conn:
+            conn.execute("UPDATE price_forecasts SET forecast = -1")
+    
+    save("MLA1", 100 + 2 * np.arange(30, dtype=float), "2024-01-01")
+    save("MLA2", np.full(30, 50.0), "2024-01-01")
+    forecaster = PriceForecaster()
+    assert forecaster.run(db) == 2
+    assert forecaster.run(db) == 0
+    
+    mark_stale()
+    save("MLA1", [160.0, 162.0], "2024-01-31")
+    assert forecaster.run(db) == 1
+    assert db.get_forecast("MLA1")['forecast'] > 0
+    assert db.get_forecast("MLA1")['last_at'].startswith("2024-02-01")
+    assert db.get_forecast("MLA2")['forecast'] == -1
+    
+    assert forecaster.run(db, full=True) == 2
+    assert db.get_forecast("MLA2")['forecast'] == pytest.approx(50.0)
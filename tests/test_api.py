@@ -0,0 +1,79 @@
+"""
+Tests de la API HTTP (ETags y 304)
+"""
+
+import asyncio
+
+from api import PriceAPI
+from conftest import make_product
+
+
+async def _get(port, target, headers=None):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    lines = [f"GET {target} HTTP/1.1", "Host: test", "Connection: close"]
+    lines += [f"{name}: {value}" for name, value in (headers or {}).items()]
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode('latin-1'))
+    await writer.drain()
+    raw = await reader.read()
+    writer.close()
+    
+    head = raw.split(b"\r\n\r\n", 1)[0].decode('latin-1').split("\r\n")
+    status = int(head[0].split()[1])
+    response_headers = {name.lower(): value.strip() for name, _, value in (line.partition(':') for line in head[1:])}
+    return status, response_headers
+
+
+def _run_with_server(db, scenario):
+    async def main():
+        server = await asyncio.start_server(PriceAPI(db).handle, '127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            return await scenario(port)
+        finally:
+            server.close()
+            await server.wait_closed()
+    
+    return asyncio.run(main())
+
+
+def test_etag_returns_304_until_data_changes(db):
+    db.save_price(make_product("MLA1", 100, title="Notebook"))
+    
+    async def scenario(port):
+        status, headers = await _get(port, "/search?q=notebook")
+        assert status == 200
+        etag = headers['etag']
+        
+        status, headers = await _get(port, "/search?q=notebook", {'If-None-Match': etag})
+        assert status == 304
+        assert headers['etag'] == etag
+        
+        await asyncio.to_thread(db.save_price, make_product("MLA1", 90, title="Notebook"))
+        status, headers = await _get(port, "/search?q=notebook", {'If-None-Match': etag})
+        assert status == 200
+        assert headers['etag'] != etag
+    
+    _run_with_server(db, scenario)
+
+
+def test_relative_search_has_no_etag(db):
+    db.save_price(make_product("MLA1", 100, title="Notebook"))
+    
+    async def scenario(port):
+        status, headers = await _get(port, "/search?q=notebook&max_age_hours=1")
+        assert status == 200
+        assert 'etag' not in headers
+    
+    _run_with_server(db, scenario)
+
+
+def test_stats_and_alerts_are_not_cached(db):
+    db.save_price(make_product("MLA1", 100, title="Notebook"))
+    
+    async def scenario(port):
+        for target in ("/stats", "/alerts"):
+            status, headers = await _get(port, target)
+            assert status == 200
+            assert 'etag' not in headers
+    
+    _run_with_server(db, scenario)
@@ -0,0 +1,45 @@
+"""
+Tests de PriceDatabase
+"""
+
+from conftest import make_product
+
+
+def test_search_folds_accents_and_case(db):
+    db.save_price(make_product("MLA1", 100, title="Edición Limitada Ñandú"))
+    db.save_price(make_product("MLA2", 100, title="Otro producto"))
+    
+    for query in ("edicion", "EDICIÓN", "nandu lim"):
+        assert [row['id'] for row in db.search_products_local(query)] == ["MLA1"]
+
+
+def test_user_summary_is_updated_by_ingest_listener(db):
+    db.add_listener(db.refresh_summaries_on_ingest)
+    alice, bob = db.get_or_create_user("alice"), db.get_or_create_user("bob")
+    db.save_price(make_product("MLA1", 100))
+    db.save_price(make_product("MLA2", 100))
+    db.add_to_watchlist(alice, "MLA1")
+    db.add_to_watchlist(bob, "MLA2")
+    
+    assert db.get_user_summary(alice)['total_products'] == 1
+    db.save_price(make_product("MLA1", 50))
+    
+    summary = db.get_user_summary(alice)
+    assert summary['alert_count'] == 1
+    assert summary['pending_prices'] == 0
+    assert db.get_user_summary(bob)['alert_count'] == 0
+
+
+def test_user_summary_reports_prices_saved_after_it(db):
+    alice = db.get_or_create_user("alice")
+    db.save_price(make_product("MLA1", 100))
+    db.add_to_watchlist(alice, "MLA1")
+    computed_at = db.get_user_summary(alice)['computed_at']
+    
+    db.save_price(make_product("MLA1", 90))
+    summary = db.get_user_summary(alice)
+    assert summary['pending_prices'] == 1
+    assert summary['computed_at'] == computed_at
+    
+    db.refresh_user_summaries([alice])
+    assert db.get_user_summary(alice)['pending_prices'] == 0
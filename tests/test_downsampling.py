@@ -0,0 +1,62 @@
+"""
+Tests de la reducción de series para gráficos
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from downsampling import downsample_frame, lttb_indices, minmax_envelope
+
+
+def _series(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'scraped_at': pd.date_range("2024-01-01", periods=n, freq='h'),
+        'price': 1000 + rng.normal(0, 5, n).cumsum(),
+    })
+
+
+@pytest.mark.parametrize("n, n_out", [(10_000, 500), (1_001, 3), (50, 49)])
+def test_lttb_keeps_endpoints_and_budget(n, n_out):
+    df = _series(n)
+    indices = lttb_indices(df['scraped_at'].to_numpy(), df['price'].to_numpy(), n_out)
+    
+    assert len(indices) <= n_out
+    assert indices[0] == 0 and indices[-1] == n - 1
+    assert (np.diff(indices) > 0).all()
+
+
+def test_lttb_keeps_isolated_peak():
+    df = _series(5_000)
+    df.loc[2_345, 'price'] = df['price'].max() * 2
+    kept = downsample_frame(df, max_points=200)
+    
+    assert len(kept) == 200
+    assert 2_345 in kept.index
+
+
+def test_short_series_are_untouched():
+    df = _series(100)
+    
+    assert list(lttb_indices(df['scraped_at'], df['price'], 500)) == list(range(100))
+    assert downsample_frame(df, max_points=500) is df
+
+
+@pytest.mark.parametrize("n_buckets", [1, 7, 300, 5_000])
+def test_minmax_envelope_bounds_every_point(n_buckets):
+    df = _series(3_000, seed=1)
+    envelope = minmax_envelope(df, n_buckets=n_buckets)
+    
+    assert len(envelope) == min(n_buckets, len(df))
+    # Cada punto cae en el bucket que empieza en la última fecha <= a la suya
+    bucket = np.searchsorted(envelope['scraped_at'].to_numpy(), df['scraped_at'].to_numpy(), side='right') - 1
+    assert (df['price'].to_numpy() >= envelope['min'].to_numpy()[bucket]).all()
+    assert (df['price'].to_numpy() <= envelope['max'].to_numpy()[bucket]).all()
+    assert envelope['min'].min() == df['price'].min()
+    assert envelope['max'].max() == df['price'].max()
+    assert (envelope['min'] <= envelope['max']).all()
+
+
+def test_minmax_envelope_empty_frame():
+    assert minmax_envelope(_series(0)).empty
@@ -0,0 +1,56 @@
+"""
+Tests del JobManager
+"""
+
+import threading
+import time
+
+from jobs import JobManager, JOB_CANCELLED
+from conftest import make_product
+
+
+class BlockingScraper:
+    """
+    Scraper falso que se detiene en cada búsqueda hasta que se libera
+    """
+    
+    def __init__(self, started, release):
+        self.started = started
+        self.release = release
+    
+    def search_products(self, query, limit=10):
+        self.started.set()
+        self.release.wait(5)
+        return [make_product("tmp", 100, title=query)]
+    
+    def close(self):
+        pass
+
+
+def _wait_inactive(manager, job_id, timeout=10):
+    deadline = time.monotonic() + timeout
+    while manager.get(job_id)['active'] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return manager.get(job_id)
+
+
+def test_cancel_skips_pending_and_keeps_finished(db):
+    started, release = threading.Event(), threading.Event()
+    manager = JobManager(db, workers=1, scraper_factory=lambda: BlockingScraper(started, release))
+    products = [make_product(f"MLA{i}", 100) for i in range(5)]
+    
+    try:
+        job_id = manager.submit_bulk_update(products)
+        assert started.wait(5)
+        assert manager.cancel(job_id)
+        release.set()
+        
+        job = _wait_inactive(manager, job_id)
+        assert job['status'] == JOB_CANCELLED
+        assert job['processed'] == 1
+        assert job['saved'] == 1
+        assert db.get_price_history("MLA0")
+        assert not manager.cancel(job_id)
+    finally:
+        release.set()
+        manager.shutdown()
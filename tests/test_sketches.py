@@ -0,0 +1,75 @@
+"""
+Tests del t-digest: error de cuantiles y combinación de digests
+"""
+
+import numpy as np
+import pytest
+
+from sketches import TDigest, merge_digests
+
+
+QUANTILES = [0.001, 0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.99, 0.999]
+
+
+def _rank(sorted_values, value):
+    return np.searchsorted(sorted_values, value) / len(sorted_values)
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_quantile_rank_error_is_bounded(seed):
+    values = np.random.default_rng(seed).lognormal(10, 1, 50_000)
+    ordered = np.sort(values)
+    digest = TDigest.from_values(values)
+    
+    assert digest.count == len(values)
+    assert digest.quantile(0) == values.min()
+    assert digest.quantile(1) == values.max()
+    for q in QUANTILES:
+        # Más precisión en las colas (escala k1)
+        tolerance = 0.001 if min(q, 1 - q) < 0.01 else 0.005
+        assert abs(_rank(ordered, digest.quantile(q)) - q) <= tolerance
+    assert len(digest.means) <= digest.compression
+
+
+def test_merge_digests_matches_digest_of_concatenated_values():
+    rng = np.random.default_rng(4)
+    shards = [rng.normal(1000 * (i + 1), 200, 5_000) for i in range(6)]
+    values = np.concatenate(shards)
+    ordered = np.sort(values)
+    
+    parts = []
+    for shard in shards:
+        digest = TDigest()
+        for value in shard:
+            digest.add(value)
+        parts.append(digest)
+    merged = merge_digests(parts)
+    direct = TDigest.from_values(values)
+    
+    assert merged.count == direct.count == len(values)
+    assert (merged.min, merged.max) == (direct.min, direct.max)
+    for q in QUANTILES:
+        assert abs(_rank(ordered, merged.quantile(q)) - _rank(ordered, direct.quantile(q))) <= 0.005
+
+
+def test_json_round_trip_and_histogram_total():
+    values = np.random.default_rng(5).uniform(100, 200, 10_000)
+    digest = TDigest.from_values(values)
+    restored = TDigest.from_json(digest.to_json())
+    
+    assert restored.to_dict() == digest.to_dict()
+    assert restored.quantile(0.5) == digest.quantile(0.5)
+    
+    edges, counts = restored.histogram(10)
+    assert len(edges) == 11
+    assert sum(counts) == pytest.approx(len(values))
+    # Uniforme: cada barra con ~1/10 de las observaciones
+    assert max(abs(count - len(values) / 10) for count in counts) < 0.05 * len(values)
+
+
+def test_empty_digest():
+    digest = merge_digests([None, TDigest()])
+    
+    assert digest.count == 0
+    assert digest.quantile(0.5) is None
+    assert digest.histogram() == ([], [])
@@ -0,0 +1,80 @@
+"""
+Tests de las estadísticas incrementales contra NumPy
+"""
+
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from streaming import P2Quantile, RunningStats
+
+
+def _timestamps(n):
+    return [(datetime(2024, 1, 1) + timedelta(minutes=i)).isoformat() for i in range(n)]
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_running_stats_match_numpy(seed):
+    prices = np.random.default_rng(seed).lognormal(10, 0.5, 2000)
+    stats = RunningStats("MLA1")
+    for price, scraped_at in zip(prices, _timestamps(len(prices))):
+        stats.update(float(price), scraped_at)
+    
+    assert stats.count == len(prices)
+    assert stats.mean == pytest.approx(prices.mean(), rel=1e-12)
+    assert stats.std == pytest.approx(prices.std(ddof=1), rel=1e-9)
+    assert stats.min_price == prices.min()
+    assert stats.max_price == prices.max()
+    assert stats.first_price == prices[0]
+    assert stats.last_price == prices[-1]
+    assert stats.prev_price == prices[-2]
+
+
+def test_running_stats_orders_by_timestamp_not_arrival():
+    stats = RunningStats("MLA1")
+    stats.update(200, "2024-01-03T00:00:00")
+    stats.update(100, "2024-01-01T00:00:00")
+    stats.update(150, "2024-01-02T00:00:00")
+    
+    assert stats.first_price == 100
+    assert stats.last_price == 200
+    assert stats.as_statistics()['variacion_porcentual'] == pytest.approx(100.0)
+
+
+@pytest.mark.parametrize("q", [0.1, 0.5, 0.9])
+@pytest.mark.parametrize("seed", [0, 1])
+def test_p2_quantile_close_to_numpy(q, seed):
+    values = np.random.default_rng(seed).normal(1000, 100, 5000)
+    estimator = P2Quantile(q)
+    for value in values:
+        estimator.add(float(value))
+    
+    assert estimator.value() == pytest.approx(np.quantile(values, q), abs=0.1 * values.std())
+
+
+def test_p2_quantile_is_exact_below_five_values():
+    estimator = P2Quantile(0.5)
+    for value in (4.0, 1.0, 3.0, 2.0):
+        estimator.add(value)
+    
+    assert estimator.value() == np.median([4.0, 1.0, 3.0, 2.0])
+    assert P2Quantile(0.5).value() is None
+
+
+def test_row_round_trip_continues_identically():
+    prices = np.random.default_rng(3).normal(500, 50, 300)
+    timestamps = _timestamps(len(prices))
+    uninterrupted, restored = RunningStats("MLA1"), RunningStats("MLA1")
+    
+    for price, scraped_at in zip(prices[:100], timestamps[:100]):
+        uninterrupted.update(float(price), scraped_at)
+        restored.update(float(price), scraped_at)
+    restored = RunningStats.from_row(restored.to_row())
+    
+    for price, scraped_at in zip(prices[100:], timestamps[100:]):
+        uninterrupted.update(float(price), scraped_at)
+        restored.update(float(price), scraped_at)
+    
+    assert restored.to_row() == uninterrupted.to_row()
+    assert restored.as_statistics() == uninterrupted.as_statistics()